@@ -1,25 +1,37 @@
 # app/agents/analysis_agent.py
 import pandas as pd
+from app.utils.anomaly import AnomalyDetector
+from app.utils.column_stats import DatasetProfile
+from app.utils.csv_schema import CsvSchema
 
 class AnalysisAgent:
-    def perform_eda(self, df: pd.DataFrame):
-        summary = df.describe(include="all").to_dict()
-        dtypes = df.dtypes.astype(str).to_dict()
+    def perform_eda(self, df: pd.DataFrame, profile: DatasetProfile = None, schema: CsvSchema = None):
+        """
+        Reads everything from the dataset profile; `df` is only profiled
+        when no profile is passed in. The inferred `schema`, if given, is
+        reported as well.
+        """
+        profile = profile or DatasetProfile.from_frame(df)
 
-        return {
-            "summary_statistics": summary,
-            "column_types": dtypes,
-            "row_count": len(df),
-            "column_count": len(df.columns),
+        report = {
+            "summary_statistics": profile.summary_statistics(),
+            "column_types": profile.column_types,
+            "row_count": profile.rows,
+            "column_count": len(profile.columns),
         }
+        if schema is not None:
+            report["schema"] = schema.to_dict()
+        return report
 
-    def detect_anomalies(self, df: pd.DataFrame):
-        anomalies = {}
+    def anomaly_detector(self, profile: DatasetProfile, schema: CsvSchema = None):
+        """Identifier columns of the `schema` are left out: their values are labels, not measurements."""
+        return AnomalyDetector(profile, exclude=schema.id_columns if schema is not None else ())
 
-        for col in df.select_dtypes(include=["number"]).columns:
-            mean = df[col].mean()
-            std = df[col].std()
-            if std > 0:
-                anomalies[col] = (df[col] > mean + 3*std).sum()
-
-        return anomalies
+    def detect_anomalies(self, df: pd.DataFrame, profile: DatasetProfile = None, schema: CsvSchema = None):
+        """
+        Runs every configured anomaly method over the numeric block of df
+        and returns per-method counts plus (capped) anomalous row indices.
+        For chunked input, feed chunks through anomaly_detector() instead.
+        """
+        profile = profile or DatasetProfile.from_frame(df)
+        return self.anomaly_detector(profile, schema).update(df).report()
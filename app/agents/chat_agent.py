@@ -1,15 +1,21 @@
+import json
 import pandas as pd
-from app.utils.gemini_client import GeminiClient
+import pyarrow as pa
+from app.database.dataset_registry import ROW_COLUMN
+from app.utils.column_stats import DatasetProfile
+from app.utils.gemini_client import get_gemini_client
+from app.utils.query_engine import PLAN_FORMAT, parse_plan, validate_plan
 
 
 class ChatAgent:
     def __init__(self):
-        self.gemini = GeminiClient()
+        self.gemini = get_gemini_client()
 
-    def _build_context(self, df: pd.DataFrame) -> str:
+    def _build_context(self, df: pd.DataFrame, profile: DatasetProfile = None) -> str:
         """
         Builds a safe, compact summary of the dataset
-        to send to Gemini.
+        to send to Gemini. Statistics come from the dataset
+        profile when one is passed in.
         """
 
         context_parts = []
@@ -26,7 +32,9 @@ class ChatAgent:
 
         # Summary statistics
         try:
-            summary = df.describe(include="all").to_string()
+            profile = profile or DatasetProfile.from_frame(df)
+            tables = profile.summary_statistics().values()
+            summary = pd.concat([pd.DataFrame(table).set_index("column") for table in tables]).to_string()
             context_parts.append(f"Summary Statistics:\n{summary}")
         except Exception:
             pass
@@ -37,15 +45,45 @@ class ChatAgent:
 
         return "\n\n".join(context_parts)
 
-    def answer_question(self, df: pd.DataFrame, question: str) -> str:
+    def answer_question(self, df: pd.DataFrame, question: str, profile: DatasetProfile = None) -> str:
         """
         Uses Gemini to answer ANY user question based on dataset context.
         """
 
-        context = self._build_context(df)
+        context = self._build_context(df, profile)
 
         try:
             answer = self.gemini.ask(question, context=context)
             return answer or "I could not generate a response."
         except Exception as e:
             return f"Error while generating answer: {str(e)}"
+
+    def _plan_prompt(self, question: str, schema: pa.Schema) -> str:
+        columns = "\n".join(f"- {field.name}: {field.type}" for field in schema if field.name != ROW_COLUMN)
+        return (
+            "You translate questions about a table into a query plan.\n"
+            "Reply with one JSON object in this format and nothing else; omit keys you don't need:\n"
+            f"{PLAN_FORMAT}\n"
+            "Filters are combined with AND. Compare strings and dates as the literal values stored in the column.\n"
+            'If the question cannot be answered by such a query, reply {"unsupported": true}.\n\n'
+            f"COLUMNS:\n{columns}\n\n"
+            f"QUESTION:\n{question}\n"
+        )
+
+    async def aplan(self, question: str, schema: pa.Schema) -> dict:
+        """
+        Asks the LLM for a query plan over the columns in `schema` and
+        returns it validated; raises QueryPlanError if it cannot be run.
+        Only the column names and types are sent, never rows.
+        """
+        reply = await self.gemini.acomplete(self._plan_prompt(question, schema))
+        return validate_plan(parse_plan(reply), schema)
+
+    async def anarrate(self, question: str, plan: dict, result: pd.DataFrame, matched: int) -> str:
+        """Has the LLM phrase the answer from the (small) result table of an executed plan."""
+        shown = f"all {matched}" if matched <= len(result) else f"the first {len(result)} of {matched}"
+        context = (
+            f"The question was answered by running this query over the full dataset:\n{json.dumps(plan)}\n\n"
+            f"Result ({shown} rows):\n{result.to_string(index=False)}"
+        )
+        return await self.gemini.aask(question, context)
@@ -1,13 +1,120 @@
 # app/agents/cleaning_agent.py
+import os
+import numpy as np
 import pandas as pd
+from app.utils.column_stats import DatasetProfile
+from app.utils.dedup import DuplicateDetector
 
-class CleaningAgent:
-    def clean_dataset(self, df: pd.DataFrame):
-        report = {}
+# string columns with at most this share of distinct values become `category`
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", 0.5))
+
+
+def _compact(series: pd.Series) -> pd.Series:
+    """Smallest lossless representation of one column (may return `series` itself)."""
+    kind = series.dtype.kind
+
+    if kind in "iu":
+        return pd.to_numeric(series, downcast="integer" if kind == "i" else "unsigned")
 
-        report["missing_values"] = df.isnull().sum().to_dict()
-        report["duplicates_removed"] = int(df.duplicated().sum())
+    if kind == "f" and series.dtype.itemsize > 4:
+        narrow = series.astype("float32")
+        if np.array_equal(narrow.to_numpy(dtype="float64"), series.to_numpy(), equal_nan=True):
+            return narrow
+        return series
 
-        df = df.drop_duplicates()
+    if kind in "OU" or pd.api.types.is_string_dtype(series.dtype):
+        if series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+            return series.astype("category")
+        if kind == "O" and pd.api.types.infer_dtype(series, skipna=True) == "string":
+            return series.astype("str")
+
+    return series
+
+
+class CleaningAgent:
+    def clean_dataset(self, df: pd.DataFrame, subset=None):
+        df, memory = self.optimize_dtypes(df)
+        detector = DuplicateDetector(subset)
+        df, duplicates_removed = self.clean_chunk(df, detector)
+        detector.close()
+        report = self.quality_report(
+            DatasetProfile.from_frame(df), duplicates_removed, memory, detector.near_duplicates()
+        )
 
         return df, report
+
+    def optimize_dtypes(self, df: pd.DataFrame, scope: str = "dataset"):
+        """
+        Downcasts integers to the narrowest type, floats to float32 when
+        no value changes, and low-cardinality string columns to
+        `category` (other object string columns to Arrow-backed strings).
+        Columns are swapped one at a time, so the frame is never copied
+        whole. Returns (df, report) with bytes saved per column; the
+        report's `scope` and `rows` say which rows it measured ("sample"
+        when `df` is only a sample of the dataset).
+        """
+        df = df.copy(deep=False)
+        columns = {}
+        bytes_before = 0
+        bytes_after = 0
+
+        for col in df.columns:
+            series = df[col]
+            before = int(series.memory_usage(index=False, deep=True))
+            after = before
+
+            if len(series):
+                compact = _compact(series)
+                if compact is not series:
+                    size = int(compact.memory_usage(index=False, deep=True))
+                    if size < before:
+                        df[col] = compact
+                        after = size
+                        columns[col] = {
+                            "from": str(series.dtype),
+                            "to": str(compact.dtype),
+                            "bytes_saved": before - after,
+                        }
+
+            bytes_before += before
+            bytes_after += after
+
+        return df, {
+            "scope": scope,
+            "rows": len(df),
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "columns": columns,
+        }
+
+    def remove_duplicates(self, df: pd.DataFrame, subset=None):
+        """Returns the frame itself when there is nothing to drop."""
+        detector = DuplicateDetector(subset, near=False)
+        df, removed = self.clean_chunk(df, detector)
+        detector.close()
+        return df, removed
+
+    def clean_chunk(self, df: pd.DataFrame, detector: DuplicateDetector):
+        """
+        Chunked variant of remove_duplicates. `detector` remembers the row
+        hashes of every row kept so far, so duplicates are removed across
+        chunk boundaries, not just within one chunk.
+        """
+        duplicated = detector.update(df)
+        removed = int(duplicated.sum())
+        if removed == 0:
+            return df, 0
+        return df[~duplicated], removed
+
+    def quality_report(self, profile: DatasetProfile, duplicates_removed: int, memory=None,
+                       near_duplicates=None):
+        """Missing values are read from the (deduplicated) dataset profile."""
+        report = {
+            "missing_values": profile.null_counts.reindex(profile.columns, fill_value=0).to_dict(),
+            "duplicates_removed": duplicates_removed,
+        }
+        if near_duplicates is not None:
+            report["near_duplicates"] = near_duplicates
+        if memory is not None:
+            report["memory_optimization"] = memory
+        return report
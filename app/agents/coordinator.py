@@ -1,34 +1,265 @@
 # app/agents/coordinator.py
+import os
 import pandas as pd
 from app.agents.analysis_agent import AnalysisAgent
 from app.agents.cleaning_agent import CleaningAgent
-from app.agents.visualization_agent import VisualizationAgent
+from app.agents.visualization_agent import CHART_BUDGET, VisualizationAgent, prepare_chart_data, spec_columns
+from app.utils.aggregate_cube import AGGREGATE_CUBE, CUBE_MAX_CARDINALITY, AggregateCube, cube_layout, layout_columns
+from app.utils.anomaly import ANOMALY_METHODS, merge_reports
+from app.utils.column_stats import DatasetProfile, QUANTILE_SKETCH_K, TOP_K_CAPACITY
+from app.utils.csv_schema import SCHEMA_SAMPLE_ROWS, CsvSchema, infer_schema
+from app.utils.dedup import DUPLICATE_SUBSET, NEAR_DUPLICATES, DuplicateDetector
+from app.utils.incremental import AnalysisState
+from app.utils.ingestion import CSV_CHUNK_ROWS, iter_csv_chunks, sample_rows, strip_sample_key
+from app.utils.profiling import NullProfiler
+
+# rows kept in memory for charts when analyzing a file in chunks
+SAMPLE_ROWS = int(os.getenv("SAMPLE_ROWS", 100_000))
+
+class EmptyDatasetError(ValueError):
+    pass
 
 class DataAnalysisCoordinator:
+    # bump whenever the shape or content of the analysis result changes
+    PIPELINE_VERSION = "15"
+
+    # progress stages reported by orchestrate_file_analysis, in order
+    STAGES = ["profiling", "eda", "anomalies", "visualization"]
+
     def __init__(self):
         self.analysis_agent = AnalysisAgent()
         self.cleaning_agent = CleaningAgent()
         self.visualization_agent = VisualizationAgent()
 
-    def orchestrate_analysis(self, df: pd.DataFrame, dataset_name: str):
+    def config_fingerprint(self, chunksize: int = CSV_CHUNK_ROWS) -> str:
+        """Everything besides the input bytes that can change a file analysis result."""
+        return (
+            f"v{self.PIPELINE_VERSION}:chunk={chunksize}:sample={SAMPLE_ROWS}"
+            f":quantile_k={QUANTILE_SKETCH_K}:top_k={TOP_K_CAPACITY}"
+            f":anomaly={','.join(ANOMALY_METHODS)}"
+            f":dedup={','.join(DUPLICATE_SUBSET)}:near={NEAR_DUPLICATES}"
+            f":charts={CHART_BUDGET}:cube={AGGREGATE_CUBE and CUBE_MAX_CARDINALITY}"
+            f":schema={SCHEMA_SAMPLE_ROWS}"
+        )
+
+    def orchestrate_analysis(self, df: pd.DataFrame, dataset_name: str, profiler=None, charts=None):
+        """
+        `profiler`, if given, is a PipelineProfiler that records each
+        stage. `charts`, if given, is called with the rows and specs the
+        charts are later drawn from (see _visualize).
+        """
+        profiler = profiler or NullProfiler()
         state = {"dataset_name": dataset_name}
+        rows, columns = df.shape
+
+        with profiler.stage("schema_inference", rows, columns):
+            schema = CsvSchema.from_frame(df)
+            df = schema.apply(df.copy(deep=False))
 
-        df, clean_report = self.cleaning_agent.clean_dataset(df)
-        state["data_quality_report"] = clean_report
+        # compact first so deduplication copies the smaller frame
+        with profiler.stage("dtype_optimization", rows, columns):
+            df, memory = self.cleaning_agent.optimize_dtypes(df)
+        with profiler.stage("cleaning", rows, columns):
+            duplicates = DuplicateDetector()
+            df, duplicates_removed = self.cleaning_agent.clean_chunk(df, duplicates)
+            duplicates.close()
+        with profiler.stage("profiling", len(df), columns):
+            profile = DatasetProfile.from_frame(df)
+        state["data_quality_report"] = self.cleaning_agent.quality_report(
+            profile, duplicates_removed, memory, duplicates.near_duplicates()
+        )
 
-        analysis = self.analysis_agent.perform_eda(df)
+        with profiler.stage("eda", len(df), columns):
+            analysis = self.analysis_agent.perform_eda(df, profile, schema)
         state["analysis_report"] = analysis
 
-        anomalies = self.analysis_agent.detect_anomalies(df)
+        with profiler.stage("anomalies", len(df), len(profile.numeric_columns)):
+            anomalies = self.analysis_agent.detect_anomalies(df, profile, schema)
         state["anomaly_report"] = anomalies
 
-        viz_specs = self.visualization_agent.recommend_visualizations(df, analysis)
-        images = self.visualization_agent.generate_visualizations(df, viz_specs)
+        return self._visualize(state, df, profile, analysis, df.head(), profiler, charts, schema=schema)
+
+    def orchestrate_file_analysis(self, filepath: str, dataset_name: str, chunksize: int = CSV_CHUNK_ROWS,
+                                  progress=None, store=None, profiler=None, charts=None,
+                                  previous: AnalysisState = None, state_dir: str = None):
+        """
+        Same pipeline as orchestrate_analysis, but reads the CSV in chunks
+        so peak memory is bounded by `chunksize` and SAMPLE_ROWS instead
+        of the file size.
+
+        The column types are inferred from a sample of the file first
+        (see CsvSchema) and every chunk is parsed with them. Pass 1
+        deduplicates each chunk and folds it into one dataset profile;
+        pass 2 re-reads the rows and scores them with every anomaly
+        method (see AnomalyDetector) against the profile's statistics
+        for the whole file. Charts are drawn from a uniform row sample.
+        `progress`, if given, is called with each name in STAGES as that
+        stage starts.
+
+        If `store` (a ColumnarWriter) is given, pass 1 also writes the
+        cleaned chunks to it and pass 2 reads them back memory-mapped
+        instead of parsing the CSV a second time. Per-chunk work is
+        accumulated per stage in `profiler`; `charts` receives the sample
+        rows charts are drawn from.
+
+        If `previous` (an AnalysisState) is given, the CSV holds rows
+        appended to that earlier analysis: they are deduplicated against
+        and folded into its state, so the work is proportional to the new
+        rows only. Anomalies are counted for the new rows against the
+        updated statistics and added to the earlier counts. The resulting
+        state is saved to `state_dir` if given.
+
+        With both `store` and `state_dir`, an aggregate cube (see
+        AggregateCube) is built from the stored rows and saved with the
+        state; on append, the new rows' cube is merged into the previous
+        one. Bar charts then carry exact counts over all rows.
+        """
+        try:
+            return self._orchestrate_chunks(
+                filepath, dataset_name, chunksize, progress, store, profiler or NullProfiler(), charts,
+                previous, state_dir,
+            )
+        except Exception:
+            if store is not None:
+                store.abort()
+            raise
+
+    def _orchestrate_chunks(self, filepath: str, dataset_name: str, chunksize: int, progress, store, profiler, charts,
+                            previous, state_dir):
+        progress = progress or (lambda stage: None)
+        state = {"dataset_name": dataset_name}
+        # appended rows continue the numbering of the rows before them
+        base = previous or AnalysisState()
+
+        progress("profiling")
+
+        with profiler.stage("state_loading"):
+            duplicates = base.duplicates()
+        profile = base.profile
+        sample = base.sample
+        preview = base.preview
+        rows_read = base.rows_read
+
+        with profiler.stage("schema_inference"):
+            schema = infer_schema(filepath, previous=base.schema)
+        chunks = iter_csv_chunks(filepath, chunksize, start=base.rows_read, schema=schema)
+        for chunk in profiler.iterate("csv_parsing", chunks):
+            rows_read += len(chunk)
+            with profiler.stage("cleaning", *chunk.shape):
+                chunk, _ = self.cleaning_agent.clean_chunk(chunk, duplicates)
+            with profiler.stage("profiling", *chunk.shape):
+                profile.update(chunk)
+            if store is not None:
+                with profiler.stage("columnar_store", *chunk.shape):
+                    store.write(chunk)
+            with profiler.stage("sampling", *chunk.shape):
+                sample = sample_rows(sample, chunk, SAMPLE_ROWS)
+            if preview is None:
+                preview = chunk.head(5)
+            elif len(preview) < 5:
+                preview = pd.concat([preview, chunk.head(5 - len(preview))])
+
+        if state_dir is not None:
+            with profiler.stage("state_saving"):
+                base.save_duplicates(state_dir, duplicates)
+        duplicates.close()
+        if profile.rows == 0:
+            raise EmptyDatasetError("CSV file contains no data.")
+
+        # chunks keep their parsed dtypes (row hashes and the columnar store
+        # depend on them); only the in-memory sample is compacted, and the
+        # memory report says so
+        keyed_sample = sample
+        with profiler.stage("dtype_optimization", *sample.shape):
+            sample, memory = self.cleaning_agent.optimize_dtypes(strip_sample_key(sample), scope="sample")
+        state["data_quality_report"] = self.cleaning_agent.quality_report(
+            profile, duplicates.removed, memory, duplicates.near_duplicates()
+        )
+
+        progress("eda")
+        with profiler.stage("eda", *sample.shape):
+            analysis = self.analysis_agent.perform_eda(sample, profile, schema)
+        state["analysis_report"] = analysis
+
+        progress("anomalies")
+        detector = self.analysis_agent.anomaly_detector(profile, schema)
+        with profiler.stage("anomalies", profile.rows, len(profile.numeric_columns)):
+            if store is not None:
+                store.close()
+                for chunk in store.iter_batches(profile.numeric_columns):
+                    detector.update(chunk)
+            else:
+                duplicates = base.duplicates(near=False)
+                for chunk in iter_csv_chunks(filepath, chunksize, start=base.rows_read, schema=schema):
+                    chunk, _ = self.cleaning_agent.clean_chunk(chunk, duplicates)
+                    detector.update(chunk)
+                duplicates.close()
+            anomalies = detector.report()
+            if base.anomaly_report is not None:
+                anomalies = merge_reports(base.anomaly_report, anomalies)
+            state["anomaly_report"] = anomalies
+
+        if previous is not None:
+            state["append_report"] = {"rows_before": base.rows_read, "rows_appended": rows_read - base.rows_read}
+
+        cube = None
+        if AGGREGATE_CUBE and store is not None and state_dir is not None:
+            with profiler.stage("aggregate_cube", profile.rows):
+                cube = self._aggregate_cube(store, profile, sample, base)
+                base.save_cube(state_dir, cube)
+        if state_dir is not None:
+            with profiler.stage("state_saving"):
+                AnalysisState(profile, keyed_sample, anomalies, preview, rows_read, schema=schema).save(state_dir)
+
+        progress("visualization")
+        return self._visualize(state, sample, profile, analysis, preview, profiler, charts, cube, schema)
+
+    def _aggregate_cube(self, store, profile: DatasetProfile, sample: pd.DataFrame, base: AnalysisState):
+        """The cube of every stored row, merging the new segment into the previous cube when it still fits."""
+        layout = cube_layout(profile, sample)
+        previous = base.cube()
+        if previous is not None and previous.layout == layout:
+            return previous.merge(AggregateCube.build(store.open_table(layout_columns(layout)), layout))
+        # a first upload, or an append that changed the dimensions: aggregate all segments
+        return AggregateCube.build(store.registry.open_table(store.dataset_name, layout_columns(layout)), layout)
+
+    def _visualize(self, state, df: pd.DataFrame, profile: DatasetProfile, analysis, preview: pd.DataFrame,
+                   profiler, charts, cube: AggregateCube = None, schema: CsvSchema = None):
+        """
+        Recommends charts without drawing them: each spec gets an `id`
+        and is rendered only when requested. `charts(rows, specs)` is
+        handed just the columns the specs read, to keep for that. Each
+        spec's `sampling` is worked out here, from the rows it will be
+        drawn from, so it is stored and returned with the spec.
+        """
+        with profiler.stage("viz_recommendation", *df.shape):
+            viz_specs = self.visualization_agent.recommend_visualizations(df, analysis, profile, schema=schema)
+        for i, spec in enumerate(viz_specs):
+            spec["id"] = f"{i}-{spec['type']}"
+            counts = cube.counts(spec["column"]) if cube is not None and spec["type"] == "barchart" else None
+            if counts is not None:
+                spec["counts"] = [[str(value), int(count)] for value, count in counts.items()]
+            prepare_chart_data(df, spec)
+
+        if charts is not None:
+            columns = list(dict.fromkeys(col for spec in viz_specs for col in spec_columns(spec)))
+            with profiler.stage("chart_store", len(df), len(columns)):
+                charts(df[columns], viz_specs)
 
         state["visualization_specs"] = viz_specs
-        state["generated_visualizations"] = images
-        state["cleaned_preview"] = df.head().to_dict(orient="records")
+        state["cleaned_preview"] = preview.to_dict(orient="records")
 
-        state["summary_report"] = f"Dataset «{dataset_name}» analyzed successfully with {len(images)} charts."
+        state["summary_report"] = self._summary_report(state["dataset_name"], len(viz_specs))
 
         return state
+
+    def rename_result(self, result, dataset_name: str):
+        """Re-labels a cached result produced for identical content under another name."""
+        return {
+            **result,
+            "dataset_name": dataset_name,
+            "summary_report": self._summary_report(dataset_name, len(result["visualization_specs"])),
+        }
+
+    def _summary_report(self, dataset_name: str, chart_count: int) -> str:
+        return f"Dataset «{dataset_name}» analyzed successfully with {chart_count} charts."
@@ -1,116 +1,269 @@
 # app/agents/visualization_agent.py
+import os
+import time
+import threading
+import multiprocessing
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import base64
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+from app.utils.chart_ranking import MAX_BAR_CATEGORIES, rank_charts
+from app.utils.column_stats import DatasetProfile
+from app.utils.csv_schema import CsvSchema
+from app.utils.sampling import downsample_lines, histogram_bins, sample_points, top_categories
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", os.cpu_count() or 1))
+# "spawn" keeps workers safe to start from a threaded server process
+CHART_MP_CONTEXT = os.getenv("CHART_MP_CONTEXT", "spawn")
+
+# caps on what a single chart draws, however large the dataset
+MAX_SCATTER_POINTS = int(os.getenv("MAX_SCATTER_POINTS", 5000))
+MAX_LINE_POINTS = int(os.getenv("MAX_LINE_POINTS", 2000))
+HISTOGRAM_BINS = int(os.getenv("HISTOGRAM_BINS", 10))
+# most charts recommended for one dataset
+CHART_BUDGET = int(os.getenv("CHART_BUDGET", 20))
+
+
+def spec_columns(spec):
+    """Columns a chart spec reads, so workers only receive those."""
+    if "columns" in spec:
+        return list(dict.fromkeys([*([spec["x"]] if "x" in spec else []), *spec["columns"]]))
+    if spec["type"] == "scatter":
+        return list(dict.fromkeys([spec["x"], spec["y"]]))
+    return [spec["column"]]
+
+
+def prepare_chart_data(df: pd.DataFrame, spec) -> pd.DataFrame:
+    """
+    Reduces df to what the chart actually draws: pre-binned counts for
+    histograms, top-k value counts for bar charts, a capped point sample
+    for scatters and min/max buckets for line plots. Records the
+    reduction in spec["sampling"].
+    """
+    data = df[spec_columns(spec)]
+    total = len(data)
+
+    if spec["type"] == "histogram":
+        data = histogram_bins(data[spec["column"]], HISTOGRAM_BINS)
+        method = "prebinned"
+    elif spec["type"] == "barchart":
+        counts = None
+        if "counts" in spec:
+            # exact counts over every row, from the aggregate cube
+            counts = pd.Series(dict(spec["counts"]))
+            total = int(counts.sum())
+        data = top_categories(data[spec["column"]], spec.get("top_k", MAX_BAR_CATEGORIES), counts=counts)
+        method = "top_k" if data["value"].iloc[-1:].eq("Other").any() else "prebinned"
+    elif spec["type"] == "scatter":
+        data = sample_points(data, spec["x"], spec["y"], MAX_SCATTER_POINTS)
+        method = "random_sample" if len(data) < total else "none"
+    elif spec["type"] == "lineplot":
+        if "x" in spec:
+            # the time axis becomes the index, which downsampling keeps and the plot draws along
+            data = data.dropna(subset=[spec["x"]]).sort_values(spec["x"], kind="stable").set_index(spec["x"])
+        data = downsample_lines(data, spec["columns"], MAX_LINE_POINTS)
+        method = "minmax_buckets" if len(data) < total else "none"
+    else:
+        return data
+
+    # points_drawn is bars for histograms and markers/vertices otherwise
+    spec["sampling"] = {
+        "method": method,
+        "points_drawn": len(data),
+        "total_rows": total,
+        "ratio": len(data) / total if total else 1.0,
+    }
+    return data
+
+
+def render_chart(df: pd.DataFrame, spec) -> str:
+    """
+    Renders one chart spec to a base64 PNG using the object-oriented
+    Figure API, so it never touches pyplot's global state and is safe
+    to run in parallel. `df` is the output of prepare_chart_data.
+    """
+    return encode_png(draw_chart(df, spec))
+
+
+def draw_chart(df: pd.DataFrame, spec) -> "Figure":
+    # imported on the first chart, not at module load: matplotlib and seaborn take most of a second
+    import matplotlib
+    matplotlib.use("Agg")
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4))
+    ax = fig.add_subplot()
+
+    # =========================
+    # HISTOGRAM
+    # =========================
+    if spec["type"] == "histogram":
+        col = spec["column"]
+        ax.stairs(df["count"], [*df["left"], *df["right"].iloc[-1:]], fill=True)
+        ax.grid(True)
+        ax.set_title(f"Histogram: {col}")
+
+    # =========================
+    # BOXPLOT
+    # =========================
+    elif spec["type"] == "boxplot":
+        col = spec["column"]
+        sns.boxplot(x=df[col], ax=ax)
+        ax.set_title(f"Box Plot: {col}")
+
+    # =========================
+    # LINE PLOT
+    # =========================
+    elif spec["type"] == "lineplot":
+        cols = spec["columns"]
+        df[cols].plot(ax=ax)
+        if "x" in spec:
+            ax.set_xlabel(spec["x"])
+            ax.set_title(f"Line Plot of Numeric Columns over {spec['x']}")
+        else:
+            ax.set_title("Line Plot of Numeric Columns")
+        ax.legend(cols)
+
+    # =========================
+    # BAR CHART
+    # =========================
+    elif spec["type"] == "barchart":
+        col = spec["column"]
+        df.set_index("value")["count"].plot(kind="bar", ax=ax)
+        ax.set_xlabel(col)
+        ax.set_title(f"Bar Chart: {col}")
+
+    # =========================
+    # SCATTER PLOT
+    # =========================
+    elif spec["type"] == "scatter":
+        x = spec["x"]
+        y = spec["y"]
+        ax.scatter(df[x], df[y])
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        ax.set_title(f"Scatter Plot: {x} vs {y}")
+
+    # =========================
+    # HEATMAP
+    # =========================
+    elif spec["type"] == "heatmap":
+        cols = spec["columns"]
+        corr = df[cols].corr()
+        sns.heatmap(corr, annot=spec.get("annotate", True), cmap="coolwarm", ax=ax)
+        ax.set_title("Correlation Heatmap")
+
+    return fig
+
+
+def png_bytes(fig: "Figure") -> bytes:
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def encode_png(fig: "Figure") -> str:
+    # Save the plot to Base64
+    return base64.b64encode(png_bytes(fig)).decode("utf-8")
+
+
+def _render_png_task(task):
+    """Renders one chart to PNG bytes and times drawing and encoding separately."""
+    df, spec = task
+    started = time.perf_counter()
+    fig = draw_chart(df, spec)
+    drawn = time.perf_counter()
+    png = png_bytes(fig)
+    timing = {
+        "type": spec["type"],
+        "draw_seconds": drawn - started,
+        "encode_seconds": time.perf_counter() - drawn,
+        "png_bytes": len(png),
+    }
+    return png, timing
+
+
+def _render_task(task):
+    png, timing = _render_png_task(task)
+    return base64.b64encode(png).decode("utf-8"), timing
+
 
 class VisualizationAgent:
+    def __init__(self, max_workers: int = CHART_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+
+    def recommend_visualizations(self, df: pd.DataFrame, analysis_report, profile: DatasetProfile = None,
+                                 budget: int = CHART_BUDGET, schema: CsvSchema = None):
+        """
+        Ranks candidate charts by relevance (see rank_charts) and keeps
+        the best `budget`, highest score first. Scores come from the
+        dataset profile; `df` is only profiled when none is passed in.
+        """
+        profile = profile or DatasetProfile.from_frame(df)
+        ranked = rank_charts(profile, df, schema)
+        return [{**spec, "score": round(score, 3)} for score, spec in ranked[:budget]]
+
+
+    def generate_visualizations(self, df: pd.DataFrame, specs, timings=None):
+        """
+        Renders every spec and returns base64 PNGs in spec order. With
+        more than one worker, specs are fanned out to a process pool and
+        each task only carries the (downsampled) data its chart needs.
+        If `timings` is a list, per-chart render timings are appended.
+        """
+        tasks = [(prepare_chart_data(df, spec), spec) for spec in specs]
+
+        if self.max_workers <= 1 or len(specs) <= 1:
+            rendered = [_render_task(task) for task in tasks]
+        else:
+            chunksize = max(1, len(specs) // (self.max_workers * 4))
+            rendered = list(self._executor().map(_render_task, tasks, chunksize=chunksize))
+
+        if timings is not None:
+            timings.extend(timing for _, timing in rendered)
+        return [image for image, _ in rendered]
+
+    def render_png(self, df: pd.DataFrame, spec, timings=None) -> bytes:
+        """
+        Renders a single spec to raw PNG bytes, in the worker pool when
+        there is one. Used to draw charts on request; `timings`, if a
+        list, gets the chart's render timing appended.
+        """
+        task = (prepare_chart_data(df, spec), spec)
+
+        if self.max_workers <= 1:
+            png, timing = _render_png_task(task)
+        else:
+            png, timing = self._executor().submit(_render_png_task, task).result()
+
+        if timings is not None:
+            timings.append(timing)
+        return png
+
+    def _executor(self):
+        # the pool is kept across requests so workers only import matplotlib once;
+        # concurrent chart requests must not each start one
+        pool = self._pool
+        if pool is not None:
+            return pool
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(CHART_MP_CONTEXT),
+                )
+            return self._pool
 
-    def recommend_visualizations(self, df: pd.DataFrame, analysis_report):
-        specs = []
-
-        numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
-        categorical_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
-
-        # 1. Histogram for numeric columns
-        for col in numeric_cols:
-            specs.append({"type": "histogram", "column": col}), 
-
-        # 2. Box plot for numeric columns
-        for col in numeric_cols:
-            specs.append({"type": "boxplot", "column": col})
-
-        # 3. Line plot for time/index trends
-        if len(numeric_cols) > 0:
-            specs.append({"type": "lineplot", "columns": numeric_cols})
-
-        # 4. Bar chart for categorical columns
-        for col in categorical_cols:
-            specs.append({"type": "barchart", "column": col})
-
-        # 5. Scatter plot for pairs of numeric columns
-        if len(numeric_cols) >= 2:
-            for i in range(len(numeric_cols) - 1):
-                specs.append({
-                    "type": "scatter",
-                    "x": numeric_cols[i],
-                    "y": numeric_cols[i + 1]
-                })
-
-        # 6. Correlation heatmap
-        if len(numeric_cols) >= 2:
-            specs.append({"type": "heatmap", "columns": numeric_cols})
-
-        return specs
-
-
-    def generate_visualizations(self, df: pd.DataFrame, specs):
-        images = []
-
-        for spec in specs:
-            plt.figure(figsize=(6, 4))
-
-            # =========================
-            # HISTOGRAM
-            # =========================
-            if spec["type"] == "histogram":
-                col = spec["column"]
-                df[col].hist()
-                plt.title(f"Histogram: {col}")
-
-            # =========================
-            # BOXPLOT
-            # =========================
-            elif spec["type"] == "boxplot":
-                col = spec["column"]
-                sns.boxplot(x=df[col])
-                plt.title(f"Box Plot: {col}")
-
-            # =========================
-            # LINE PLOT
-            # =========================
-            elif spec["type"] == "lineplot":
-                cols = spec["columns"]
-                df[cols].plot()
-                plt.title("Line Plot of Numeric Columns")
-                plt.legend(cols)
-
-            # =========================
-            # BAR CHART
-            # =========================
-            elif spec["type"] == "barchart":
-                col = spec["column"]
-                df[col].value_counts().plot(kind="bar")
-                plt.title(f"Bar Chart: {col}")
-
-            # =========================
-            # SCATTER PLOT
-            # =========================
-            elif spec["type"] == "scatter":
-                x = spec["x"]
-                y = spec["y"]
-                plt.scatter(df[x], df[y])
-                plt.xlabel(x)
-                plt.ylabel(y)
-                plt.title(f"Scatter Plot: {x} vs {y}")
-
-            # =========================
-            # HEATMAP
-            # =========================
-            elif spec["type"] == "heatmap":
-                cols = spec["columns"]
-                corr = df[cols].corr()
-                sns.heatmap(corr, annot=True, cmap="coolwarm")
-                plt.title("Correlation Heatmap")
-
-            # Save the plot to Base64
-            buffer = BytesIO()
-            plt.savefig(buffer, format="png", bbox_inches="tight")
-            buffer.seek(0)
-            img_b64 = base64.b64encode(buffer.read()).decode("utf-8")
-            plt.close()
-
-            images.append(img_b64)
-
-        return images
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
@@ -0,0 +1,360 @@
+# app/database/dataset_registry.py
+import os
+import json
+import hashlib
+import shutil
+import threading
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+from app.utils.shared_state import file_lock
+
+DATASET_DIR = os.getenv("DATASET_DIR", "datasets")
+
+# original row position of every stored row (hidden from callers)
+ROW_COLUMN = "__row__"
+
+
+def _widen(left: pa.DataType, right: pa.DataType) -> pa.DataType:
+    if left == right:
+        return left
+    if pa.types.is_null(left):
+        return right
+    if pa.types.is_null(right):
+        return left
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(left) for check in numeric) and any(check(right) for check in numeric):
+        return pa.float64()
+    return pa.large_string()
+
+
+def _open_file(path: str, columns=None) -> pa.Table:
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if columns is not None:
+        table = table.select([*columns, ROW_COLUMN])
+    return table
+
+
+def _segments(entry):
+    return entry.get("segments", [entry["path"]])
+
+
+def _open_entry(entry, columns=None) -> pa.Table:
+    """
+    All segments of a dataset (one per upload when rows were appended)
+    as one table. Segments whose types differ are widened to a common
+    schema and columns missing from a segment are null there.
+    """
+    tables = [_open_file(path) for path in _segments(entry)]
+    if columns is not None:
+        wanted = [*columns, ROW_COLUMN]
+    else:
+        wanted = list(dict.fromkeys(name for table in tables for name in table.column_names))
+
+    for i, table in enumerate(tables):
+        for name in wanted:
+            if name not in table.column_names:
+                table = table.append_column(name, pa.nulls(len(table)))
+        tables[i] = table.select(wanted)
+    if len(tables) == 1:
+        return tables[0]
+
+    types = {}
+    for table in tables:
+        for field in table.schema:
+            types[field.name] = _widen(types.get(field.name, pa.null()), field.type)
+    schema = pa.schema([(name, types[name]) for name in tables[0].column_names])
+    return pa.concat_tables([table.cast(schema) for table in tables])
+
+
+def _to_frame(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas().set_index(ROW_COLUMN).rename_axis(None)
+
+
+def _iter_frames(table: pa.Table):
+    for batch in table.to_batches():
+        yield _to_frame(pa.Table.from_batches([batch], schema=table.schema))
+
+
+def write_frame(df: pd.DataFrame, path: str):
+    """Writes one frame (index and dtypes included) to an Arrow IPC file in a single step."""
+    table = pa.Table.from_pandas(df.assign(**{ROW_COLUMN: df.index.to_numpy()}), preserve_index=False)
+    with pa.OSFile(f"{path}.tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_frame(path: str, columns=None) -> pd.DataFrame:
+    """Memory-mapped read of a file written by write_frame, restricted to `columns`."""
+    return _to_frame(_open_file(path, columns))
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ColumnarWriter:
+    """
+    Appends DataFrame chunks to an Arrow IPC file. The first chunk fixes
+    the schema; if a later chunk doesn't fit (e.g. an int column turns
+    fractional), the schema is widened and the rows written so far are
+    rewritten once.
+    """
+
+    def __init__(self, registry: "DatasetRegistry", dataset_name: str, version: str, path: str,
+                 append: bool = False):
+        self.registry = registry
+        self.dataset_name = dataset_name
+        self.version = version
+        self.path = path
+        self.append = append
+        self.rows = 0
+        self._schema = None
+        self._sink = None
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df.assign(**{ROW_COLUMN: df.index.to_numpy()}), preserve_index=False)
+
+        if self._schema is None:
+            self._open(table.schema)
+        elif not table.schema.equals(self._schema):
+            try:
+                table = table.select(self._schema.names).cast(self._schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, KeyError):
+                self._rewrite_widened(table.schema)
+                table = table.select(self._schema.names).cast(self._schema)
+
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def _open(self, schema: pa.Schema):
+        self._schema = schema.remove_metadata()
+        self._sink = pa.OSFile(f"{self.path}.tmp", "wb")
+        self._writer = pa.ipc.new_file(self._sink, self._schema)
+
+    def _rewrite_widened(self, other: pa.Schema):
+        fields = [
+            pa.field(field.name, _widen(field.type, other.field(field.name).type))
+            if field.name in other.names else field
+            for field in self._schema
+        ]
+        self._close_writer()
+        os.replace(f"{self.path}.tmp", f"{self.path}.old")
+
+        with pa.memory_map(f"{self.path}.old", "r") as source:
+            reader = pa.ipc.open_file(source)
+            self._open(pa.schema(fields))
+            for i in range(reader.num_record_batches):
+                self._writer.write_table(pa.Table.from_batches([reader.get_batch(i)]).cast(self._schema))
+        os.remove(f"{self.path}.old")
+
+    def _close_writer(self):
+        self._writer.close()
+        self._sink.close()
+        self._writer = None
+
+    def close(self):
+        """
+        Finishes the file and makes it the dataset's current version
+        (with append=True, the newest segment of it).
+        """
+        if self._writer is None:
+            return
+        self._close_writer()
+        os.replace(f"{self.path}.tmp", self.path)
+        self.registry._commit(self)
+
+    def open_table(self, columns=None) -> pa.Table:
+        """The finished file (this segment only), memory-mapped."""
+        if columns is not None:
+            columns = [col for col in columns if col in self._schema.names]
+        return _open_file(self.path, columns)
+
+    def iter_batches(self, columns=None):
+        """Reads the finished file back chunk by chunk (see DatasetRegistry.iter_batches)."""
+        if columns is not None:
+            columns = [col for col in columns if col in self._schema.names]
+        return _iter_frames(_open_file(self.path, columns))
+
+    def abort(self):
+        """Drops an unfinished file; a no-op once close() has committed it."""
+        if self._writer is None:
+            return
+        self._close_writer()
+        try:
+            os.remove(f"{self.path}.tmp")
+        except OSError:
+            pass
+
+
+class DatasetRegistry:
+    """
+    Keeps each uploaded dataset as an Arrow IPC file (latest version per
+    name) and reopens it memory-mapped, so readers only page in the
+    columns they select and never re-parse the CSV. The JSON index is
+    updated under a file lock, so several server processes can share
+    one directory.
+    """
+
+    def __init__(self, directory: str = DATASET_DIR):
+        self.directory = directory
+        self._index_path = os.path.join(directory, "registry.json")
+        self._lock_path = os.path.join(directory, "registry.lock")
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        tmp_path = f"{self._index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+    def _slug(self, dataset_name: str) -> str:
+        return hashlib.sha1(dataset_name.encode("utf-8")).hexdigest()[:16]
+
+    def lock(self, dataset_name: str):
+        """Serializes analyses of one dataset across threads and processes."""
+        return file_lock(os.path.join(self.directory, f"{self._slug(dataset_name)}.lock"))
+
+    def writer(self, dataset_name: str, version: str, append: bool = False) -> ColumnarWriter:
+        """
+        With append=True the written rows become a new segment added to
+        the dataset's current ones instead of replacing them.
+        """
+        path = os.path.join(self.directory, f"{self._slug(dataset_name)}_{version}.arrow")
+        return ColumnarWriter(self, dataset_name, version, path, append)
+
+    def state_path(self, dataset_name: str, version: str) -> str:
+        """Directory for the analysis state of one dataset version (see AnalysisState)."""
+        return os.path.join(self.directory, f"{self._slug(dataset_name)}_{version}.state")
+
+    def _commit(self, writer: ColumnarWriter):
+        with file_lock(self._lock_path):
+            index = self._read_index()
+            previous = index.get(writer.dataset_name)
+            segments = [writer.path]
+            rows = writer.rows
+            if writer.append and previous:
+                segments = [*_segments(previous), writer.path]
+                rows += previous["rows"]
+
+            entry = {"version": writer.version, "path": writer.path, "segments": segments, "rows": rows}
+            schema = _open_entry(entry).schema
+            index[writer.dataset_name] = {
+                **entry,
+                "columns": [name for name in schema.names if name != ROW_COLUMN],
+                "types": {f.name: str(f.type) for f in schema if f.name != ROW_COLUMN},
+                "registered_at": datetime.now().isoformat(),
+            }
+            # an append keeps the state it builds on until commit_state() replaces it
+            if writer.append and previous and previous.get("state"):
+                index[writer.dataset_name]["state"] = previous["state"]
+            self._write_index(index)
+
+        if previous:
+            for path in set(_segments(previous)) - set(segments):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            state = previous.get("state")
+            if state and not writer.append and state != self.state_path(writer.dataset_name, writer.version):
+                shutil.rmtree(state, ignore_errors=True)
+
+    def commit_state(self, dataset_name: str, version: str):
+        """Records the state saved under state_path() once the analysis that wrote it has finished."""
+        path = self.state_path(dataset_name, version)
+        with file_lock(self._lock_path):
+            index = self._read_index()
+            entry = index.get(dataset_name)
+            if entry is None or entry["version"] != version:
+                return
+            previous = entry.get("state")
+            entry["state"] = path
+            self._write_index(index)
+
+        if previous and previous != path:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def has_state(self, dataset_name: str, version: str) -> bool:
+        return self.has_version(dataset_name, version) \
+            and self.state(dataset_name) == self.state_path(dataset_name, version)
+
+    def state(self, dataset_name: str):
+        """Path of the dataset's current analysis state, if it has one."""
+        entry = self.get(dataset_name)
+        if entry is None or not entry.get("state") or not os.path.isdir(entry["state"]):
+            return None
+        return entry["state"]
+
+    def link_version(self, dataset_name: str, version: str) -> bool:
+        """
+        Registers `dataset_name` from another dataset already stored with
+        the same content version (a hard link when possible), so identical
+        uploads under a new name are not converted again.
+        """
+        for entry in self.list().values():
+            if entry["version"] == version and len(_segments(entry)) == 1 and os.path.exists(entry["path"]):
+                writer = self.writer(dataset_name, version)
+                if writer.path != entry["path"]:
+                    try:
+                        os.link(entry["path"], f"{writer.path}.tmp")
+                    except OSError:
+                        shutil.copyfile(entry["path"], f"{writer.path}.tmp")
+                    os.replace(f"{writer.path}.tmp", writer.path)
+                writer.rows = entry["rows"]
+                self._commit(writer)
+
+                state = self.state_path(dataset_name, version)
+                if entry.get("state") and os.path.isdir(entry["state"]) and entry["state"] != state:
+                    shutil.rmtree(state, ignore_errors=True)
+                    shutil.copytree(entry["state"], state, copy_function=_link_or_copy)
+                    self.commit_state(dataset_name, version)
+                return True
+        return False
+
+    def get(self, dataset_name: str):
+        return self._read_index().get(dataset_name)
+
+    def list(self):
+        return self._read_index()
+
+    def has_version(self, dataset_name: str, version: str) -> bool:
+        entry = self.get(dataset_name)
+        return entry is not None and entry["version"] == version \
+            and all(os.path.exists(path) for path in _segments(entry))
+
+    def open_table(self, dataset_name: str, columns=None) -> pa.Table:
+        """Memory-mapped, zero-copy view of the dataset restricted to `columns`."""
+        entry = self.get(dataset_name)
+        if entry is None:
+            raise KeyError(dataset_name)
+        return _open_entry(entry, columns)
+
+    def schema(self, dataset_name: str) -> pa.Schema:
+        """The dataset's column types (widened across segments), read from file footers only."""
+        entry = self.get(dataset_name)
+        if entry is None:
+            raise KeyError(dataset_name)
+        types = {}
+        for path in _segments(entry):
+            for field in pa.ipc.open_file(pa.memory_map(path, "r")).schema:
+                types[field.name] = _widen(types.get(field.name, pa.null()), field.type)
+        return pa.schema([(name, data_type) for name, data_type in types.items() if name != ROW_COLUMN])
+
+    def load(self, dataset_name: str, columns=None) -> pd.DataFrame:
+        return _to_frame(self.open_table(dataset_name, columns))
+
+    def iter_batches(self, dataset_name: str, columns=None):
+        """Yields the stored chunks as DataFrames, indexed by original row position."""
+        return _iter_frames(self.open_table(dataset_name, columns))
@@ -1,71 +1,268 @@
 # app/database/vector_db.py
+import os
+import re
+import json
+import hashlib
+import threading
 from datetime import datetime
+import numpy as np
 
-try:
-    import chromadb
-    from chromadb.config import Settings
-    CHROMADB_AVAILABLE = True
-except Exception:
-    CHROMADB_AVAILABLE = False
+from app.utils.embeddings import get_embedder
+from app.utils.shared_state import SERVER_WORKERS, file_lock
+
+# "auto" uses Chroma's HNSW index when installed and the server runs a single
+# process, else the NumPy index (Chroma's embedded client is not safe to share
+# between processes)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+
+
+class NumpyIndex:
+    """
+    Exact cosine-similarity index over normalized vectors, sharded by
+    dataset so a dataset filter only scores that dataset's rows. Each
+    shard is persisted as a .npy matrix plus a JSON record list and is
+    loaded back on startup without re-embedding.
+
+    Several server processes may share the directory: writes hold a
+    per-shard file lock, and reads reload any shard whose file changed
+    since it was loaded, so contexts stored by one worker are visible
+    to /ask on every other.
+    """
+
+    def __init__(self, directory: str, embedder_name: str):
+        self.directory = directory
+        self.embedder_name = embedder_name
+        self._shards = {}
+        # (mtime_ns, size) of each shard's .json file when it was loaded
+        self._stamps = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._refresh()
+
+    def _shard_path(self, dataset: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(dataset.encode("utf-8")).hexdigest()[:16])
+
+    def _load_shard(self, path: str, stamp):
+        base = path[: -len(".json")]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                shard = json.load(f)
+            vectors = np.load(f"{base}.npy")
+        except (OSError, ValueError):
+            return
+        if len(vectors) != len(shard["records"]):
+            # caught between another process's .npy and .json replace; retried on the next read
+            return
+        if shard.get("embedder") != self.embedder_name:
+            # written by another embedding model; vectors are not comparable
+            vectors = get_embedder().embed(r["text"] for r in shard["records"])
+        self._shards[shard["dataset"]] = {"vectors": vectors, "records": shard["records"]}
+        self._stamps[path] = stamp
+
+    def _refresh(self, dataset: str = None):
+        """Reloads shards written by other processes and drops those they deleted (call with the lock held)."""
+        if dataset is not None:
+            paths = [f"{self._shard_path(dataset)}.json"]
+        else:
+            paths = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+            paths += [f"{self._shard_path(name)}.json" for name in self._shards]
+
+        for path in set(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            stamp = (stat.st_mtime_ns, stat.st_size) if stat else None
+            if stamp == self._stamps.get(path):
+                continue
+            if stamp is None:
+                self._stamps.pop(path, None)
+                for name in [name for name in self._shards if f"{self._shard_path(name)}.json" == path]:
+                    del self._shards[name]
+            else:
+                self._load_shard(path, stamp)
+
+    def _save(self, dataset: str):
+        shard = self._shards[dataset]
+        base = self._shard_path(dataset)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(f"{base}.npy{suffix}", "wb") as f:
+            np.save(f, shard["vectors"])
+        with open(f"{base}.json{suffix}", "w", encoding="utf-8") as f:
+            json.dump({"dataset": dataset, "embedder": self.embedder_name, "records": shard["records"]}, f)
+
+        os.replace(f"{base}.npy{suffix}", f"{base}.npy")
+        os.replace(f"{base}.json{suffix}", f"{base}.json")
+        stat = os.stat(f"{base}.json")
+        self._stamps[f"{base}.json"] = (stat.st_mtime_ns, stat.st_size)
+
+    def add(self, dataset: str, ids, vectors, texts, metadatas):
+        records = [
+            {"id": doc_id, "text": text, "metadata": meta}
+            for doc_id, text, meta in zip(ids, texts, metadatas)
+        ]
+        with self._lock, file_lock(f"{self._shard_path(dataset)}.lock"):
+            self._refresh(dataset)
+            shard = self._shards.setdefault(dataset, {"vectors": np.empty((0, vectors.shape[1]), dtype="float32"), "records": []})
+            shard["vectors"] = np.vstack([shard["vectors"], vectors])
+            shard["records"].extend(records)
+            self._save(dataset)
+
+    def delete(self, dataset: str):
+        base = self._shard_path(dataset)
+        with self._lock, file_lock(f"{base}.lock"):
+            self._shards.pop(dataset, None)
+            self._stamps.pop(f"{base}.json", None)
+            for path in (f"{base}.json", f"{base}.npy"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def search(self, vector, limit: int, dataset: str = None, where=None):
+        with self._lock:
+            self._refresh(dataset)
+            shards = [self._shards.get(dataset)] if dataset is not None else list(self._shards.values())
+            shards = [s for s in shards if s is not None and len(s["records"])]
+            if not shards:
+                return []
+            vectors = np.vstack([s["vectors"] for s in shards])
+            records = [r for s in shards for r in s["records"]]
+
+        if where:
+            keep = np.array([all(r["metadata"].get(k) == v for k, v in where.items()) for r in records], dtype=bool)
+            if not keep.any():
+                return []
+            vectors = vectors[keep]
+            records = [r for r, k in zip(records, keep) if k]
+
+        scores = vectors @ vector
+        top = np.argpartition(-scores, min(limit, len(scores)) - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), records[i]) for i in top]
 
 
 class VectorStore:
     def __init__(self, persist_directory: str = "./chroma_db"):
         self.persist_directory = persist_directory
-        self._store = {}
+        self.embedder = get_embedder()
+        self._index = None
+        self._collection = None
+        self._init_lock = threading.Lock()
 
-        if CHROMADB_AVAILABLE:
-            try:
-                self.client = chromadb.PersistentClient(
-                    path=persist_directory,
-                    settings=Settings(anonymized_telemetry=False)
-                )
+    def _backend(self):
+        """Creates the index on first use so the embedding model loads lazily."""
+        with self._init_lock:
+            if self._collection is not None or self._index is not None:
+                return
 
-                self.collection = self.client.get_or_create_collection(
-                    name="data_memory",
-                    metadata={"hnsw:space": "cosine"},
-                    embedding_function=None
-                )
-            except Exception:
-                self._fallback_init()
-        else:
-            self._fallback_init()
+            use_chroma = VECTOR_BACKEND == "chroma" or (VECTOR_BACKEND == "auto" and SERVER_WORKERS == 1)
+            if use_chroma:
+                try:
+                    # imported here rather than at module load: chromadb takes about a second to import
+                    import chromadb
+                    from chromadb.config import Settings
+
+                    self.client = chromadb.PersistentClient(
+                        path=self.persist_directory,
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+
+                    # one collection per embedding model; vectors from different models don't mix
+                    slug = re.sub(r"[^a-zA-Z0-9_-]", "-", self.embedder.name)[:40]
+                    self._collection = self.client.get_or_create_collection(
+                        name=f"data_memory_{slug}",
+                        metadata={"hnsw:space": "cosine"},
+                        embedding_function=None
+                    )
+                    return
+                except Exception:
+                    self._collection = None
+
+            self._index = NumpyIndex(os.path.join(self.persist_directory, "numpy_index"), self.embedder.name)
+
+    def warm_up(self):
+        """Opens the index and loads the embedding model ahead of the first request."""
+        self._backend()
+
+    def add_contexts(self, dataset_name: str, texts, metadatas=None):
+        """
+        Embeds `texts` in batches and stores them under `dataset_name`.
+        A failed Chroma write is raised rather than stored in the NumPy
+        index, which searches would not read while Chroma is the backend.
+        """
+        self._backend()
+        texts = list(texts)
+        now = datetime.now()
+        ids = [f"{dataset_name}_{now.timestamp()}_{i}" for i in range(len(texts))]
+        metas = [
+            {**(extra or {}), "dataset": dataset_name, "timestamp": now.isoformat()}
+            for extra in (metadatas or [None] * len(texts))
+        ]
+        vectors = self.embedder.embed(texts)
 
-    def _fallback_init(self):
-        self._store = {}
+        if self._collection is not None:
+            self._collection.add(
+                ids=ids,
+                documents=texts,
+                embeddings=vectors.tolist(),
+                metadatas=metas
+            )
+            return ids
+
+        self._index.add(dataset_name, ids, vectors, texts, metas)
+        return ids
 
     def add_context(self, dataset_name: str, text: str):
-        doc_id = f"{dataset_name}_{datetime.now().timestamp()}"
-        meta = {"dataset": dataset_name, "timestamp": datetime.now().isoformat()}
+        return self.add_contexts(dataset_name, [text])[0]
+
+    def delete_dataset(self, dataset_name: str):
+        self._backend()
 
-        if CHROMADB_AVAILABLE and hasattr(self, "collection"):
+        if self._collection is not None:
             try:
-                self.collection.add(
-                    ids=[doc_id],
-                    documents=[text],
-                    metadatas=[meta]
-                )
-                return doc_id
+                self._collection.delete(where={"dataset": dataset_name})
             except Exception:
                 pass
 
-        self._store[doc_id] = {"text": text, "metadata": meta}
-        return doc_id
+        if self._index is not None:
+            self._index.delete(dataset_name)
 
-    def search(self, query: str, limit: int = 5):
-        if CHROMADB_AVAILABLE and hasattr(self, "collection"):
-            try:
-                results = self.collection.query(
-                    query_texts=[query],
-                    n_results=limit
+    def replace_contexts(self, dataset_name: str, texts, metadatas=None):
+        """Swaps a dataset's stored chunks for a new upload's chunks."""
+        self.delete_dataset(dataset_name)
+        return self.add_contexts(dataset_name, texts, metadatas)
+
+    def search_records(self, query: str, limit: int = 5, dataset: str = None, where=None):
+        """
+        Returns up to `limit` {"text", "metadata", "score"} dicts, most
+        similar first, optionally restricted to a dataset and to
+        metadata fields equal to the values in `where`.
+        """
+        self._backend()
+        vector = self.embedder.embed([query])[0]
+        filters = {**(where or {}), **({"dataset": dataset} if dataset is not None else {})}
+
+        if self._collection is not None:
+            clauses = [{key: value} for key, value in filters.items()]
+            results = self._collection.query(
+                query_embeddings=[vector.tolist()],
+                n_results=limit,
+                where=(clauses[0] if len(clauses) == 1 else {"$and": clauses}) if clauses else None
+            )
+            return [
+                {"text": doc, "metadata": meta, "score": 1.0 - distance}
+                for doc, meta, distance in zip(
+                    results["documents"][0], results["metadatas"][0], results["distances"][0]
                 )
-                docs = results["documents"][0]
-                return docs
-            except Exception:
-                pass
+            ]
 
         return [
-            item["text"]
-            for item in self._store.values()
-            if query.lower() in item["text"].lower()
-        ][:limit]
+            {"text": record["text"], "metadata": record["metadata"], "score": score}
+            for score, record in self._index.search(vector, limit, dataset, where)
+        ]
+
+    def search(self, query: str, limit: int = 5, dataset: str = None):
+        return [record["text"] for record in self.search_records(query, limit, dataset)]
@@ -0,0 +1,304 @@
+# app/utils/aggregate_cube.py
+import os
+import json
+import shutil
+from itertools import combinations
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.database.dataset_registry import ROW_COLUMN
+from app.utils.column_stats import DatasetProfile
+from app.utils.query_engine import TIME_GRAINS, apply_filters, finish, split_grain, time_buckets, to_timestamps
+
+AGGREGATE_CUBE = os.getenv("AGGREGATE_CUBE", "true").lower() == "true"
+# categorical columns with at most this many distinct values become cube dimensions
+CUBE_MAX_CARDINALITY = int(os.getenv("CUBE_MAX_CARDINALITY", 50))
+CUBE_MAX_DIMENSIONS = int(os.getenv("CUBE_MAX_DIMENSIONS", 6))
+CUBE_MAX_MEASURES = int(os.getenv("CUBE_MAX_MEASURES", 20))
+CUBE_MAX_DATE_COLUMNS = int(os.getenv("CUBE_MAX_DATE_COLUMNS", 2))
+CUBE_TIME_GRAINS = [grain for grain in os.getenv("CUBE_TIME_GRAINS", "day,month,quarter,year").split(",")
+                    if grain in TIME_GRAINS]
+# groupings with more groups than this are dropped (queries on them scan the rows instead)
+CUBE_MAX_GROUPS = int(os.getenv("CUBE_MAX_GROUPS", 20_000))
+
+ROWS = "__rows__"
+PARTIALS = {"count": "sum", "sum": "sum", "min": "min", "max": "max"}
+
+
+def _looks_like_dates(values: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return True
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return False
+    values = values.dropna().astype(str).head(200)
+    if values.empty:
+        return False
+    return pd.to_datetime(values, errors="coerce", format="ISO8601").notna().mean() >= 0.9
+
+
+def cube_layout(profile: DatasetProfile, sample: pd.DataFrame):
+    """
+    What the cube is built over: date columns (by their values in the
+    row sample), low-cardinality categorical dimensions (fewest
+    distinct values first) and the numeric measures.
+    """
+    numeric = set(profile.numeric_columns)
+    dates = [col for col in sample.columns if col not in numeric and _looks_like_dates(sample[col])]
+    dates = dates[:CUBE_MAX_DATE_COLUMNS]
+
+    dimensions = [
+        col for col in profile.columns
+        if col not in numeric and col not in dates and 2 <= profile.distinct_count(col) <= CUBE_MAX_CARDINALITY
+    ]
+    dimensions = sorted(dimensions, key=profile.distinct_count)[:CUBE_MAX_DIMENSIONS]
+
+    measures = [col for col in profile.numeric_columns if profile.std.get(col, 0) > 0][:CUBE_MAX_MEASURES]
+    return {"dimensions": dimensions, "measures": measures, "dates": dates, "grains": list(CUBE_TIME_GRAINS)}
+
+
+def layout_columns(layout):
+    return list(dict.fromkeys(layout["dimensions"] + layout["measures"] + layout["dates"]))
+
+
+def _groupings(layout):
+    dimensions = layout["dimensions"]
+    keys = [(dim,) for dim in dimensions] + list(combinations(dimensions, 2))
+    for date in layout["dates"]:
+        for grain in layout["grains"]:
+            bucket = f"{date}:{grain}"
+            keys += [(bucket,)] + [(bucket, dim) for dim in dimensions]
+    return keys
+
+
+def _aggregate(table: pa.Table, keys, how) -> pa.Table:
+    """
+    Groups `table` by `keys`. `how(column)` names the Arrow aggregate
+    for each other column ("count_all" counts rows); the results keep
+    the column names.
+    """
+    aggregations, names = [], {}
+    for name in table.column_names:
+        if name in keys:
+            continue
+        func = how(name)
+        if func == "count_all":
+            aggregations.append(([], "count_all"))
+            names["count_all"] = name
+        else:
+            # a group whose values are all null sums to 0, as in pandas
+            options = pc.ScalarAggregateOptions(min_count=0) if func == "sum" else None
+            aggregations.append((name, func, options))
+            names[f"{name}_{func}"] = name
+    grouped = table.group_by(list(keys)).aggregate(aggregations)
+    return grouped.rename_columns([names.get(name, name) for name in grouped.column_names])
+
+
+def _partial_kind(name: str) -> str:
+    """"count", "sum", "min" or "max" for a partial column like "revenue__sum"; __rows__ counts rows."""
+    return "count" if name == ROWS else name.rsplit("__", 1)[1]
+
+
+def _rollup(table: pa.Table, keys) -> pa.Table:
+    """Re-aggregates partials to fewer or coarser `keys`."""
+    return _aggregate(table, keys, lambda name: PARTIALS[_partial_kind(name)])
+
+
+def _derivable(source, target) -> bool:
+    """Whether grouping `target` rolls up from `source`: each key is in it, or a finer bucket of its date is."""
+    grains = list(TIME_GRAINS)
+    for key in target:
+        if key in source:
+            continue
+        date, grain = split_grain(key)
+        finer = [split_grain(k)[1] for k in source if split_grain(k)[0] == date and split_grain(k)[1]]
+        if grain is None or not any(grains.index(g) < grains.index(grain) for g in finer):
+            return False
+    return True
+
+
+def _derive(source, table: pa.Table, target) -> pa.Table:
+    for key in target:
+        if key not in source:
+            date, grain = split_grain(key)
+            finer = next(k for k in source if split_grain(k)[0] == date)
+            table = table.append_column(key, time_buckets(table.column(finer), grain))
+    return _rollup(table.drop_columns([key for key in source if key not in target]), target)
+
+
+class AggregateCube:
+    """
+    Precomputed partial aggregates of a dataset, so group-level queries
+    are answered from a few hundred rows instead of a full scan.
+
+    For each grouping (every dimension, every pair of dimensions, and
+    each date column's time buckets alone and with each dimension) it
+    keeps the row count plus count/sum/min/max of every measure. These
+    partials merge exactly, so an append folds the new rows' cube into
+    the old one, and any coarser query (fewer keys, filters on keys)
+    rolls up from the smallest grouping that covers it.
+
+    Saved as a directory of Arrow files (one per grouping) plus a
+    manifest; groupings are memory-mapped only when a query needs them.
+    """
+
+    def __init__(self, layout, groupings=None, directory: str = None, manifest=None):
+        self.layout = layout
+        # keys -> pa.Table, for cubes built in this process
+        self._tables = dict(groupings or {})
+        self.directory = directory
+        # keys -> (file name, rows), for cubes loaded from disk
+        self._files = manifest or {}
+
+    @classmethod
+    def build(cls, table: pa.Table, layout) -> "AggregateCube":
+        """Aggregates every grouping of `layout` from the rows in `table` (Arrow hash group-by)."""
+        if ROW_COLUMN in table.column_names:
+            table = table.drop_columns([ROW_COLUMN])
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+
+        measures = pa.table({
+            **{f"{col}__{kind}": table.column(col) for col in layout["measures"] for kind in PARTIALS},
+            ROWS: pa.nulls(table.num_rows, pa.int8()),
+        })
+        # dictionary-encoded keys hash as integers
+        keys = {col: pc.dictionary_encode(table.column(col)) for col in layout["dimensions"]}
+        timestamps = {date: to_timestamps(table.column(date)) for date in layout["dates"]}
+
+        def how(name):
+            return "count_all" if name == ROWS else _partial_kind(name)
+
+        # finest groupings first; coarser ones roll up from them instead of rescanning the rows
+        grains = list(TIME_GRAINS)
+        order = sorted(_groupings(layout), key=lambda grouping: (
+            -len(grouping), min((grains.index(split_grain(key)[1]) for key in grouping if split_grain(key)[1]), default=0)
+        ))
+        groupings = {}
+        for grouping in order:
+            sources = [keys for keys in groupings if _derivable(keys, grouping)]
+            if sources:
+                source = min(sources, key=lambda keys: groupings[keys].num_rows)
+                grouped = _derive(source, groupings[source], grouping)
+            else:
+                rows = measures
+                for key in grouping:
+                    date, grain = split_grain(key)
+                    if key not in keys:
+                        keys[key] = pc.dictionary_encode(time_buckets(timestamps[date], grain))
+                    rows = rows.append_column(key, keys[key])
+                grouped = _aggregate(rows, grouping, how)
+                for key in grouping:
+                    i = grouped.schema.get_field_index(key)
+                    grouped = grouped.set_column(i, key, grouped.column(i).cast(grouped.schema.field(i).type.value_type))
+            if grouped.num_rows <= CUBE_MAX_GROUPS:
+                groupings[grouping] = grouped
+        return cls(layout, groupings)
+
+    def groupings(self):
+        return list(self._tables) + [keys for keys in self._files if keys not in self._tables]
+
+    def table(self, keys) -> pa.Table:
+        if keys not in self._tables:
+            path = os.path.join(self.directory, self._files[keys][0])
+            self._tables[keys] = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return self._tables[keys]
+
+    def rows(self, keys) -> int:
+        return self._tables[keys].num_rows if keys in self._tables else self._files[keys][1]
+
+    def merge(self, other: "AggregateCube") -> "AggregateCube":
+        """The cube of both cubes' rows; both must share a layout."""
+        groupings = {}
+        for keys in set(self.groupings()) & set(other.groupings()):
+            combined = pa.concat_tables([self.table(keys), other.table(keys)], promote_options="permissive")
+            merged = _rollup(combined, keys)
+            if merged.num_rows <= CUBE_MAX_GROUPS:
+                groupings[keys] = merged
+        return AggregateCube(self.layout, groupings)
+
+    def save(self, directory: str):
+        tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        manifest = []
+        for i, keys in enumerate(self.groupings()):
+            table = self.table(keys)
+            with pa.OSFile(os.path.join(tmp_dir, f"{i}.arrow"), "wb") as sink, \
+                    pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            manifest.append({"keys": list(keys), "file": f"{i}.arrow", "rows": table.num_rows})
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"layout": self.layout, "groupings": manifest}, f)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+        self.directory = directory
+
+    @classmethod
+    def load(cls, directory: str):
+        """The cube saved in `directory`, or None if there is none."""
+        try:
+            with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        files = {tuple(item["keys"]): (item["file"], item["rows"]) for item in manifest["groupings"]}
+        return cls(manifest["layout"], directory=directory, manifest=files)
+
+    def counts(self, column) -> pd.Series:
+        """Exact value counts of a dimension over all rows (nulls excluded), or None."""
+        if (column,) not in self.groupings():
+            return None
+        table = self.table((column,))
+        counts = pd.Series(table.column(ROWS).to_numpy(), index=table.column(column).to_pandas())
+        return counts[counts.index.notna()].sort_values(ascending=False, kind="stable")
+
+    def answer(self, plan: dict):
+        """
+        Runs a validated query plan (see query_engine) from the cube, or
+        returns None if it needs row-level data: raw rows, medians,
+        standard deviations, distinct counts, non-measure columns, or
+        keys no single grouping holds. Same return value as execute_plan.
+        """
+        if not plan["aggregates"] or plan["select"]:
+            return None
+
+        needed = {ROWS: "sum"}
+        for item in plan["aggregates"]:
+            column, func = item["column"], item["func"]
+            if column == "*":
+                continue
+            if column not in self.layout["measures"] or func not in ("count", "sum", "min", "max", "mean"):
+                return None
+            for kind in (("sum", "count") if func == "mean" else (func,)):
+                needed[f"{column}__{kind}"] = PARTIALS[kind]
+
+        keys = set(plan["group_by"]) | {item["column"] for item in plan["filters"]}
+        candidates = [grouping for grouping in self.groupings() if keys <= set(grouping)]
+        if not candidates:
+            return None
+        table = apply_filters(self.table(min(candidates, key=self.rows)), plan["filters"])
+
+        df = table.select([*plan["group_by"], *needed]).to_pandas()
+        if plan["group_by"]:
+            grouped = df.groupby(plan["group_by"], dropna=False, sort=False, observed=True)
+            partials = grouped.agg(**{name: (name, how) for name, how in needed.items()}).reset_index()
+        else:
+            partials = pd.DataFrame({name: [df[name].agg(how)] for name, how in needed.items()})
+
+        result = partials[plan["group_by"]].copy()
+        for item in plan["aggregates"]:
+            column, func = item["column"], item["func"]
+            if column == "*":
+                result[item["as"]] = partials[ROWS]
+            elif func == "mean":
+                result[item["as"]] = partials[f"{column}__sum"] / partials[f"{column}__count"]
+            else:
+                result[item["as"]] = partials[f"{column}__{func}"]
+        return finish(result, plan)
+
+
+def load_cube(state_dir: str):
+    """The cube saved with a dataset's analysis state (see AnalysisState), if any."""
+    return AggregateCube.load(os.path.join(state_dir, "cube")) if state_dir else None
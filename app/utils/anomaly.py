@@ -0,0 +1,173 @@
+# app/utils/anomaly.py
+import os
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from app.utils.column_stats import DatasetProfile
+
+ANOMALY_METHODS = os.getenv("ANOMALY_METHODS", "zscore,iqr,mahalanobis").split(",")
+ZSCORE_THRESHOLD = float(os.getenv("ZSCORE_THRESHOLD", 3.0))
+IQR_MULTIPLIER = float(os.getenv("IQR_MULTIPLIER", 1.5))
+MAHALANOBIS_PROBABILITY = float(os.getenv("MAHALANOBIS_PROBABILITY", 0.999))
+# row indices reported per method; counts are always exact
+MAX_ANOMALY_ROWS = int(os.getenv("MAX_ANOMALY_ROWS", 1000))
+ANOMALY_BLOCK_ROWS = int(os.getenv("ANOMALY_BLOCK_ROWS", 100_000))
+
+
+def chi2_quantile(probability: float, dof: int) -> float:
+    """Wilson–Hilferty approximation of the chi-square quantile function."""
+    z = NormalDist().inv_cdf(probability)
+    h = 2.0 / (9.0 * dof)
+    return dof * (1.0 - h + z * np.sqrt(h)) ** 3
+
+
+class AnomalyDetector:
+    """
+    Vectorized anomaly detection over the numeric block of a dataset.
+
+    Thresholds are fixed up front from a DatasetProfile, so chunks of a
+    larger dataset can be fed through `update` one at a time and are all
+    judged against the global statistics. Each chunk is evaluated as a
+    2-D NumPy array in row blocks of ANOMALY_BLOCK_ROWS, so memory stays
+    bounded and time is linear in the row count.
+
+    Methods:
+      zscore       |x - mean| > ZSCORE_THRESHOLD * std (both tails)
+      iqr          x outside [Q1 - m*IQR, Q3 + m*IQR] (quartiles from the sketch)
+      mahalanobis  squared distance over complete rows above the chi-square
+                   quantile, using the profile's covariance matrix
+    """
+
+    def __init__(self, profile: DatasetProfile, methods=ANOMALY_METHODS, exclude=()):
+        self.methods = [m for m in methods if m in ("zscore", "iqr", "mahalanobis")]
+        self.columns = [col for col in profile.numeric_columns if col not in exclude]
+
+        mean = profile.mean.reindex(self.columns).to_numpy(dtype="float64")
+        std = profile.std.reindex(self.columns).to_numpy(dtype="float64")
+        self._mean = mean
+        # columns with no spread never flag anything
+        self._std = np.where(std > 0, std, np.nan)
+
+        quartiles = np.array([profile.quantiles(col, (0.25, 0.75)) for col in self.columns]).reshape(-1, 2)
+        iqr = quartiles[:, 1] - quartiles[:, 0]
+        self._iqr_low = quartiles[:, 0] - IQR_MULTIPLIER * iqr
+        self._iqr_high = quartiles[:, 1] + IQR_MULTIPLIER * iqr
+
+        self._mahalanobis = None
+        cov = profile.covariance()
+        if cov is not None:
+            kept = [i for i, col in enumerate(cov.columns) if col in self.columns]
+            cov, cov_mean = cov.iloc[kept, kept], profile.cov_mean[kept]
+        if "mahalanobis" in self.methods and cov is not None and len(cov.columns) >= 2:
+            self._mahalanobis = {
+                "columns": list(cov.columns),
+                "positions": [self.columns.index(col) for col in cov.columns],
+                "mean": cov_mean,
+                "precision": np.linalg.pinv(cov.to_numpy()),
+                "threshold": chi2_quantile(MAHALANOBIS_PROBABILITY, len(cov.columns)),
+            }
+        elif "mahalanobis" in self.methods:
+            self.methods.remove("mahalanobis")
+
+        self._counts = {m: np.zeros(len(self.columns), dtype="int64") for m in ("zscore", "iqr")}
+        self._row_totals = {m: 0 for m in self.methods}
+        self._rows = {m: [] for m in self.methods}
+
+    def update(self, df: pd.DataFrame):
+        if not self.columns:
+            return self
+
+        block = df.reindex(columns=self.columns).apply(pd.to_numeric, errors="coerce")
+        values = block.to_numpy(dtype="float64", na_value=np.nan)
+        index = df.index.to_numpy()
+
+        for start in range(0, len(values), ANOMALY_BLOCK_ROWS):
+            self._update_block(values[start:start + ANOMALY_BLOCK_ROWS], index[start:start + ANOMALY_BLOCK_ROWS])
+
+        return self
+
+    def _update_block(self, values, index):
+        with np.errstate(invalid="ignore"):
+            if "zscore" in self.methods:
+                self._record("zscore", np.abs(values - self._mean) > ZSCORE_THRESHOLD * self._std, index)
+
+            if "iqr" in self.methods:
+                self._record("iqr", (values < self._iqr_low) | (values > self._iqr_high), index)
+
+        if "mahalanobis" in self.methods:
+            m = self._mahalanobis
+            centered = values[:, m["positions"]] - m["mean"]
+            complete = ~np.isnan(centered).any(axis=1)
+            distance = np.einsum("ij,jk,ik->i", centered[complete], m["precision"], centered[complete])
+            flagged = index[complete][distance > m["threshold"]]
+            self._row_totals["mahalanobis"] += len(flagged)
+            self._keep_rows("mahalanobis", flagged)
+
+    def _record(self, method: str, mask, index):
+        self._counts[method] += mask.sum(axis=0)
+        rows = index[mask.any(axis=1)]
+        self._row_totals[method] += len(rows)
+        self._keep_rows(method, rows)
+
+    def _keep_rows(self, method: str, rows):
+        room = MAX_ANOMALY_ROWS - sum(len(r) for r in self._rows[method])
+        if room > 0 and len(rows):
+            self._rows[method].append(rows[:room])
+
+    def report(self):
+        report = {}
+
+        for method in self.methods:
+            rows = np.concatenate(self._rows[method]) if self._rows[method] else np.empty(0, dtype="int64")
+            entry = {
+                "anomalous_rows": self._row_totals[method],
+                "row_indices": rows.tolist(),
+                "row_indices_truncated": self._row_totals[method] > len(rows),
+            }
+
+            if method == "mahalanobis":
+                entry["columns"] = self._mahalanobis["columns"]
+                entry["threshold"] = float(self._mahalanobis["threshold"])
+            else:
+                entry["counts"] = dict(zip(self.columns, self._counts[method].tolist()))
+                if method == "zscore":
+                    entry["threshold"] = ZSCORE_THRESHOLD
+                else:
+                    entry["bounds"] = {
+                        col: [float(low), float(high)]
+                        for col, low, high in zip(self.columns, self._iqr_low, self._iqr_high)
+                    }
+
+            report[method] = entry
+
+        return report
+
+
+def merge_reports(previous, current):
+    """
+    Folds the report for newly appended rows into the report for the
+    rows before them. Counts add up and row indices are concatenated
+    (still capped at MAX_ANOMALY_ROWS); thresholds and bounds are the
+    current ones. Earlier rows keep the verdicts they got against the
+    statistics of their time, so this is not a full re-evaluation.
+    """
+    merged = {}
+    for method, entry in current.items():
+        before = previous.get(method)
+        if before is None:
+            merged[method] = entry
+            continue
+
+        rows = (before["row_indices"] + entry["row_indices"])[:MAX_ANOMALY_ROWS]
+        total = before["anomalous_rows"] + entry["anomalous_rows"]
+        merged[method] = {
+            **entry,
+            "anomalous_rows": total,
+            "row_indices": rows,
+            "row_indices_truncated": total > len(rows),
+        }
+        if "counts" in entry:
+            merged[method]["counts"] = {
+                col: before["counts"].get(col, 0) + count for col, count in entry["counts"].items()
+            }
+    return merged
@@ -0,0 +1,169 @@
+# app/utils/answer_cache.py
+import os
+import re
+import time
+import hashlib
+import threading
+import numpy as np
+
+from app.utils.embeddings import get_embedder
+from app.utils.shared_state import connect
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "cache/answers.sqlite3")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 5000))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600))
+# cosine similarity for reusing a differently worded question; 0 = exact matches only.
+# Ignored (exact matches only) when the embedder is the bag-of-words hashing fallback.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.97))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def context_hash(context: str) -> str:
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+
+def mode_namespace(dataset: str, mode: str) -> str:
+    """Cache namespace for answers of another kind about `dataset`; invalidated with it."""
+    return f"{dataset}\x00{mode}"
+
+
+class AnswerCache:
+    """
+    Persistent cache of LLM answers for /ask, stored in SQLite.
+
+    An exact hit needs the same dataset version, normalized question and
+    context hash. Otherwise, if a similarity threshold is set and a
+    sentence-transformers model is loaded, the most similar cached
+    question with the same dataset version and context hash is reused
+    when its embedding cosine similarity reaches the threshold. Entries expire
+    after `ttl` seconds, the least recently used are evicted beyond
+    `max_entries`, and invalidate() drops a dataset when it is re-analyzed.
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl: float = ANSWER_CACHE_TTL, similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # shared by every server process; see shared_state.connect
+        self._db = connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, dataset TEXT, version TEXT, question TEXT,"
+            " answer TEXT, embedding BLOB, created REAL, last_used REAL, context_hash TEXT)"
+        )
+        # caches written before context_hash existed: their rows are never reused as similar
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(answers)")}
+        if "context_hash" not in columns:
+            self._db.execute("ALTER TABLE answers ADD COLUMN context_hash TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_dataset ON answers (dataset, version)")
+        self._db.commit()
+
+    def _key(self, dataset: str, version: str, question: str, context: str) -> str:
+        raw = f"{dataset}\x00{version}\x00{normalize_question(question)}\x00{context_hash(context)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, dataset: str, version: str, question: str, context: str, exact: bool = False):
+        """`exact` skips the similar-question lookup, for answers that must match the question verbatim."""
+        now = time.time()
+        key = self._key(dataset, version, question, context)
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT answer FROM answers WHERE key = ? AND created >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                self._touch(key, now)
+                self.hits += 1
+                return row[0]
+
+        if self.similarity > 0 and not exact and get_embedder().semantic:
+            answer = self._similar(dataset, version, question, context, now)
+            if answer is not None:
+                return answer
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _similar(self, dataset: str, version: str, question: str, context: str, now: float):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, answer, embedding FROM answers"
+                " WHERE dataset = ? AND version = ? AND context_hash = ? AND created >= ?",
+                (dataset, version, context_hash(context), now - self.ttl),
+            ).fetchall()
+        if not rows:
+            return None
+
+        query = get_embedder().embed([normalize_question(question)])[0]
+        vectors = np.vstack([np.frombuffer(row[2], dtype="float32") for row in rows])
+        if vectors.shape[1] != len(query):
+            return None
+        scores = vectors @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+
+        with self._lock:
+            self._touch(rows[best][0], now)
+            self.hits += 1
+            self.semantic_hits += 1
+        return rows[best][1]
+
+    def put(self, dataset: str, version: str, question: str, context: str, answer: str):
+        now = time.time()
+        key = self._key(dataset, version, question, context)
+        embedding = get_embedder().embed([normalize_question(question)])[0].astype("float32").tobytes()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, dataset, version, normalize_question(question), answer, embedding, now, now,
+                 context_hash(context)),
+            )
+            self._db.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM answers WHERE key IN ("
+                " SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def invalidate(self, dataset: str):
+        """Drops the dataset's answers, including those under its mode namespaces."""
+        # the namespaces sort between "dataset\x00" and "dataset\x01" (SQLite's string functions stop at NUL)
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM answers WHERE dataset = ? OR (dataset >= ? AND dataset < ?)",
+                (dataset, mode_namespace(dataset, ""), f"{dataset}\x01"),
+            )
+            self._db.commit()
+
+    def _touch(self, key: str, now: float):
+        self._db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,148 @@
+# app/utils/chart_ranking.py
+import os
+import numpy as np
+import pandas as pd
+from app.utils.column_stats import DatasetProfile
+from app.utils.csv_schema import CsvSchema
+
+# bars drawn per bar chart; more frequent values are folded into "Other"
+MAX_BAR_CATEGORIES = int(os.getenv("MAX_BAR_CATEGORIES", 20))
+# a high-cardinality column is only charted if its top values cover this share of rows
+MIN_TOP_CATEGORY_SHARE = float(os.getenv("MIN_TOP_CATEGORY_SHARE", 0.5))
+SCATTER_MIN_CORRELATION = float(os.getenv("SCATTER_MIN_CORRELATION", 0.3))
+MAX_SCATTER_CHARTS = int(os.getenv("MAX_SCATTER_CHARTS", 5))
+HEATMAP_MAX_COLUMNS = int(os.getenv("HEATMAP_MAX_COLUMNS", 12))
+# cell labels are only readable on small heatmaps
+HEATMAP_ANNOTATE_MAX_COLUMNS = int(os.getenv("HEATMAP_ANNOTATE_MAX_COLUMNS", 8))
+LINEPLOT_MAX_COLUMNS = int(os.getenv("LINEPLOT_MAX_COLUMNS", 5))
+# each further chart of the same type scores this much less, so no type fills the budget alone
+REPEAT_DECAY = float(os.getenv("CHART_REPEAT_DECAY", 0.9))
+
+
+def _is_identifier(profile: DatasetProfile, col) -> bool:
+    """Integer columns with (nearly) one distinct value per row, e.g. row ids."""
+    count = profile.count[col]
+    return profile.column_types.get(col, "").startswith(("int", "uint", "Int", "UInt")) \
+        and count > 1 and profile.distinct_count(col) >= 0.9 * count
+
+
+def _numeric_shape(profile: DatasetProfile, col):
+    """Quartile skew, coefficient of variation and how far the tails reach past the Tukey fences (in IQRs)."""
+    q25, q50, q75 = profile.quantiles(col)
+    low, high = profile.moments.at[col, "min"], profile.moments.at[col, "max"]
+    iqr = q75 - q25
+
+    skew = (q75 + q25 - 2 * q50) / iqr if iqr > 0 else 0.0
+    mean = profile.mean[col]
+    cv = profile.std[col] / abs(mean) if mean else 1.0
+    if iqr > 0:
+        tail = max(high - (q75 + 1.5 * iqr), (q25 - 1.5 * iqr) - low, 0.0) / iqr
+    else:
+        tail = np.inf if high > q75 or low < q25 else 0.0
+    return skew, cv, tail
+
+
+def _correlation(profile: DatasetProfile, df: pd.DataFrame, columns):
+    corr = profile.correlation()
+    if corr is not None and set(columns) <= set(corr.columns):
+        return corr.loc[columns, columns]
+    # the profile skips the co-moment matrix for very wide data; fall back to the rows at hand
+    return df[columns].apply(pd.to_numeric, errors="coerce").corr()
+
+
+def _lineplot(columns, time_axis):
+    """A line plot over time says more than one over the row order."""
+    if time_axis is None:
+        return 0.8, {"type": "lineplot", "columns": columns}
+    return 1.5, {"type": "lineplot", "columns": columns, "x": time_axis}
+
+
+def rank_charts(profile: DatasetProfile, df: pd.DataFrame, schema: CsvSchema = None):
+    """
+    Candidate chart specs with a relevance score, best first, scored from
+    the dataset profile rather than by scanning rows:
+
+    - histograms favour skewed and widely dispersed columns;
+    - box plots are only proposed when values reach past the IQR fences;
+    - bar charts skip single-valued columns, and high-cardinality ones
+      are bucketed to their top values when those cover enough rows
+      and skipped otherwise;
+    - scatters are the most correlated numeric pairs;
+    - the heatmap and line plot cover the most correlated columns only;
+      the line plot runs along the schema's first datetime column when
+      there is one, instead of the row order.
+
+    Constant and identifier-like columns (by the profile, or by the
+    `schema` when given) get no charts, and repeats of a chart type are
+    decayed by REPEAT_DECAY. `df` is only read when the profile has no
+    correlation matrix.
+    """
+    candidates = []
+    numeric = []
+    identifiers = set(schema.id_columns) if schema is not None else set()
+    time_axis = next((col for col in schema.datetime_columns if col in df), None) if schema is not None else None
+
+    for col in profile.numeric_columns:
+        std = profile.std.get(col)
+        if not std or np.isnan(std) or col in identifiers or _is_identifier(profile, col):
+            continue
+        numeric.append(col)
+
+        skew, cv, tail = _numeric_shape(profile, col)
+        candidates.append((1 + min(abs(skew), 1) + 0.5 * min(cv, 1), {"type": "histogram", "column": col}))
+        if tail > 0:
+            candidates.append((1 + min(tail / 3, 1), {"type": "boxplot", "column": col}))
+
+    for col in profile.columns:
+        if col in profile.sketches or col in identifiers:
+            continue
+        cardinality = profile.distinct_count(col)
+        present = profile.rows - profile.null_counts.get(col, 0)
+        if cardinality <= 1 or present == 0:
+            continue
+        if cardinality <= MAX_BAR_CATEGORIES:
+            candidates.append((1.5, {"type": "barchart", "column": col}))
+            continue
+        share = profile.top_values(col, MAX_BAR_CATEGORIES).sum() / present
+        if share >= MIN_TOP_CATEGORY_SHARE:
+            candidates.append((1 + 0.5 * share, {"type": "barchart", "column": col, "top_k": MAX_BAR_CATEGORIES}))
+
+    if len(numeric) >= 2:
+        corr = _correlation(profile, df, numeric).abs()
+        values = corr.to_numpy(dtype="float64", na_value=np.nan, copy=True)
+        upper = np.triu_indices(len(numeric), k=1)
+        strength = np.nan_to_num(values[upper])
+
+        order = np.argsort(-strength, kind="stable")
+        for i in order[:MAX_SCATTER_CHARTS]:
+            if strength[i] < SCATTER_MIN_CORRELATION:
+                break
+            x, y = numeric[upper[0][i]], numeric[upper[1][i]]
+            candidates.append((1 + 2 * strength[i], {"type": "scatter", "x": x, "y": y}))
+
+        # columns ranked by their strongest relationship to any other column
+        np.fill_diagonal(values, 0.0)
+        related = pd.Series(np.nan_to_num(values).max(axis=1), index=numeric)
+        related = related.sort_values(ascending=False, kind="stable")
+
+        if len(numeric) >= 3:
+            columns = related.index[:HEATMAP_MAX_COLUMNS].tolist()
+            candidates.append((2 + related.iloc[:len(columns)].mean(), {
+                "type": "heatmap",
+                "columns": columns,
+                "annotate": len(columns) <= HEATMAP_ANNOTATE_MAX_COLUMNS,
+            }))
+        candidates.append(_lineplot(related.index[:LINEPLOT_MAX_COLUMNS].tolist(), time_axis))
+    elif numeric:
+        candidates.append(_lineplot(numeric, time_axis))
+
+    candidates.sort(key=lambda candidate: -candidate[0])
+    repeats = {}
+    ranked = []
+    for score, spec in candidates:
+        seen = repeats.get(spec["type"], 0)
+        repeats[spec["type"]] = seen + 1
+        ranked.append((float(score * REPEAT_DECAY ** seen), spec))
+
+    ranked.sort(key=lambda candidate: -candidate[0])
+    return ranked
@@ -0,0 +1,112 @@
+# app/utils/chart_store.py
+import os
+import json
+import shutil
+import string
+import threading
+import pandas as pd
+from app.database.dataset_registry import read_frame, write_frame
+
+CHART_STORE_DIR = os.getenv("CHART_STORE_DIR", "cache/charts")
+CHART_STORE_MAX_BYTES = int(os.getenv("CHART_STORE_MAX_BYTES", 2 * 1024 ** 3))
+# how long clients may reuse a chart image without revalidating
+CHART_CACHE_MAX_AGE = int(os.getenv("CHART_CACHE_MAX_AGE", 86400))
+
+
+def _is_key(analysis_id: str) -> bool:
+    return bool(analysis_id) and all(c in string.hexdigits for c in analysis_id)
+
+
+class ChartStore:
+    """
+    Keeps what is needed to draw an analysis's charts on request.
+
+    Each analysis (keyed like the result cache) gets a directory with
+    its chart specs and the rows those charts read, as an Arrow file
+    that is memory-mapped back one chart's columns at a time. Rendered
+    PNGs are added next to them on first request. A directory's mtime
+    is its last use; the least recently used ones are evicted once the
+    store grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str = CHART_STORE_DIR, max_bytes: int = CHART_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, analysis_id: str, name: str = "") -> str:
+        return os.path.join(self.directory, analysis_id, name)
+
+    def save(self, analysis_id: str, df: pd.DataFrame, specs):
+        """Stores the chart rows and specs of one analysis, replacing any earlier copy."""
+        tmp_dir = self._path(f"{analysis_id}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        write_frame(df, os.path.join(tmp_dir, "data.arrow"))
+        with open(os.path.join(tmp_dir, "specs.json"), "w", encoding="utf-8") as f:
+            json.dump(specs, f)
+
+        shutil.rmtree(self._path(analysis_id), ignore_errors=True)
+        try:
+            os.rename(tmp_dir, self._path(analysis_id))
+        except OSError:
+            # another run stored the same analysis first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with self._lock:
+            self._evict()
+
+    def has(self, analysis_id: str) -> bool:
+        return _is_key(analysis_id) and os.path.exists(self._path(analysis_id, "specs.json"))
+
+    def spec(self, analysis_id: str, chart_id: str):
+        """The stored spec for `chart_id`, or None if the analysis or chart is unknown."""
+        if not _is_key(analysis_id):
+            return None
+        try:
+            with open(self._path(analysis_id, "specs.json"), "r", encoding="utf-8") as f:
+                specs = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return next((spec for spec in specs if spec.get("id") == chart_id), None)
+
+    def load(self, analysis_id: str, columns) -> pd.DataFrame:
+        return read_frame(self._path(analysis_id, "data.arrow"), columns)
+
+    def get_png(self, analysis_id: str, chart_id: str):
+        """Previously rendered PNG bytes; only call with ids that spec() accepted."""
+        try:
+            with open(self._path(analysis_id, f"{chart_id}.png"), "rb") as f:
+                png = f.read()
+            os.utime(self._path(analysis_id))
+        except OSError:
+            return None
+        return png
+
+    def put_png(self, analysis_id: str, chart_id: str, png: bytes):
+        path = self._path(analysis_id, f"{chart_id}.png")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the analysis was evicted while rendering; the image is still returned
+            return
+
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and _is_key(entry.name):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
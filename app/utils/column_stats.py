@@ -0,0 +1,356 @@
+# app/utils/column_stats.py
+import os
+import numpy as np
+import pandas as pd
+
+QUANTILE_SKETCH_K = int(os.getenv("QUANTILE_SKETCH_K", 2048))
+DISTINCT_SKETCH_K = int(os.getenv("DISTINCT_SKETCH_K", 1024))
+TOP_K_CAPACITY = int(os.getenv("TOP_K_CAPACITY", 10_000))
+# the k x k co-moment matrix is skipped for wider numeric blocks
+COVARIANCE_MAX_COLUMNS = int(os.getenv("COVARIANCE_MAX_COLUMNS", 100))
+
+MOMENT_COLUMNS = ["count", "mean", "m2", "min", "max"]
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch (KLL-style compactor stack). Level h holds
+    items of weight 2**h; when a level exceeds `k` items it is sorted and
+    every other item is promoted. Exact while fewer than `k` values have
+    been seen.
+    """
+
+    def __init__(self, k: int = QUANTILE_SKETCH_K, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels = []
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+
+        self.count += len(values)
+        self._push(0, values)
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        self.count += other.count
+        for level, items in enumerate(other.levels):
+            self._push(level, items)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        qs = np.asarray(qs, dtype="float64")
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], qs)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        idx = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return items[order][np.minimum(idx, len(items) - 1)]
+
+    def _push(self, level: int, items):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0, dtype="float64"))
+        self.levels[level] = np.concatenate([self.levels[level], items])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                even = len(items) - len(items) % 2
+                offset = int(self._rng.integers(2))
+                self.levels[level] = items[even:]
+                self._push(level + 1, items[offset:even:2])
+            level += 1
+
+
+class DistinctSketch:
+    """
+    Mergeable distinct-count estimator (k minimum values over 64-bit
+    hashes). Exact below `k` distinct values.
+    """
+
+    def __init__(self, k: int = DISTINCT_SKETCH_K):
+        self.k = k
+        self.hashes = np.empty(0, dtype="uint64")
+
+    def update(self, values):
+        hashes = pd.util.hash_array(np.asarray(values))
+        return self._add(hashes)
+
+    def merge(self, other: "DistinctSketch"):
+        return self._add(other.hashes)
+
+    def estimate(self) -> int:
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        kth = float(self.hashes[self.k - 1]) / 2.0 ** 64
+        return int(round((self.k - 1) / kth))
+
+    def _add(self, hashes):
+        if len(self.hashes) >= self.k:
+            hashes = hashes[hashes < self.hashes[self.k - 1]]
+        # hash-table dedup first; only the k smallest survivors get sorted
+        hashes = pd.unique(np.concatenate([self.hashes, hashes]))
+        if len(hashes) > self.k:
+            hashes = np.partition(hashes, self.k - 1)[: self.k]
+        self.hashes = np.sort(hashes)
+        return self
+
+
+class DatasetProfile:
+    """
+    One-pass, mergeable per-column statistics for a dataset.
+
+    Numeric columns keep count/mean/M2/min/max (merged with the parallel
+    Welford update) plus a quantile sketch; every other column keeps
+    top-k value frequencies. All columns track null counts and a distinct
+    count sketch. The numeric block also keeps a mergeable co-moment
+    matrix over rows with no missing numeric values. Build it from a
+    whole frame with `from_frame`, or feed chunks through `update` /
+    combine partitions with `merge`.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = []
+        self.column_types = {}
+        self.numeric_columns = []
+        self.null_counts = pd.Series(dtype="int64")
+        self.moments = pd.DataFrame(columns=MOMENT_COLUMNS, dtype="float64")
+        self.sketches = {}
+        self.frequencies = {}
+        self.truncated = set()
+        self.distinct = {}
+        self.cov_columns = None
+        self.cov_count = 0
+        self.cov_mean = None
+        self.cov_m2 = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        return cls().update(df)
+
+    def update(self, df: pd.DataFrame):
+        return self.merge(self._partial(df))
+
+    def _partial(self, df: pd.DataFrame):
+        part = DatasetProfile()
+        part.rows = len(df)
+        part.columns = df.columns.tolist()
+        part.column_types = df.dtypes.astype(str).to_dict()
+        part.null_counts = df.isnull().sum()
+
+        # a column keeps whichever kind it had in the first chunk it appeared in
+        numeric = set(df.select_dtypes(include=["number"]).columns) | set(self.sketches)
+        part.numeric_columns = [
+            col for col in part.columns
+            if col in numeric and col not in self.frequencies
+        ]
+
+        block = df[part.numeric_columns].apply(pd.to_numeric, errors="coerce")
+        values = block.to_numpy(dtype="float64", na_value=np.nan)
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0.0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+            low = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+            high = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+
+        part.moments = pd.DataFrame({
+            "count": count.astype("float64"),
+            "mean": mean,
+            "m2": m2,
+            "min": np.where(count > 0, low, np.nan),
+            "max": np.where(count > 0, high, np.nan),
+        }, index=part.numeric_columns)
+
+        if 0 < len(part.numeric_columns) <= COVARIANCE_MAX_COLUMNS:
+            complete = values[present.all(axis=1)]
+            part.cov_columns = list(part.numeric_columns)
+            part.cov_count = len(complete)
+            part.cov_mean = complete.mean(axis=0) if len(complete) else np.zeros(len(part.cov_columns))
+            centered = complete - part.cov_mean
+            part.cov_m2 = centered.T @ centered
+
+        for i, col in enumerate(part.numeric_columns):
+            column = values[present[:, i], i]
+            part.sketches[col] = QuantileSketch().update(column)
+            part.distinct[col] = DistinctSketch().update(column)
+
+        for col in part.columns:
+            if col in part.sketches:
+                continue
+            counts = df[col].value_counts()
+            part.frequencies[col] = counts
+            part.distinct[col] = DistinctSketch().update(counts.index.to_numpy())
+
+        return part
+
+    def merge(self, other: "DatasetProfile"):
+        self.rows += other.rows
+        self.columns += [col for col in other.columns if col not in self.columns]
+        self.column_types = {**other.column_types, **self.column_types}
+        self.numeric_columns += [col for col in other.numeric_columns if col not in self.numeric_columns]
+        self.null_counts = self.null_counts.add(other.null_counts, fill_value=0).astype("int64")
+        self.moments = _merge_moments(self.moments, other.moments)
+        self._merge_covariance(other)
+
+        for col, sketch in other.sketches.items():
+            self.sketches[col] = self.sketches[col].merge(sketch) if col in self.sketches else sketch
+
+        for col, sketch in other.distinct.items():
+            self.distinct[col] = self.distinct[col].merge(sketch) if col in self.distinct else sketch
+
+        for col, counts in other.frequencies.items():
+            if col in self.frequencies:
+                counts = self.frequencies[col].add(counts, fill_value=0)
+            if len(counts) > TOP_K_CAPACITY:
+                counts = counts.nlargest(TOP_K_CAPACITY)
+                self.truncated.add(col)
+            self.frequencies[col] = counts
+        self.truncated |= other.truncated
+
+        return self
+
+    def _merge_covariance(self, other: "DatasetProfile"):
+        if other.cov_columns is None or other.rows == 0:
+            return
+        if self.cov_columns is None and self.cov_count == 0:
+            self.cov_columns, self.cov_count = other.cov_columns, other.cov_count
+            self.cov_mean, self.cov_m2 = other.cov_mean, other.cov_m2
+            return
+        if self.cov_columns != other.cov_columns:
+            # schemas diverged between chunks; no consistent matrix to keep
+            self.cov_columns, self.cov_count, self.cov_mean, self.cov_m2 = None, -1, None, None
+            return
+
+        n = self.cov_count + other.cov_count
+        if n == 0:
+            return
+        delta = other.cov_mean - self.cov_mean
+        self.cov_m2 = self.cov_m2 + other.cov_m2 + np.outer(delta, delta) * self.cov_count * other.cov_count / n
+        self.cov_mean = self.cov_mean + delta * other.cov_count / n
+        self.cov_count = n
+
+    # -------------------------
+    # Accessors
+    # -------------------------
+    @property
+    def count(self) -> pd.Series:
+        return self.moments["count"]
+
+    @property
+    def mean(self) -> pd.Series:
+        return self.moments["mean"].where(self.count > 0)
+
+    @property
+    def std(self) -> pd.Series:
+        n = self.count
+        return np.sqrt(self.moments["m2"] / (n - 1).where(n > 1))
+
+    def covariance(self):
+        """Sample covariance over complete rows, or None when not tracked."""
+        if self.cov_columns is None or self.cov_count < 2:
+            return None
+        return pd.DataFrame(self.cov_m2 / (self.cov_count - 1), index=self.cov_columns, columns=self.cov_columns)
+
+    def correlation(self):
+        cov = self.covariance()
+        if cov is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scale = np.sqrt(np.diag(cov.to_numpy()))
+            return cov / np.outer(scale, scale)
+
+    def quantiles(self, col, qs=(0.25, 0.5, 0.75)):
+        return self.sketches[col].quantiles(qs)
+
+    def top_values(self, col, k: int = 10) -> pd.Series:
+        return self.frequencies[col].nlargest(k)
+
+    def distinct_count(self, col) -> int:
+        if col in self.frequencies and col not in self.truncated:
+            return len(self.frequencies[col])
+        return self.distinct[col].estimate()
+
+    def summary_statistics(self):
+        """
+        describe(include="all") as two column-oriented tables: `numeric`
+        (count/mean/std/min/quartiles/max) and `categorical` (count/
+        unique/top/freq for the rest). Each table maps `column` and every
+        statistic to a list with one entry per column; missing values are
+        None.
+        """
+        numeric = [col for col in self.columns if col in self.sketches]
+        other = [col for col in self.columns if col not in self.sketches]
+
+        moments = self.moments.reindex(numeric)
+        quartiles = np.array([self.quantiles(col) for col in numeric], dtype="float64").reshape(-1, 3)
+        numeric_table = {
+            "column": numeric,
+            "count": _values(moments["count"]),
+            "mean": _values(self.mean.reindex(numeric)),
+            "std": _values(self.std.reindex(numeric)),
+            "min": _values(moments["min"]),
+            "25%": _values(quartiles[:, 0]),
+            "50%": _values(quartiles[:, 1]),
+            "75%": _values(quartiles[:, 2]),
+            "max": _values(moments["max"]),
+        }
+
+        frequencies = [self.frequencies[col] for col in other]
+        categorical_table = {
+            "column": other,
+            "count": (self.rows - self.null_counts.reindex(other, fill_value=0)).astype("int64").tolist(),
+            "unique": [self.distinct_count(col) for col in other],
+            "top": [counts.idxmax() if len(counts) else None for counts in frequencies],
+            "freq": [int(counts.max()) if len(counts) else None for counts in frequencies],
+        }
+
+        return {"numeric": numeric_table, "categorical": categorical_table}
+
+
+def _values(values) -> list:
+    """A float column as a list, NaN as None."""
+    values = np.asarray(values, dtype="float64")
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _merge_moments(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+
+    index = left.index.union(right.index, sort=False)
+    empty = {"count": 0.0, "mean": 0.0, "m2": 0.0}
+    a = left.reindex(index).fillna(empty)
+    b = right.reindex(index).fillna(empty)
+
+    n = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    weight_b = (b["count"] / n.where(n > 0)).fillna(0.0)
+
+    return pd.DataFrame({
+        "count": n,
+        "mean": a["mean"] + delta * weight_b,
+        "m2": a["m2"] + b["m2"] + delta ** 2 * a["count"] * weight_b,
+        "min": np.fmin(a["min"], b["min"]),
+        "max": np.fmax(a["max"], b["max"]),
+    })
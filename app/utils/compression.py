@@ -0,0 +1,95 @@
+# app/utils/compression.py
+import os
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 4))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+# bodies at least this large are compressed on a worker thread rather than the event loop
+COMPRESS_THREAD_BYTES = int(os.getenv("COMPRESS_THREAD_BYTES", 128 * 1024))
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    "br" or "gzip", whichever the Accept-Encoding header ranks higher
+    (brotli on a tie, and only when the library is installed), or None
+    for an uncompressed response.
+    """
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    offered = ["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"]
+    ranked = [(weights.get(name, wildcard), name) for name in offered]
+    weight, name = max(ranked, key=lambda pair: pair[0])
+    return name if weight > 0 else None
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = BROTLI_QUALITY, thread_minimum_size: int = COMPRESS_THREAD_BYTES):
+        super().__init__(app, minimum_size)
+        self.quality = quality
+        self.thread_minimum_size = thread_minimum_size
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= self.thread_minimum_size:
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with brotli or gzip as the client's
+    Accept-Encoding allows. Small bodies, images and event streams are
+    sent as they are; streamed bodies are flushed chunk by chunk, so a
+    streamed answer still arrives as it is written.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level,
+                                      thread_minimum_size=COMPRESS_THREAD_BYTES)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -0,0 +1,89 @@
+# app/utils/context_chunks.py
+import os
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", 20))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English + numbers
+    return len(text) // 4 + 1
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def build_context_chunks(result, version: str):
+    """
+    Splits an analysis result into small typed chunks for the vector
+    store: one overview, one per column, one for data quality and one
+    for anomalies. Returns (texts, metadatas).
+    """
+    name = result["dataset_name"]
+    analysis = result["analysis_report"]
+    quality = result["data_quality_report"]
+    anomalies = result["anomaly_report"]
+    types = analysis["column_types"]
+
+    chunks = []
+
+    def add(section, text, column=""):
+        chunks.append((text, {"section": section, "column": column, "version": version}))
+
+    add("overview", (
+        f"Dataset {name}: {analysis['row_count']} rows, {analysis['column_count']} columns. "
+        f"Columns: {', '.join(f'{col} ({dtype})' for col, dtype in types.items())}. "
+        f"{result['summary_report']}"
+    ))
+
+    missing = quality.get("missing_values", {})
+    for table in analysis["summary_statistics"].values():
+        stats = [key for key in table if key != "column"]
+        for i, col in enumerate(table["column"]):
+            parts = [f"{key}={_fmt(table[key][i])}" for key in stats]
+            parts.append(f"missing={missing.get(col, 0)}")
+            for method in ("zscore", "iqr"):
+                counts = anomalies.get(method, {}).get("counts", {})
+                if col in counts:
+                    parts.append(f"{method}_anomalies={counts[col]}")
+            add("column", f"Column {col} ({types.get(col, 'unknown')}) in {name}: {', '.join(parts)}", column=col)
+
+    with_missing = {col: count for col, count in missing.items() if count}
+    near = quality.get("near_duplicates") or {}
+    add("quality", (
+        f"Data quality for {name}: {quality.get('duplicates_removed', 0)} duplicate rows removed, "
+        f"{near.get('candidate_rows', 0)} near-duplicate rows flagged. "
+        f"Columns with missing values: {with_missing if with_missing else 'none'}."
+    ))
+
+    lines = []
+    for method, entry in anomalies.items():
+        rows = entry.get("row_indices", [])[:20]
+        lines.append(f"{method}: {entry.get('anomalous_rows', 0)} anomalous rows (e.g. rows {rows})")
+    add("anomalies", f"Anomalies in {name}: " + "; ".join(lines) if lines else f"Anomalies in {name}: none detected.")
+
+    texts = [text for text, _ in chunks]
+    metadatas = [meta for _, meta in chunks]
+    return texts, metadatas
+
+
+def select_within_budget(records, budget: int = CONTEXT_TOKEN_BUDGET):
+    """
+    Picks retrieved chunks in relevance order until the token budget is
+    spent. The overview chunk, when retrieved, always goes first.
+    """
+    records = sorted(records, key=lambda r: r["metadata"].get("section") != "overview")
+    selected = []
+    used = 0
+
+    for record in records:
+        cost = estimate_tokens(record["text"])
+        if used + cost > budget and selected:
+            continue
+        selected.append(record["text"])
+        used += cost
+
+    return selected
@@ -0,0 +1,193 @@
+# app/utils/csv_schema.py
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+
+# rows read from the top of a file to infer its column types
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", 20_000))
+# a column with no repeated value is only called an identifier once the sample has this many values
+ID_MIN_VALUES = int(os.getenv("ID_MIN_VALUES", 50))
+
+# pandas' default missing-value markers; the Arrow reader is given the same list
+NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+TRUE_VALUES = ["True", "TRUE", "true"]
+FALSE_VALUES = ["False", "FALSE", "false"]
+
+# tried in order on text columns whose values all start like a date
+DATE_FORMATS = [
+    "ISO8601",
+    "%m/%d/%Y", "%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S",
+    "%Y/%m/%d", "%Y/%m/%d %H:%M:%S", "%d.%m.%Y", "%d-%m-%Y",
+]
+
+ARROW_TYPES = {
+    "integer": pa.int64(),
+    "float": pa.float64(),
+    "boolean": pa.bool_(),
+    "datetime": pa.timestamp("us"),
+    "string": pa.string(),
+}
+
+_DATE_PREFIX = re.compile(r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}")
+_ID_NAME = re.compile(r"(?:^|[_\s-])(?:id|uuid|guid)$", re.IGNORECASE)
+_ID_CAMEL = re.compile(r"[a-z](?:Id|ID|Uuid|UUID)$")
+
+
+def _date_format(values: pd.Series):
+    """The first of DATE_FORMATS every value parses with (naive timestamps only), or None."""
+    values = pd.Series(values.unique())
+    if not values.str.match(_DATE_PREFIX).all():
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = pd.to_datetime(values, format=fmt)
+        except (ValueError, TypeError, OverflowError):
+            continue
+        # values with UTC offsets stay text rather than being shifted
+        return fmt if parsed.dt.tz is None else None
+    return None
+
+
+def _kind(values: pd.Series):
+    """Kind of one column of a pandas-parsed sample, and its date format for datetimes."""
+    dtype = values.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean", None
+    if pd.api.types.is_integer_dtype(dtype):
+        return "integer", None
+    if pd.api.types.is_float_dtype(dtype):
+        # also columns with no value in the sample
+        return "float", None
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime", "ISO8601"
+
+    present = values.dropna()
+    if len(present) and pd.api.types.infer_dtype(present, skipna=True) == "boolean":
+        # pandas leaves booleans with missing values as objects
+        return "boolean", None
+    fmt = _date_format(present.astype(str)) if len(present) else None
+    return ("datetime", fmt) if fmt else ("string", None)
+
+
+def _id_like(name, kind: str, values: pd.Series) -> bool:
+    """Unique integers or strings that are named like ids, count up, or are fixed-width codes."""
+    if kind not in ("integer", "string"):
+        return False
+    present = values.dropna()
+    if len(present) < ID_MIN_VALUES or present.nunique() < len(present):
+        return False
+    if _ID_NAME.search(str(name)) or _ID_CAMEL.search(str(name)):
+        return True
+    if kind == "integer":
+        return present.is_monotonic_increasing
+    lengths = present.astype(str).str.len()
+    return lengths.nunique() == 1 and lengths.iloc[0] >= 8
+
+
+class CsvSchema:
+    """
+    Column types for reading a CSV, inferred once from a sample of its
+    rows: integer, float, boolean, datetime (with the format the sample
+    matched) or string, plus the columns that look like row identifiers.
+
+    The CSV reader parses every chunk with these types and the agents
+    consult it: identifiers get no charts or anomaly checks, and a
+    datetime column becomes the line plot's x axis. It is saved with
+    the analysis state, so appended rows are read the same way.
+    """
+
+    def __init__(self, columns, kinds, formats=None, id_columns=()):
+        self.columns = list(columns)
+        self.kinds = dict(kinds)
+        self.formats = dict(formats or {})
+        self.id_columns = list(id_columns)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CsvSchema":
+        """Infers the schema from rows pandas has parsed with its default type inference."""
+        kinds, formats, ids = {}, {}, []
+        for col in df.columns:
+            kind, fmt = _kind(df[col])
+            kinds[col] = kind
+            if fmt is not None:
+                formats[col] = fmt
+            if _id_like(col, kind, df[col]):
+                ids.append(col)
+        return cls(df.columns.tolist(), kinds, formats, ids)
+
+    @property
+    def datetime_columns(self):
+        return [col for col in self.columns if self.kinds[col] == "datetime"]
+
+    def strptime_columns(self):
+        """
+        Datetime columns read as text and parsed one by one with their own
+        format: Arrow tries its timestamp parsers in order on every column,
+        so a day-first and a month-first column can't share one list.
+        """
+        formats = {self.formats[col] for col in self.datetime_columns}
+        if len(formats) <= 1:
+            return []
+        return [col for col in self.datetime_columns if self.formats[col] != "ISO8601"]
+
+    def arrow_types(self):
+        types = {col: ARROW_TYPES[self.kinds[col]] for col in self.columns}
+        types.update({col: pa.string() for col in self.strptime_columns()})
+        return types
+
+    def timestamp_parsers(self):
+        parsed_later = set(self.strptime_columns())
+        formats = list(dict.fromkeys(
+            self.formats[col] for col in self.datetime_columns if col not in parsed_later
+        ))
+        return [pcsv.ISO8601 if fmt == "ISO8601" else fmt for fmt in formats]
+
+    def pandas_dtypes(self):
+        """read_csv `dtype` hints: text columns stay text even where a chunk holds only digits."""
+        return {col: "str" for col in self.columns if self.kinds[col] == "string"}
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Coerces a pandas-parsed frame to the schema: numbers and dates
+        that don't parse become missing, as in the first chunk's schema
+        of a schema-less read.
+        """
+        for col, kind in self.kinds.items():
+            if col not in df:
+                continue
+            values = df[col]
+            if kind in ("integer", "float") and not pd.api.types.is_numeric_dtype(values):
+                df[col] = pd.to_numeric(values, errors="coerce")
+            elif kind == "datetime" and not pd.api.types.is_datetime64_any_dtype(values):
+                df[col] = pd.to_datetime(values, format=self.formats.get(col, "ISO8601"), errors="coerce") \
+                    .astype("datetime64[us]")
+        return df
+
+    def to_dict(self):
+        return {
+            col: {
+                "type": self.kinds[col],
+                **({"format": self.formats[col]} if col in self.formats else {}),
+                "id_like": col in self.id_columns,
+            }
+            for col in self.columns
+        }
+
+
+def infer_schema(filepath: str, sample_rows: int = SCHEMA_SAMPLE_ROWS, previous: CsvSchema = None) -> CsvSchema:
+    """
+    Infers a CsvSchema from the first `sample_rows` rows of a CSV. For an
+    upload of appended rows, `previous` (the schema the dataset was read
+    with) is kept when the header matches, so every segment has the same
+    types.
+    """
+    sample = pd.read_csv(filepath, nrows=sample_rows)
+    if previous is not None and previous.columns == sample.columns.tolist():
+        return previous
+    return CsvSchema.from_frame(sample)
@@ -0,0 +1,307 @@
+# app/utils/dedup.py
+import os
+import json
+import shutil
+import weakref
+import tempfile
+import numpy as np
+import pandas as pd
+from pandas.util import hash_array
+
+# comma-separated key columns for duplicate detection; empty = whole row
+DUPLICATE_SUBSET = [col for col in os.getenv("DUPLICATE_SUBSET", "").split(",") if col]
+# row hashes kept in memory before a sorted run is spilled to disk (8 bytes each)
+DEDUP_MEMORY_HASHES = int(os.getenv("DEDUP_MEMORY_HASHES", 10_000_000))
+DEDUP_SPILL_DIR = os.getenv("DEDUP_SPILL_DIR") or None
+NEAR_DUPLICATES = os.getenv("NEAR_DUPLICATES", "true").lower() == "true"
+NEAR_DUPLICATE_DECIMALS = int(os.getenv("NEAR_DUPLICATE_DECIMALS", 6))
+MAX_NEAR_DUPLICATE_ROWS = int(os.getenv("MAX_NEAR_DUPLICATE_ROWS", 1000))
+# sorted runs kept by a saved hash set before the smallest ones are merged
+DEDUP_MAX_RUNS = int(os.getenv("DEDUP_MAX_RUNS", 8))
+
+_NA_HASH = np.uint64(0x9E3779B97F4A7C15)
+# mixed into the hashes of non-integral floats and of unsigned values beyond int64,
+# so they can't coincide with an int64 value's hash
+_FLOAT_SALT = np.uint64(0xC2B2AE3D27D4EB4F)
+_UINT_SALT = np.uint64(0x165667B19E3779F9)
+_INT64_BOUND = 2.0 ** 63
+
+
+def _key_frame(df: pd.DataFrame, subset=None) -> pd.DataFrame:
+    # missing key columns are ignored; no usable key means the whole row
+    columns = [col for col in subset if col in df.columns] if subset else []
+    return df[columns] if columns else df
+
+
+def _column_hashes(values) -> np.ndarray:
+    # factorize first so each distinct value (e.g. a long repeated string) is hashed once
+    codes, uniques = pd.factorize(values)
+    hashed = hash_array(np.asarray(uniques, dtype=object)) if len(uniques) else np.empty(0, dtype="uint64")
+    return np.where(codes >= 0, hashed[codes.clip(min=0)], _NA_HASH)
+
+
+def _float_hashes(values: np.ndarray) -> np.ndarray:
+    """Floats holding an int64-range integer hash like that integer; the rest hash their bits."""
+    integral = np.isfinite(values) & (values == np.floor(values)) \
+        & (values >= -_INT64_BOUND) & (values < _INT64_BOUND)
+    as_int = np.where(integral, values, 0.0).astype("int64")
+    hashed = np.where(integral, hash_array(as_int.view("uint64")), hash_array(values) ^ _FLOAT_SALT)
+    return np.where(np.isnan(values), _NA_HASH, hashed)
+
+
+def _number_hashes(series: pd.Series, decimals: int = None) -> np.ndarray:
+    """
+    Integers hash from their exact 64-bit value and integral floats
+    match them, so a value hashes the same whether a chunk parsed the
+    column as int or float, or it was later downcast. `decimals` rounds
+    floats first.
+    """
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_unsigned_integer_dtype(series.dtype):
+        values = series.to_numpy(dtype="uint64", na_value=0)
+        hashed = hash_array(values)
+        hashed = np.where(values > np.uint64(2 ** 63 - 1), hashed ^ _UINT_SALT, hashed)
+    elif pd.api.types.is_integer_dtype(series.dtype):
+        hashed = hash_array(series.to_numpy(dtype="int64", na_value=0).view("uint64"))
+    else:
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        hashed = _float_hashes(values if decimals is None else values.round(decimals))
+    return np.where(missing, _NA_HASH, hashed)
+
+
+def _combine(columns, rows: int) -> np.ndarray:
+    combined = np.full(rows, 0x345678, dtype="uint64")
+    for position, hashes in enumerate(columns):
+        combined ^= hashes
+        combined *= np.uint64(1000003 + 2 * position)
+    return combined
+
+
+def row_hashes(df: pd.DataFrame, subset=None) -> np.ndarray:
+    """
+    One vectorized uint64 hash per row. Numbers are hashed exactly (see
+    _number_hashes), so 1 and 1.0 match but large int64 ids stay apart.
+    """
+    keys = _key_frame(df, subset)
+    columns = []
+    for _, series in keys.items():
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            columns.append(_number_hashes(series))
+        else:
+            columns.append(_column_hashes(series))
+    return _combine(columns, len(keys))
+
+
+def near_row_hashes(df: pd.DataFrame, subset=None, decimals: int = NEAR_DUPLICATE_DECIMALS) -> np.ndarray:
+    """
+    Row hashes after loosening values: strings are trimmed and
+    lower-cased and numbers rounded to `decimals`, so rows that differ
+    only in case, whitespace or float noise collide.
+    """
+    keys = _key_frame(df, subset)
+    columns = []
+    for _, series in keys.items():
+        if pd.api.types.is_bool_dtype(series.dtype):
+            columns.append(_column_hashes(series))
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            columns.append(_number_hashes(series, decimals))
+        else:
+            # loosen the distinct values only, then map back through the codes
+            codes, uniques = pd.factorize(series)
+            loose = pd.Series(uniques, dtype="object").astype("str").str.strip().str.lower()
+            hashed = _column_hashes(loose)
+            columns.append(np.where(codes >= 0, hashed[codes.clip(min=0)] if len(hashed) else _NA_HASH, _NA_HASH))
+    return _combine(columns, len(keys))
+
+
+def _first_occurrence(hashes: np.ndarray) -> np.ndarray:
+    return ~pd.Series(hashes).duplicated().to_numpy()
+
+
+class RowHashSet:
+    """
+    Set of uint64 row hashes with vectorized membership tests.
+
+    Hashes live in one sorted in-memory array; beyond `memory_hashes` it
+    is written out as a sorted run and memory-mapped, so memory stays
+    bounded however many rows have been seen.
+    """
+
+    def __init__(self, memory_hashes: int = DEDUP_MEMORY_HASHES, spill_dir: str = DEDUP_SPILL_DIR):
+        self.memory_hashes = memory_hashes
+        self.spill_dir = spill_dir
+        self._memory = np.empty(0, dtype="uint64")
+        self._runs = []
+        self._directory = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def spilled_runs(self) -> int:
+        return len(self._runs)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in [self._memory, *self._runs]:
+            if len(run):
+                positions = np.searchsorted(run, hashes).clip(max=len(run) - 1)
+                found |= run[positions] == hashes
+        return found
+
+    def add(self, hashes: np.ndarray):
+        """Adds hashes that are not in the set yet (callers filter with contains())."""
+        if not len(hashes):
+            return
+        hashes = np.sort(hashes.astype("uint64"))
+        self._memory = np.insert(self._memory, np.searchsorted(self._memory, hashes), hashes)
+        self._size += len(hashes)
+        if len(self._memory) >= self.memory_hashes:
+            self._spill()
+
+    def _spill(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="dedup-", dir=self.spill_dir)
+            weakref.finalize(self, shutil.rmtree, self._directory, True)
+
+        path = os.path.join(self._directory, f"run-{len(self._runs)}.npy")
+        np.save(path, self._memory)
+        self._runs.append(np.load(path, mmap_mode="r"))
+        self._memory = np.empty(0, dtype="uint64")
+
+    def save(self, directory: str, max_runs: int = DEDUP_MAX_RUNS):
+        """
+        Writes the set to `directory` as sorted .npy runs. Runs that are
+        already files (spilled, or from load()) are hard-linked rather
+        than rewritten, so saving costs about the hashes added since the
+        set was loaded; past `max_runs`, the smallest runs are merged.
+        """
+        os.makedirs(directory, exist_ok=True)
+        runs = sorted([*self._runs, self._memory], key=len) if len(self._memory) else sorted(self._runs, key=len)
+        if len(runs) > max_runs:
+            merged = np.sort(np.concatenate(runs[:len(runs) - max_runs + 1]))
+            runs = [merged, *runs[len(runs) - max_runs + 1:]]
+
+        for position, run in enumerate(runs):
+            path = os.path.join(directory, f"run-{position}.npy")
+            source = getattr(run, "filename", None)
+            if source is not None:
+                try:
+                    os.link(source, path)
+                    continue
+                except OSError:
+                    pass
+            np.save(path, np.asarray(run))
+
+    @classmethod
+    def load(cls, directory: str, memory_hashes: int = DEDUP_MEMORY_HASHES, spill_dir: str = DEDUP_SPILL_DIR):
+        """Reopens a saved set; its runs are memory-mapped, not read."""
+        hashes = cls(memory_hashes, spill_dir)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".npy"):
+                run = np.load(os.path.join(directory, name), mmap_mode="r")
+                hashes._runs.append(run)
+                hashes._size += len(run)
+        return hashes
+
+    def close(self):
+        self._runs = []
+        self._memory = np.empty(0, dtype="uint64")
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+
+class DuplicateDetector:
+    """
+    Streaming duplicate detection over 64-bit row hashes.
+
+    Every row is hashed once; that hash both counts and removes
+    duplicates, within a chunk and against all earlier chunks. Keys can
+    be restricted to a subset of columns. Rows that are not exact
+    duplicates but match an earlier row after loosening (see
+    near_row_hashes) are reported as near-duplicate candidates.
+    """
+
+    def __init__(self, subset=None, near: bool = NEAR_DUPLICATES,
+                 memory_hashes: int = DEDUP_MEMORY_HASHES, spill_dir: str = DEDUP_SPILL_DIR):
+        self.subset = list(subset) if subset is not None else list(DUPLICATE_SUBSET)
+        self.near = near
+        self.removed = 0
+        self.near_count = 0
+        self._near_rows = []
+        self._seen = RowHashSet(memory_hashes, spill_dir)
+        self._near_seen = RowHashSet(memory_hashes, spill_dir) if near else None
+
+    def update(self, df: pd.DataFrame) -> np.ndarray:
+        """Returns a boolean mask of the rows in `df` that are duplicates."""
+        hashes = row_hashes(df, self.subset)
+        keep = _first_occurrence(hashes)
+        keep[keep] = ~self._seen.contains(hashes[keep])
+        self._seen.add(hashes[keep])
+        self.removed += int((~keep).sum())
+
+        if self.near:
+            self._update_near(df, keep)
+
+        return ~keep
+
+    def _update_near(self, df: pd.DataFrame, keep: np.ndarray):
+        hashes = near_row_hashes(df[keep], self.subset)
+        first = _first_occurrence(hashes)
+        first[first] = ~self._near_seen.contains(hashes[first])
+        self._near_seen.add(hashes[first])
+
+        candidates = df.index[keep][~first]
+        self.near_count += len(candidates)
+        room = MAX_NEAR_DUPLICATE_ROWS - sum(len(rows) for rows in self._near_rows)
+        if room > 0 and len(candidates):
+            self._near_rows.append(candidates[:room].to_numpy())
+
+    def near_duplicates(self):
+        if not self.near:
+            return None
+        rows = np.concatenate(self._near_rows).tolist() if self._near_rows else []
+        return {
+            "candidate_rows": self.near_count,
+            "row_indices": rows,
+            "row_indices_truncated": self.near_count > len(rows),
+        }
+
+    def save(self, directory: str):
+        """Saves the seen hashes and counters so a later upload of appended rows can resume."""
+        self._seen.save(os.path.join(directory, "exact"))
+        if self._near_seen is not None:
+            self._near_seen.save(os.path.join(directory, "near"))
+        with open(os.path.join(directory, "detector.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "subset": self.subset,
+                "removed": self.removed,
+                "near_count": self.near_count,
+                "near_rows": [int(row) for rows in self._near_rows for row in rows],
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str, near: bool = NEAR_DUPLICATES,
+             memory_hashes: int = DEDUP_MEMORY_HASHES, spill_dir: str = DEDUP_SPILL_DIR):
+        """
+        Resumes a saved detector: later rows are checked against every
+        row it has seen, and its counters carry on from the saved ones.
+        """
+        with open(os.path.join(directory, "detector.json"), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+
+        detector = cls(saved["subset"], near, memory_hashes, spill_dir)
+        detector.removed = saved["removed"]
+        detector._seen = RowHashSet.load(os.path.join(directory, "exact"), memory_hashes, spill_dir)
+        if near and os.path.isdir(os.path.join(directory, "near")):
+            detector._near_seen = RowHashSet.load(os.path.join(directory, "near"), memory_hashes, spill_dir)
+            detector.near_count = saved["near_count"]
+            detector._near_rows = [np.asarray(saved["near_rows"], dtype="int64")] if saved["near_rows"] else []
+        return detector
+
+    def close(self):
+        self._seen.close()
+        if self._near_seen is not None:
+            self._near_seen.close()
@@ -0,0 +1,97 @@
+# app/utils/embeddings.py
+import os
+import re
+import zlib
+import threading
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+HASH_EMBEDDING_DIM = 384
+
+_TOKEN = re.compile(r"\w+")
+
+
+class Embedder:
+    """
+    Turns texts into L2-normalized float32 vectors.
+
+    Uses a locally loaded sentence-transformers model (loaded on first
+    use, then shared). If the library or model is unavailable it falls
+    back to a feature-hashing bag-of-words embedding, which still ranks
+    by token overlap instead of failing.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                # imported with the model: sentence-transformers pulls in torch, which takes seconds
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+            except Exception:
+                self._model = None
+            self._loaded = True
+
+    @property
+    def name(self) -> str:
+        self._load()
+        return self.model_name if self._model is not None else f"hashing-{HASH_EMBEDDING_DIM}"
+
+    @property
+    def semantic(self) -> bool:
+        """False for the hashing fallback, which ignores word order and negation."""
+        self._load()
+        return self._model is not None
+
+    def embed(self, texts) -> np.ndarray:
+        self._load()
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, HASH_EMBEDDING_DIM if self._model is None else self._dimension()), dtype="float32")
+
+        if self._model is not None:
+            vectors = self._model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            return vectors.astype("float32")
+
+        return np.vstack([self._hash_embed(text) for text in texts])
+
+    def _dimension(self) -> int:
+        return self._model.get_sentence_embedding_dimension()
+
+    def _hash_embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(HASH_EMBEDDING_DIM, dtype="float32")
+        tokens = _TOKEN.findall(text.lower())
+        if tokens:
+            hashes = np.array([zlib.crc32(token.encode("utf-8")) for token in tokens], dtype="uint32")
+            signs = np.where(hashes & 1, 1.0, -1.0).astype("float32")
+            np.add.at(vector, (hashes >> 1) % HASH_EMBEDDING_DIM, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """Process-wide embedder so the model is only loaded once."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Embedder()
+        return _shared
@@ -1,32 +1,172 @@
 # app/utils/gemini_client.py
 import os
+import random
+import asyncio
+import hashlib
+import threading
+import time
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Load .env
 load_dotenv()
 
+# "fake" swaps Gemini for LangChain's canned-response chat model (tests, benchmarks)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+
+# HTTP statuses worth another attempt: request timeout, rate limiting and server errors
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# exception class names (matched anywhere in the class hierarchy) of client timeouts and dropped
+# connections, so the Google and HTTP client libraries need not be imported to recognize them
+_TRANSIENT_NAMES = ("Timeout", "DeadlineExceeded", "ConnectError", "TransportError", "ServiceUnavailable")
+
+
 class GeminiClient:
-    def __init__(self):
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("Missing GOOGLE_API_KEY in .env file")
-
-        # Pass API key to the Gemini model
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-pro",
-            temperature=0.2,
-            max_output_tokens=2048,
-            google_api_key=api_key
-        )
+    def __init__(self, model=None):
+        """`model` may be any LangChain chat model; defaults to Gemini."""
+        if model is not None:
+            self.model = model
+        elif LLM_PROVIDER == "fake":
+            from langchain_core.language_models.fake_chat_models import FakeListChatModel
+            self.model = FakeListChatModel(responses=["This is a canned answer from the fake LLM."])
+        else:
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                raise ValueError("Missing GOOGLE_API_KEY in .env file")
 
-    def ask(self, message: str, context: str = "") -> str:
-        prompt = (
+            # imported here: the Google client library takes seconds to import
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            # Pass API key to the Gemini model
+            self.model = ChatGoogleGenerativeAI(
+                model="gemini-2.5-pro",
+                temperature=0.2,
+                max_output_tokens=2048,
+                google_api_key=api_key
+            )
+
+        self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._inflight = {}
+
+    def build_prompt(self, message: str, context: str = "") -> str:
+        return (
             "You are a data analysis assistant.\n"
             "Answer ONLY based on the dataset context provided.\n\n"
             f"DATASET CONTEXT:\n{context}\n\n"
             f"USER QUESTION:\n{message}\n\n"
         )
 
-        response = self.model.invoke(prompt)
-        return response.content
+    def ask(self, message: str, context: str = "") -> str:
+        prompt = self.build_prompt(message, context)
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                response = self.model.invoke(prompt)
+                return response.content
+            except Exception as e:
+                if attempt == LLM_MAX_RETRIES or not is_transient(e):
+                    raise
+                time.sleep(_backoff(attempt))
+
+    async def aask(self, message: str, context: str = "") -> str:
+        """
+        Non-blocking ask. Identical prompts already in flight share one
+        LLM call; at most LLM_MAX_CONCURRENCY calls run at once and
+        transient failures (see is_transient) are retried with
+        exponential backoff.
+        """
+        return await self.acomplete(self.build_prompt(message, context))
+
+    async def acomplete(self, prompt: str) -> str:
+        """Like aask() for a prompt the caller built itself."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._ainvoke(prompt))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(future)
+
+    async def _ainvoke(self, prompt: str) -> str:
+        async with self._semaphore:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    response = await self.model.ainvoke(prompt)
+                    return response.content
+                except Exception as e:
+                    if attempt == LLM_MAX_RETRIES or not is_transient(e):
+                        raise
+                    await asyncio.sleep(_backoff(attempt))
+
+    async def astream(self, message: str, context: str = ""):
+        """
+        Yields answer text as the model produces it. A transient failure
+        before the first token is retried; once tokens have been sent it
+        is raised.
+        """
+        prompt = self.build_prompt(message, context)
+
+        async with self._semaphore:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                started = False
+                try:
+                    async for chunk in self.model.astream(prompt):
+                        if chunk.content:
+                            started = True
+                            yield chunk.content
+                    return
+                except Exception as e:
+                    if started or attempt == LLM_MAX_RETRIES or not is_transient(e):
+                        raise
+                    await asyncio.sleep(_backoff(attempt))
+
+
+def _status_code(error: BaseException):
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a failed LLM call may succeed if repeated: timeouts, dropped
+    connections, rate limits (429) and server errors (5xx), also when
+    wrapped by another exception. Authentication failures and invalid
+    requests are raised at once; the model client has already run its
+    own retries by then.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        if any(name in cls.__name__ for cls in type(error).__mro__ for name in _TRANSIENT_NAMES):
+            return True
+        status = _status_code(error)
+        if status is not None:
+            return status in TRANSIENT_STATUS_CODES or status >= 500
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    return LLM_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random())
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_gemini_client() -> GeminiClient:
+    """Process-wide client shared by the API routes and ChatAgent."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = GeminiClient()
+        return _shared
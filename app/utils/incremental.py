@@ -0,0 +1,70 @@
+# app/utils/incremental.py
+import os
+import pickle
+from app.utils.aggregate_cube import AggregateCube
+from app.utils.column_stats import DatasetProfile
+from app.utils.csv_schema import CsvSchema
+from app.utils.dedup import NEAR_DUPLICATES, DuplicateDetector
+
+
+class AnalysisState:
+    """
+    Everything a dataset's analysis can be resumed from when rows are
+    appended: the mergeable profile, the keyed row sample, the row
+    hashes seen by deduplication, the anomaly report so far, the
+    preview, the number of raw rows read and the CSV schema the rows
+    were parsed with. Folding a delta into it
+    costs time proportional to the delta, not to the history.
+
+    Saved as a directory: `state.pkl` plus the duplicate detector's
+    sorted hash runs under `hashes/` and the aggregate cube under `cube/`.
+    """
+
+    def __init__(self, profile: DatasetProfile = None, sample=None, anomaly_report=None, preview=None,
+                 rows_read: int = 0, directory: str = None, schema: CsvSchema = None):
+        self.profile = profile if profile is not None else DatasetProfile()
+        self.sample = sample
+        self.anomaly_report = anomaly_report
+        self.preview = preview
+        self.rows_read = rows_read
+        self.directory = directory
+        self.schema = schema
+
+    def duplicates(self, near: bool = NEAR_DUPLICATES) -> DuplicateDetector:
+        """A detector that has already seen every row of the saved state (or a fresh one)."""
+        if self.directory is None:
+            return DuplicateDetector(near=near)
+        return DuplicateDetector.load(os.path.join(self.directory, "hashes"), near)
+
+    def save_duplicates(self, directory: str, duplicates: DuplicateDetector):
+        """Saved separately so the detector can be closed before the rest of the analysis runs."""
+        os.makedirs(os.path.join(directory, "hashes"), exist_ok=True)
+        duplicates.save(os.path.join(directory, "hashes"))
+
+    def cube(self):
+        """The saved aggregate cube, or None."""
+        if self.directory is None:
+            return None
+        return AggregateCube.load(os.path.join(self.directory, "cube"))
+
+    def save_cube(self, directory: str, cube: AggregateCube):
+        cube.save(os.path.join(directory, "cube"))
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "state.pkl"), "wb") as f:
+            pickle.dump({
+                "profile": self.profile,
+                "sample": self.sample,
+                "anomaly_report": self.anomaly_report,
+                "preview": self.preview,
+                "rows_read": self.rows_read,
+                "schema": self.schema,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+
+    @classmethod
+    def load(cls, directory: str) -> "AnalysisState":
+        with open(os.path.join(directory, "state.pkl"), "rb") as f:
+            saved = pickle.load(f)
+        return cls(directory=directory, **saved)
@@ -0,0 +1,171 @@
+# app/utils/ingestion.py
+import os
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+from starlette.concurrency import run_in_threadpool
+from app.utils.csv_schema import FALSE_VALUES, NULL_VALUES, TRUE_VALUES, CsvSchema
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 100_000))
+# "pyarrow" parses typed reads with Arrow's multi-threaded CSV reader, "pandas" with pandas' C parser
+CSV_ENGINE = os.getenv("CSV_ENGINE", "pyarrow")
+# bytes the Arrow reader parses per block (one block per thread)
+CSV_BLOCK_BYTES = int(os.getenv("CSV_BLOCK_BYTES", 8 * 1024 * 1024))
+
+
+async def spool_upload(file, filepath: str, chunk_bytes: int = UPLOAD_CHUNK_BYTES):
+    """
+    Copies an UploadFile to disk in fixed-size chunks so the request
+    never holds the whole upload in memory. Returns the bytes written
+    and the SHA-256 hex digest of the content.
+    """
+    written = 0
+    digest = hashlib.sha256()
+
+    with open(filepath, "wb") as out:
+        while True:
+            chunk = await file.read(chunk_bytes)
+            if not chunk:
+                break
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+            written += len(chunk)
+
+    return written, digest.hexdigest()
+
+
+def iter_csv_chunks(filepath: str, chunksize: int = CSV_CHUNK_ROWS, start: int = 0, schema: CsvSchema = None):
+    """
+    Yields the CSV as DataFrames of at most `chunksize` rows.
+
+    Without a `schema`, the first chunk fixes the schema: a column that
+    was numeric there is coerced back to numeric in later chunks (stray
+    strings become NaN) so per-chunk statistics can be merged column by
+    column. With one (see infer_schema), every chunk is parsed with its
+    column types, dates included, by the CSV_ENGINE reader. If a later
+    row doesn't fit a type the Arrow reader was given, the rest of the
+    file is read by pandas and coerced to the schema instead.
+
+    Each chunk keeps a global RangeIndex so row positions stay
+    meaningful; `start` offsets it, e.g. for rows appended to an earlier
+    upload.
+    """
+    if schema is None:
+        yield from _untyped_chunks(filepath, chunksize, start)
+        return
+
+    offset = start
+    if CSV_ENGINE == "pyarrow":
+        try:
+            for chunk in _arrow_chunks(filepath, chunksize, schema):
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                yield chunk
+            return
+        except pa.ArrowInvalid:
+            pass
+
+    skip = offset - start
+    # round_trip parses floats exactly as Arrow does, so both readers give the same values
+    with pd.read_csv(filepath, chunksize=chunksize, dtype=schema.pandas_dtypes(), float_precision="round_trip") as reader:
+        for chunk in reader:
+            # rows the Arrow reader already yielded
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            chunk = schema.apply(chunk.iloc[skip:])
+            skip = 0
+
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+
+def _arrow_chunks(filepath: str, chunksize: int, schema: CsvSchema):
+    """Arrow's streaming reader with the schema's types, re-cut into chunks of exactly `chunksize` rows."""
+    reader = pcsv.open_csv(
+        filepath,
+        # pandas' column names (deduplicated, "Unnamed: n" for blanks) replace the header
+        read_options=pcsv.ReadOptions(column_names=schema.columns, skip_rows=1, block_size=CSV_BLOCK_BYTES),
+        convert_options=pcsv.ConvertOptions(
+            column_types=schema.arrow_types(),
+            null_values=NULL_VALUES,
+            true_values=TRUE_VALUES,
+            false_values=FALSE_VALUES,
+            strings_can_be_null=True,
+            timestamp_parsers=schema.timestamp_parsers(),
+        ),
+    )
+
+    pending, rows = [], 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunksize:
+            table = pa.Table.from_batches(pending)
+            yield _parse_dates(table.slice(0, chunksize), schema).to_pandas()
+            rest = table.slice(chunksize)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield _parse_dates(pa.Table.from_batches(pending), schema).to_pandas()
+
+
+def _parse_dates(table: pa.Table, schema: CsvSchema) -> pa.Table:
+    """
+    Parses the datetime columns that were read as text (see
+    CsvSchema.strptime_columns), each with its own format; values that
+    don't fit become missing, as in the pandas reader.
+    """
+    for col in schema.strptime_columns():
+        i = table.schema.get_field_index(col)
+        parsed = pc.strptime(table.column(i), format=schema.formats[col], unit="us", error_is_null=True)
+        table = table.set_column(i, col, parsed)
+    return table
+
+
+def _untyped_chunks(filepath: str, chunksize: int, start: int):
+    numeric_cols = None
+    offset = start
+
+    with pd.read_csv(filepath, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if numeric_cols is None:
+                numeric_cols = chunk.select_dtypes(include=["number"]).columns.tolist()
+            else:
+                for col in numeric_cols:
+                    if col in chunk and not pd.api.types.is_numeric_dtype(chunk[col]):
+                        chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+
+            yield chunk
+
+
+def sample_rows(sample, chunk: pd.DataFrame, size: int, seed: int = 0):
+    """
+    Mergeable uniform row sample (bottom-k on a random key). Feeding
+    every chunk through this keeps at most `size` rows in memory while
+    giving each row the same chance of being kept. Rows come back in
+    their original file order.
+    """
+    rng = pd.Series(
+        pd.util.hash_array(chunk.index.to_numpy(), hash_key=f"{seed:016d}"),
+        index=chunk.index,
+    )
+    keyed = chunk.assign(_sample_key=rng)
+
+    if sample is not None:
+        keyed = pd.concat([sample, keyed])
+
+    if len(keyed) > size:
+        keyed = keyed.nsmallest(size, "_sample_key")
+
+    return keyed.sort_index()
+
+
+def strip_sample_key(sample: pd.DataFrame) -> pd.DataFrame:
+    return sample.drop(columns="_sample_key")
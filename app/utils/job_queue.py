@@ -0,0 +1,233 @@
+# app/utils/job_queue.py
+import os
+import json
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app.utils.serialization import dumps, loads
+from app.utils.shared_state import connect
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 2))
+ANALYSIS_QUEUE_DEPTH = int(os.getenv("ANALYSIS_QUEUE_DEPTH", 16))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", 1000))
+# job status and results, shared by every server process
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "cache/jobs.sqlite3")
+
+_COLUMNS = ("id", "name", "stages", "status", "stage", "completed_stages", "result",
+            "error", "status_code", "created_at", "finished_at", "owner")
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class JobFailed(Exception):
+    """Raised by job functions to fail with a specific HTTP status."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Job:
+    def __init__(self, name: str, stages, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.stages = list(stages)
+        self.status = "queued"
+        self.stage = None
+        self.completed_stages = []
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        # process running the job; only it holds the future
+        self.owner = os.getpid()
+        self.future = None
+        self._on_change = on_change
+
+    def report(self, stage: str):
+        """Progress callback: marks `stage` as started and the previous one done."""
+        if self.stage is not None and self.stage not in self.completed_stages:
+            self.completed_stages.append(self.stage)
+        self.stage = stage
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def to_row(self):
+        return (
+            self.id, self.name, json.dumps(self.stages), self.status, self.stage,
+            json.dumps(self.completed_stages),
+            dumps(self.result).decode("utf-8") if self.result is not None else None,
+            self.error, self.status_code, self.created_at, self.finished_at, self.owner,
+        )
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        values = dict(zip(_COLUMNS, row))
+        job = cls(values["name"], json.loads(values["stages"]))
+        job.id = values["id"]
+        job.status = values["status"]
+        job.stage = values["stage"]
+        job.completed_stages = json.loads(values["completed_stages"])
+        job.result = loads(values["result"]) if values["result"] is not None else None
+        job.error = values["error"]
+        job.status_code = values["status_code"]
+        job.created_at = values["created_at"]
+        job.finished_at = values["finished_at"]
+        job.owner = values["owner"]
+        return job
+
+    def to_dict(self):
+        done = len(self.completed_stages)
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "completed_stages": list(self.completed_stages),
+            "progress": done / len(self.stages) if self.stages else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Runs job functions on a bounded thread pool. At most `max_workers`
+    jobs run at once and at most `max_queued` may be waiting or running
+    in this process; submitting beyond that raises QueueFullError so
+    callers can apply backpressure.
+
+    Job status, progress and results are written to a SQLite table that
+    every server process shares, so a job started by one worker can be
+    polled through any other. The last `history` finished jobs are kept.
+    Jobs whose process exited before finishing are reported as failed.
+    """
+
+    def __init__(self, max_workers: int = ANALYSIS_WORKERS, max_queued: int = ANALYSIS_QUEUE_DEPTH,
+                 history: int = JOB_HISTORY, path: str = JOB_DB_PATH):
+        self.max_queued = max_queued
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        # jobs submitted by this process, for their futures
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._db = connect(path)
+        with self._lock, self._db:
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS jobs ({', '.join(_COLUMNS)}, PRIMARY KEY (id))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            # this process just started, so unfinished jobs under its pid belong to an exited predecessor
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', status_code = 500, error = ?, finished_at = ? "
+                "WHERE finished_at IS NULL AND owner = ?",
+                ("The worker running this job exited.", datetime.now().isoformat(), os.getpid()),
+            )
+
+    def check_capacity(self):
+        """Raises QueueFullError if a job submitted now would be rejected."""
+        with self._lock:
+            if self._pending >= self.max_queued:
+                raise QueueFullError(f"Analysis queue is full ({self.max_queued} jobs).")
+
+    def submit(self, name: str, fn, *args, stages=(), **kwargs) -> Job:
+        """`fn` is called with the job's progress callback as `progress=`."""
+        job = Job(name, stages, on_change=self._save)
+
+        with self._lock:
+            if self._pending >= self.max_queued:
+                raise QueueFullError(f"Analysis queue is full ({self.max_queued} jobs).")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._trim()
+        self._save(job)
+
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = Job.from_row(row)
+        if job.finished_at is None and not _alive(job.owner):
+            job.status, job.status_code, job.error = "failed", 500, "The worker running this job exited."
+            job.finished_at = datetime.now().isoformat()
+            self._save(job)
+        return job
+
+    def stats(self):
+        """Queue depth of this process; queued and running counts across all processes."""
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall())
+            return {
+                "pending": self._pending,
+                "max_queued": self.max_queued,
+                "running": counts.get("running", 0),
+                "queued": counts.get("queued", 0),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job, fn, args, kwargs):
+        job.status = "running"
+        self._save(job)
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.report(None)
+            job.status = "completed"
+        except JobFailed as e:
+            job.status, job.status_code, job.error = "failed", e.status_code, e.detail
+        except Exception as e:
+            job.status, job.status_code, job.error = "failed", 500, str(e)
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            self._save(job)
+            with self._lock:
+                self._pending -= 1
+
+        if job.status == "failed":
+            raise JobFailed(job.status_code, job.error)
+        return job.result
+
+    def _save(self, job: Job):
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                job.to_row(),
+            )
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[: max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+        with self._db:
+            self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND id NOT IN "
+                "(SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+                (self.history,),
+            )
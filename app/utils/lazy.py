@@ -0,0 +1,53 @@
+# app/utils/lazy.py
+import time
+import asyncio
+import threading
+
+
+class Lazy:
+    """
+    A component created on first use rather than at import. Calling the
+    holder returns the instance, running `factory` once (concurrent
+    callers wait for it). A failure is recorded for readiness checks and
+    re-raised; the next call tries again.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self.error = None
+        self.seconds = None
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    def __call__(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                started = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.seconds = time.perf_counter() - started
+                self.error = None
+            return self._instance
+
+    async def aget(self):
+        """The instance, from async code: a first creation runs off the event loop."""
+        return self() if self.ready else await asyncio.to_thread(self)
+
+    def status(self):
+        if self.ready:
+            return {"status": "ready", "init_seconds": self.seconds}
+        if self.error is not None:
+            return {"status": "failed", "error": self.error}
+        return {"status": "pending"}
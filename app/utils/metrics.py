@@ -0,0 +1,125 @@
+# app/utils/metrics.py
+import threading
+
+# seconds; chosen to separate millisecond chart renders from minute-long pipelines
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text
+    exposition format: counters, gauges and cumulative histograms, each
+    keyed by name and a label dict.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._help = {}
+        self._types = {}
+        self._values = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, text: str):
+        self._types[name] = kind
+        self._help[name] = text
+
+    def inc(self, name: str, labels=None, amount: float = 1.0):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, labels=None):
+        with self._lock:
+            self._values[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, labels=None):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self._values} | {name for name, _ in self._histograms})
+            for name in names:
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {self._types[name]}")
+
+                for (metric, labels), value in sorted(self._values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{labels} {value:g}")
+
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    inner = labels[1:-1]
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        le = f'le="{bound:g}"'
+                        lines.append(f"{name}_bucket{{{inner + ',' if inner else ''}{le}}} {count}")
+                    lines.append(f"{name}_bucket{{{inner + ',' if inner else ''}le=\"+Inf\"}} {histogram['count']}")
+                    lines.append(f"{name}_sum{labels} {histogram['sum']:g}")
+                    lines.append(f"{name}_count{labels} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def record_analysis(metrics: Metrics, timings):
+    """Folds one run's PipelineProfiler.to_dict() into the process metrics."""
+    for stage, entry in timings["stages"].items():
+        labels = {"stage": stage}
+        metrics.observe("analysis_stage_seconds", entry["wall_seconds"], labels)
+        metrics.inc("analysis_stage_cpu_seconds_total", labels, entry["cpu_seconds"])
+        metrics.inc("analysis_stage_rows_total", labels, entry["rows"])
+
+    for chart in timings["charts"]:
+        record_chart(metrics, chart)
+
+    metrics.observe("analysis_seconds", timings["total_wall_seconds"])
+    if timings.get("peak_rss_bytes") is not None:
+        metrics.set("process_peak_rss_bytes", timings["peak_rss_bytes"])
+
+
+def record_chart(metrics: Metrics, timing):
+    """One chart's render timing, as produced by the visualization agent."""
+    labels = {"type": timing["type"]}
+    metrics.observe("chart_render_seconds", timing["draw_seconds"] + timing["encode_seconds"], labels)
+    metrics.observe("chart_encode_seconds", timing["encode_seconds"], labels)
+
+
+def default_metrics() -> Metrics:
+    metrics = Metrics()
+    metrics.describe("analysis_seconds", "histogram", "Wall time of a full CSV analysis.")
+    metrics.describe("analysis_stage_seconds", "histogram", "Wall time per pipeline stage and run.")
+    metrics.describe("analysis_stage_cpu_seconds_total", "counter", "CPU time spent per pipeline stage.")
+    metrics.describe("analysis_stage_rows_total", "counter", "Rows processed per pipeline stage.")
+    metrics.describe("chart_render_seconds", "histogram", "Draw plus PNG encode time per chart.")
+    metrics.describe("chart_encode_seconds", "histogram", "PNG encode time per chart.")
+    metrics.describe("analysis_requests_total", "counter", "Analyses by outcome.")
+    metrics.describe("chart_requests_total", "counter", "Chart image requests by outcome.")
+    metrics.describe("process_peak_rss_bytes", "gauge", "Peak resident memory of the API process.")
+    metrics.describe("job_queue_pending", "gauge", "Analysis jobs queued or running.")
+    metrics.describe("job_queue_running", "gauge", "Analysis jobs running.")
+    metrics.describe("cache_hits_total", "counter", "Cache hits by cache.")
+    metrics.describe("cache_misses_total", "counter", "Cache misses by cache.")
+    metrics.describe("startup_import_seconds", "gauge", "Time spent importing the API module.")
+    metrics.describe("component_init_seconds", "gauge", "Time spent creating each lazily initialized component.")
+    return metrics
@@ -0,0 +1,173 @@
+# app/utils/profiling.py
+import os
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+# tracemalloc slows every allocation and is process-wide, so it is opt-in
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "false").lower() == "true"
+
+# profilers currently tracing; tracemalloc is stopped when the last one that needed it closes
+_tracers = 0
+_tracing_started = False
+_tracers_lock = threading.Lock()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process since it started, if the platform reports it."""
+    if not RESOURCE_AVAILABLE:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss_bytes():
+    """Current resident set size of this process (Linux), or None."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PipelineProfiler:
+    """
+    Per-stage timings for one analysis run.
+
+    Each stage records wall and CPU time (CPU of the calling thread),
+    how many times it ran, rows/columns processed, the change in the
+    process's current RSS and, with PROFILE_TRACEMALLOC, the peak traced
+    allocation. Re-entering a stage (e.g. once per chunk) accumulates.
+
+    Time is per thread, but memory figures are process-wide: RSS and
+    tracemalloc see every thread, so while analyses run concurrently
+    (ANALYSIS_WORKERS > 1) a stage's memory includes the other jobs'
+    allocations. `close()` stops tracemalloc once no profiler needs it.
+    """
+
+    def __init__(self, trace_memory: bool = PROFILE_TRACEMALLOC):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.charts = []
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        self._closed = False
+
+        if self.trace_memory:
+            _start_tracing()
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None, columns: int = None):
+        """Times the enclosed block; rows/columns may also be set on the yielded dict."""
+        entry = self.stages.setdefault(name, {
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "calls": 0,
+            "rows": 0,
+            "columns": 0,
+            "rss_growth_bytes": 0,
+        })
+        counts = {"rows": rows, "columns": columns}
+
+        rss_before = current_rss_bytes()
+        if self.trace_memory:
+            # process-wide: this also resets the peak of any concurrent run's stage
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+
+        try:
+            yield counts
+        finally:
+            entry["wall_seconds"] += time.perf_counter() - wall
+            entry["cpu_seconds"] += time.thread_time() - cpu
+            entry["calls"] += 1
+            entry["rows"] += counts["rows"] or 0
+            entry["columns"] = max(entry["columns"], counts["columns"] or 0)
+
+            rss_after = current_rss_bytes()
+            if rss_before is not None and rss_after is not None:
+                entry["rss_growth_bytes"] += rss_after - rss_before
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - traced_before
+                entry["tracemalloc_peak_bytes"] = max(entry.get("tracemalloc_peak_bytes", 0), peak)
+
+    def iterate(self, name: str, iterable):
+        """Yields from `iterable`, timing each step (e.g. parsing the next CSV chunk) as `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as counts:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                counts["rows"] = len(item) if hasattr(item, "__len__") else None
+                counts["columns"] = item.shape[1] if hasattr(item, "shape") and len(item.shape) > 1 else None
+            yield item
+
+    def record_charts(self, timings):
+        """`timings` holds one dict per rendered chart (type, draw/encode seconds, bytes)."""
+        self.charts.extend(timings)
+
+    def close(self):
+        """Releases this profiler's hold on tracemalloc (idempotent)."""
+        if self.trace_memory and not self._closed:
+            _stop_tracing()
+        self._closed = True
+
+    def to_dict(self):
+        result = {
+            "total_wall_seconds": time.perf_counter() - self._started,
+            "total_cpu_seconds": time.thread_time() - self._cpu_started,
+            "stages": self.stages,
+            "charts": self.charts,
+            # process-wide, like the per-stage memory figures
+            "rss_bytes": current_rss_bytes(),
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+        if self.trace_memory:
+            result["tracemalloc_peak_bytes"] = max(
+                (stage.get("tracemalloc_peak_bytes", 0) for stage in self.stages.values()), default=0
+            )
+        return result
+
+
+def _start_tracing():
+    global _tracers, _tracing_started
+    with _tracers_lock:
+        if _tracers == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracers += 1
+
+
+def _stop_tracing():
+    global _tracers, _tracing_started
+    with _tracers_lock:
+        _tracers -= 1
+        # tracing someone else started is left running
+        if _tracers == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+class NullProfiler:
+    """Stand-in used when a caller does not ask for timings."""
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None, columns: int = None):
+        yield {"rows": rows, "columns": columns}
+
+    def iterate(self, name: str, iterable):
+        return iter(iterable)
+
+    def record_charts(self, timings):
+        pass
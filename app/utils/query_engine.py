@@ -0,0 +1,344 @@
+# app/utils/query_engine.py
+import os
+import re
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.database.dataset_registry import ROW_COLUMN
+
+# most result rows a plan may return (and that are sent to the LLM for narration)
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", 50))
+
+FILTER_OPS = ("==", "!=", "<", "<=", ">", ">=", "in", "not in", "contains", "is null", "not null")
+AGGREGATES = {
+    "count": "count",
+    "sum": "sum",
+    "mean": "mean",
+    "median": "median",
+    "min": "min",
+    "max": "max",
+    "std": "std",
+    "nunique": "nunique",
+}
+NUMERIC_AGGREGATES = ("sum", "mean", "median", "std")
+# "<date column>:<grain>" names the column's time bucket, labelled like 2023-07-01, 2023-07, 2023Q3, 2023
+TIME_GRAINS = {"day": "D", "month": "M", "quarter": "Q", "year": "Y"}
+
+PLAN_FORMAT = """{
+  "filters": [{"column": <name>, "op": one of %s, "value": <literal, or list for "in"/"not in">}],
+  "group_by": [<name>, ...],
+  "aggregates": [{"func": one of %s, "column": <name, or "*" with count>, "as": <output name>}],
+  "select": [<name>, ...],
+  "order_by": [{"column": <group_by, aggregate or select name>, "descending": true|false}],
+  "limit": <1 to %d>
+}
+In filters and group_by, a date column can also be named "<column>:<grain>" with grain one of %s
+to use its time bucket, labelled like 2023-07-01, 2023-07, 2023Q3 or 2023.""" % (
+    list(FILTER_OPS), list(AGGREGATES), QUERY_MAX_ROWS, list(TIME_GRAINS)
+)
+
+_FENCE = re.compile(r"^```(?:json)?|```$", re.MULTILINE)
+
+
+class QueryPlanError(ValueError):
+    """The model's answer is not a plan this engine can run (or it declined to write one)."""
+
+
+def parse_plan(text: str) -> dict:
+    """The JSON object in an LLM reply, tolerating code fences and surrounding prose."""
+    text = _FENCE.sub("", text or "")
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise QueryPlanError("The reply contains no query plan.")
+    try:
+        plan = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise QueryPlanError(f"The query plan is not valid JSON: {e}")
+    if not isinstance(plan, dict):
+        raise QueryPlanError("The query plan must be a JSON object.")
+    if plan.get("unsupported"):
+        raise QueryPlanError("The question cannot be answered with a query plan.")
+    return plan
+
+
+def _names(value, field: str):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise QueryPlanError(f"'{field}' must be a list of column names.")
+    return value
+
+
+def split_grain(name: str):
+    """("date", "month") for "date:month"; (name, None) for a plain column."""
+    base, _, grain = name.rpartition(":")
+    if base and grain in TIME_GRAINS:
+        return base, grain
+    return name, None
+
+
+def bucket_label(value, grain: str) -> str:
+    """The label of the `grain` bucket holding `value` (a date, or a bucket label itself)."""
+    try:
+        return str(pd.Period(str(value), freq=TIME_GRAINS[grain]))
+    except (ValueError, TypeError):
+        raise QueryPlanError(f"'{value}' is not a date or {grain} label.")
+
+
+def to_timestamps(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    if pa.types.is_timestamp(column.type):
+        return column
+    if pa.types.is_date(column.type):
+        return column.cast(pa.timestamp("s"))
+    try:
+        return column.cast(pa.timestamp("s"))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # not uniformly ISO-8601; unparsable values become null
+        values = pd.to_datetime(column.to_pandas(), errors="coerce", format="mixed")
+        return pa.chunked_array([pa.array(values, type=pa.timestamp("ns"))])
+
+
+def time_buckets(column: pa.ChunkedArray, grain: str) -> pa.ChunkedArray:
+    """Bucket labels of a date/timestamp (or date string) column, computed once per distinct bucket."""
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    floored = pc.floor_temporal(to_timestamps(column), 1, grain)
+    starts = pc.drop_null(pc.unique(floored))
+    labels = pd.PeriodIndex(starts.to_pandas(), freq=TIME_GRAINS[grain]).astype(str)
+    return pc.take(pa.array(labels, type=pa.string()), pc.index_in(floored, starts))
+
+
+def is_temporal(data_type: pa.DataType, strings: bool = False) -> bool:
+    """Timestamp and date types (and, with strings=True, text that may hold dates)."""
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    if pa.types.is_timestamp(data_type) or pa.types.is_date(data_type):
+        return True
+    return strings and (pa.types.is_string(data_type) or pa.types.is_large_string(data_type))
+
+
+def _is_numeric(data_type: pa.DataType) -> bool:
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type) \
+        or pa.types.is_decimal(data_type) or pa.types.is_boolean(data_type)
+
+
+def validate_plan(plan: dict, schema: pa.Schema) -> dict:
+    """
+    Checks a parsed plan against the dataset's columns and the allowed
+    operations, and returns it normalized (every key present, output
+    names filled in, limit capped at QUERY_MAX_ROWS).
+    """
+    unknown = set(plan) - {"filters", "group_by", "aggregates", "select", "order_by", "limit"}
+    if unknown:
+        raise QueryPlanError(f"Unknown plan keys: {sorted(unknown)}.")
+
+    columns = {field.name: field.type for field in schema if field.name != ROW_COLUMN}
+
+    def column(name, field, grains=False):
+        base, grain = split_grain(name) if grains and isinstance(name, str) and name not in columns else (name, None)
+        if base not in columns:
+            raise QueryPlanError(f"Unknown column '{name}' in {field}.")
+        if grain is not None and not is_temporal(columns[base], strings=True):
+            raise QueryPlanError(f"'{base}' is not a date column.")
+        return name
+
+    filters = []
+    for item in plan.get("filters") or []:
+        if not isinstance(item, dict) or item.get("op") not in FILTER_OPS:
+            raise QueryPlanError(f"Filters need a column and an op from {list(FILTER_OPS)}.")
+        value = item.get("value")
+        if item["op"] in ("in", "not in") and not isinstance(value, list):
+            raise QueryPlanError(f"'{item['op']}' needs a list value.")
+        if item["op"] not in ("is null", "not null") and value is None:
+            raise QueryPlanError(f"'{item['op']}' needs a value.")
+        name = column(item.get("column"), "filters", grains=True)
+        grain = split_grain(name)[1]
+        if grain is not None and item["op"] not in ("is null", "not null", "contains"):
+            value = [bucket_label(v, grain) for v in value] if isinstance(value, list) else bucket_label(value, grain)
+        filters.append({"column": name, "op": item["op"], "value": value})
+
+    group_by = [column(name, "group_by", grains=True) for name in _names(plan.get("group_by"), "group_by")]
+
+    aggregates = []
+    for item in plan.get("aggregates") or []:
+        func = item.get("func") if isinstance(item, dict) else None
+        if func not in AGGREGATES:
+            raise QueryPlanError(f"Aggregates need a func from {list(AGGREGATES)}.")
+        name = item.get("column")
+        if name == "*":
+            if func != "count":
+                raise QueryPlanError("Only count can take '*'.")
+        else:
+            column(name, "aggregates")
+            if func in NUMERIC_AGGREGATES and not _is_numeric(columns[name]):
+                raise QueryPlanError(f"'{func}' needs a numeric column; '{name}' is {columns[name]}.")
+        alias = item.get("as") or (func if name == "*" else f"{func}_{name}")
+        aggregates.append({"func": func, "column": name, "as": str(alias)})
+    if group_by and not aggregates:
+        aggregates.append({"func": "count", "column": "*", "as": "count"})
+
+    select = [column(name, "select") for name in _names(plan.get("select"), "select")]
+    if aggregates:
+        select = []
+    output = group_by + [item["as"] for item in aggregates] if aggregates else (select or list(columns))
+    if len(set(output)) != len(output):
+        raise QueryPlanError("Output column names must be unique.")
+
+    order_by = []
+    for item in plan.get("order_by") or []:
+        if isinstance(item, str):
+            item = {"column": item}
+        if not isinstance(item, dict) or item.get("column") not in output:
+            raise QueryPlanError(f"order_by columns must be among the output columns {output}.")
+        order_by.append({"column": item["column"], "descending": bool(item.get("descending", False))})
+
+    limit = plan.get("limit", QUERY_MAX_ROWS)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise QueryPlanError("limit must be a positive integer.")
+
+    return {
+        "filters": filters,
+        "group_by": group_by,
+        "aggregates": aggregates,
+        "select": select,
+        "order_by": order_by,
+        "limit": min(limit, QUERY_MAX_ROWS),
+    }
+
+
+def plan_columns(plan: dict):
+    """The stored columns a validated plan reads (None = all); only these are mapped in."""
+    if not plan["aggregates"] and not plan["select"]:
+        return None
+    names = [item["column"] for item in plan["filters"]] + plan["group_by"] + plan["select"]
+    names += [item["column"] for item in plan["aggregates"] if item["column"] != "*"]
+    return list(dict.fromkeys(split_grain(name)[0] for name in names))
+
+
+def _with_buckets(table: pa.Table, plan: dict) -> pa.Table:
+    """Adds a label column for every "<column>:<grain>" the plan names."""
+    names = [item["column"] for item in plan["filters"]] + plan["group_by"]
+    for name in dict.fromkeys(names):
+        base, grain = split_grain(name)
+        if grain is not None and name not in table.column_names:
+            table = table.append_column(name, time_buckets(table.column(base), grain))
+    return table
+
+
+def _literal(value, data_type: pa.DataType):
+    """Date strings compared with a timestamp or date column are parsed into datetimes first."""
+    if isinstance(value, list):
+        return [_literal(v, data_type) for v in value]
+    if not isinstance(value, str) or not (pa.types.is_timestamp(data_type) or pa.types.is_date(data_type)):
+        return value
+    try:
+        parsed = pd.Timestamp(value)
+    except ValueError:
+        raise QueryPlanError(f"'{value}' is not a date.")
+    return parsed.date() if pa.types.is_date(data_type) else parsed.to_pydatetime()
+
+
+def _condition(item, schema: pa.Schema):
+    field, op = pc.field(item["column"]), item["op"]
+    value = _literal(item["value"], schema.field(item["column"]).type)
+    if op == "is null":
+        return field.is_null()
+    if op == "not null":
+        return field.is_valid()
+    if op == "in":
+        return field.isin(value)
+    if op == "not in":
+        return ~field.isin(value)
+    if op == "contains":
+        return pc.match_substring(field, str(value), ignore_case=True)
+    return {
+        "==": field == value,
+        "!=": field != value,
+        "<": field < value,
+        "<=": field <= value,
+        ">": field > value,
+        ">=": field >= value,
+    }[op]
+
+
+def execute_plan(table: pa.Table, plan: dict):
+    """
+    Runs a validated plan over `table` (usually a memory-mapped dataset
+    restricted to plan_columns()). Filters are evaluated by Arrow
+    compute kernels before any row reaches pandas. For aggregates only
+    the matching rows of the needed columns are converted for grouping;
+    plain row selections are sorted and limited in Arrow, so only the
+    rows returned are converted.
+
+    Returns the result frame (at most plan["limit"] rows) and the number
+    of rows it had before the limit.
+    """
+    if ROW_COLUMN in table.column_names:
+        table = table.drop_columns([ROW_COLUMN])
+    # dictionary (category) columns compare as their values
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+
+    table = apply_filters(_with_buckets(table, plan), plan["filters"])
+    if not plan["aggregates"]:
+        return _select_rows(table, plan)
+
+    df = table.to_pandas()
+    if plan["group_by"]:
+        named = {
+            item["as"]: (item["column"] if item["column"] != "*" else plan["group_by"][0],
+                         "size" if item["column"] == "*" else AGGREGATES[item["func"]])
+            for item in plan["aggregates"]
+        }
+        result = df.groupby(plan["group_by"], dropna=False, sort=False, observed=True).agg(**named).reset_index()
+    else:
+        result = pd.DataFrame({
+            item["as"]: [table.num_rows if item["column"] == "*" else df[item["column"]].agg(AGGREGATES[item["func"]])]
+            for item in plan["aggregates"]
+        })
+
+    return finish(result, plan)
+
+
+def _select_rows(table: pa.Table, plan: dict):
+    """finish() for a plan without aggregates, done in Arrow (stable sort, missing values last)."""
+    if plan["select"]:
+        table = table.select(plan["select"])
+    matched = table.num_rows
+    if plan["order_by"]:
+        keys = [(item["column"], "descending" if item["descending"] else "ascending") for item in plan["order_by"]]
+        order = pc.sort_indices(table, sort_keys=keys)
+        table = table.take(order[:plan["limit"]])
+    else:
+        table = table.slice(0, plan["limit"])
+    return table.to_pandas(), matched
+
+
+def apply_filters(table: pa.Table, filters) -> pa.Table:
+    if not filters:
+        return table
+    expression = _condition(filters[0], table.schema)
+    for item in filters[1:]:
+        expression = expression & _condition(item, table.schema)
+    try:
+        return table.filter(expression)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+        raise QueryPlanError(f"A filter does not fit its column's type: {e}")
+
+
+def finish(result: pd.DataFrame, plan: dict):
+    """Sorts and limits a plan's result; returns it with its row count before the limit."""
+    if plan["order_by"]:
+        result = result.sort_values(
+            [item["column"] for item in plan["order_by"]],
+            ascending=[not item["descending"] for item in plan["order_by"]],
+            kind="stable",
+            na_position="last",
+        )
+    return result.head(plan["limit"]).reset_index(drop=True), len(result)
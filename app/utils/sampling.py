@@ -0,0 +1,88 @@
+# app/utils/sampling.py
+import numpy as np
+import pandas as pd
+
+
+def sample_points(df: pd.DataFrame, x: str, y: str, max_points: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Uniform random sample of at most `max_points` rows for a scatter of
+    x vs y. The rows holding the min and max of each axis are always
+    kept so the plotted extent matches the full data.
+    """
+    points = df[[x, y]] if x != y else df[[x]]
+    points = points.dropna()
+    if len(points) <= max_points:
+        return points
+
+    extremes = {
+        points.index[np.argmin(points[col].to_numpy())] for col in points.columns
+    } | {
+        points.index[np.argmax(points[col].to_numpy())] for col in points.columns
+    }
+
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(points), size=max_points - len(extremes), replace=False)
+    keep = points.index[np.sort(chosen)].union(pd.Index(list(extremes)))
+
+    return points.loc[keep]
+
+
+def minmax_indices(values, buckets: int):
+    """
+    Min/max bucketing for line charts: splits the series into `buckets`
+    equal runs and returns the positions of each run's min and max, which
+    preserves peaks and troughs that plain striding would drop.
+    """
+    values = np.asarray(values, dtype="float64")
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = values
+    blocks = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+
+    low = np.where(np.isnan(blocks), np.inf, blocks).argmin(axis=1) + offsets
+    high = np.where(np.isnan(blocks), -np.inf, blocks).argmax(axis=1) + offsets
+
+    positions = np.unique(np.concatenate([low, high]))
+    positions = positions[positions < n]
+    return positions[~np.isnan(values[positions])]
+
+
+def downsample_lines(df: pd.DataFrame, columns, max_points: int) -> pd.DataFrame:
+    """Keeps the union of every column's min/max-bucket rows, in index order."""
+    if len(df) <= max_points:
+        return df[columns]
+
+    buckets = max(1, max_points // 2)
+    positions = np.unique(np.concatenate([
+        minmax_indices(pd.to_numeric(df[col], errors="coerce"), buckets) for col in columns
+    ]))
+    return df[columns].iloc[positions]
+
+
+def histogram_bins(values, bins: int) -> pd.DataFrame:
+    """Pre-bins a column with NumPy so only bin edges and counts are drawn."""
+    values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype="float64")
+    counts, edges = np.histogram(values, bins=bins)
+    return pd.DataFrame({"left": edges[:-1], "right": edges[1:], "count": counts})
+
+
+def top_categories(values, k: int, other: str = "Other", counts: pd.Series = None) -> pd.DataFrame:
+    """
+    Counts of the `k` most frequent values, with the rest folded into one
+    `other` bar. `counts` (value -> count, most frequent first) may be
+    passed instead of the values when they were counted elsewhere.
+    """
+    counts = pd.Series(values).value_counts() if counts is None else counts
+    rest = counts.iloc[k:].sum()
+    counts = counts.iloc[:k]
+    labels = counts.index.astype(str).tolist()
+    values = counts.tolist()
+    if rest:
+        labels.append(other)
+        values.append(int(rest))
+    return pd.DataFrame({"value": labels, "count": values})
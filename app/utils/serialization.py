@@ -0,0 +1,50 @@
+# app/utils/serialization.py
+import json
+from datetime import date
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj):
+    """Values neither encoder handles itself: NumPy values, timestamps (NaT is null)."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, date):
+        # NaT is the only timestamp unequal to itself
+        return obj.isoformat() if obj == obj else None
+    return str(obj)
+
+
+def dumps(obj) -> bytes:
+    """
+    JSON bytes for a result that may still hold NumPy scalars, arrays and
+    pandas timestamps. With orjson they are encoded natively and NaN
+    becomes null, so a result is never walked in Python first; the
+    standard library encoder is the fallback.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+class CompactJSONResponse(JSONResponse):
+    """
+    A JSON response encoded with `dumps`. Routes that return one skip
+    FastAPI's response-model validation and jsonable_encoder pass, which
+    for a wide analysis result cost more than building it.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
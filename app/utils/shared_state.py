@@ -0,0 +1,56 @@
+# app/utils/shared_state.py
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# server processes sharing the on-disk state (uvicorn/gunicorn read the same variable)
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+# seconds a writer waits for another process to release the SQLite write lock
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 30))
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    SQLite connection that several server processes can share: WAL lets
+    readers run alongside the single writer, and writers wait up to
+    SQLITE_BUSY_TIMEOUT for each other instead of failing.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive lock named by `path`, held against other threads of this
+    process and, where fcntl exists, other processes (flock on the file).
+    """
+    with _thread_locks_guard:
+        lock = _thread_locks.setdefault(path, threading.Lock())
+
+    with lock:
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,75 @@
+# benchmarks/compare.py
+"""
+Compares two benchmark result files and flags regressions.
+
+    python -m benchmarks.compare benchmarks/results/main.json benchmarks/results/branch.json
+"""
+import sys
+import json
+import argparse
+
+# differences below this many seconds are treated as noise
+NOISE_FLOOR_SECONDS = 0.002
+
+
+def _key(result):
+    return f"{result['group']}.{result['name']}|{result['shape']}|{result['rows']}"
+
+
+def compare_results(baseline, current, threshold: float = 0.15):
+    """
+    Matches results by benchmark, shape and size and compares medians.
+    A result is a regression when it got slower by more than `threshold`
+    (relative) and by more than the noise floor.
+    """
+    before = {_key(result): result for result in baseline["results"]}
+    rows = []
+
+    for result in current["results"]:
+        key = _key(result)
+        old = before.get(key)
+        new_median = result["seconds"]["median"]
+        if old is None:
+            rows.append({"benchmark": key, "baseline": None, "current": new_median, "ratio": None, "status": "new"})
+            continue
+
+        old_median = old["seconds"]["median"]
+        ratio = new_median / old_median if old_median else None
+        delta = new_median - old_median
+        if ratio is not None and ratio > 1 + threshold and delta > NOISE_FLOOR_SECONDS:
+            status = "regression"
+        elif ratio is not None and ratio < 1 - threshold and -delta > NOISE_FLOOR_SECONDS:
+            status = "improvement"
+        else:
+            status = "unchanged"
+        rows.append({"benchmark": key, "baseline": old_median, "current": new_median, "ratio": ratio, "status": status})
+
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        baseline = f"{row['baseline']:.4f}s" if row["baseline"] is not None else "-"
+        ratio = f"x{row['ratio']:.2f}" if row["ratio"] is not None else ""
+        print(f"{row['status']:<12} {row['benchmark']:<70} {baseline:>10} -> {row['current']:.4f}s {ratio}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row["status"] == "regression" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
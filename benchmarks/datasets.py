@@ -0,0 +1,85 @@
+# benchmarks/datasets.py
+import numpy as np
+import pandas as pd
+
+SHAPES = ["narrow_numeric", "wide_numeric", "categorical_heavy", "mixed"]
+
+_WORDS = np.array([
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+])
+
+
+def _numeric(rng, rows: int, count: int, prefix: str = "x"):
+    columns = {}
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            columns[f"{prefix}{i}"] = rng.normal(100, 15, rows)
+        elif kind == 1:
+            columns[f"{prefix}{i}"] = rng.integers(0, 10_000, rows)
+        else:
+            columns[f"{prefix}{i}"] = rng.lognormal(0, 1, rows)
+    return columns
+
+
+def _categorical(rng, rows: int, count: int, prefix: str = "c"):
+    columns = {}
+    for i in range(count):
+        # cardinality grows with the column position: 4, 16, 256, ...
+        cardinality = 4 ** (1 + i % 4)
+        codes = rng.integers(0, cardinality, rows)
+        columns[f"{prefix}{i}"] = _WORDS[codes % len(_WORDS)] + "_" + (codes // len(_WORDS)).astype(str)
+    return columns
+
+
+def make_dataset(shape: str, rows: int, seed: int = 0, duplicate_share: float = 0.01,
+                 missing_share: float = 0.01) -> pd.DataFrame:
+    """
+    Deterministic synthetic frame for benchmarks. A small share of rows
+    are exact duplicates and of cells are missing, and a few numeric
+    outliers are planted, so every pipeline stage has work to do.
+    """
+    rng = np.random.default_rng(seed)
+
+    if shape == "narrow_numeric":
+        columns = _numeric(rng, rows, 6)
+    elif shape == "wide_numeric":
+        columns = _numeric(rng, rows, 100)
+    elif shape == "categorical_heavy":
+        columns = {**_numeric(rng, rows, 2), **_categorical(rng, rows, 12)}
+    elif shape == "mixed":
+        columns = {**_numeric(rng, rows, 10), **_categorical(rng, rows, 5)}
+        columns["created_at"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h")
+    else:
+        raise ValueError(f"Unknown dataset shape: {shape}")
+
+    df = pd.DataFrame(columns)
+
+    numeric = df.select_dtypes(include=["number"]).columns
+    if len(numeric):
+        outliers = rng.choice(rows, size=max(1, rows // 1000), replace=False)
+        df.loc[outliers, numeric[0]] = df[numeric[0]].mean() + 50 * df[numeric[0]].std()
+
+    if missing_share > 0:
+        for col in df.columns[::3]:
+            holes = rng.random(rows) < missing_share
+            df[col] = df[col].mask(holes)
+
+    if duplicate_share > 0:
+        duplicates = df.sample(frac=duplicate_share, random_state=seed)
+        df = pd.concat([df, duplicates], ignore_index=True)
+
+    return df
+
+
+def write_csv(df: pd.DataFrame, path: str) -> str:
+    df.to_csv(path, index=False)
+    return path
+
+
+def parse_size(text: str) -> int:
+    """'10k' -> 10_000, '1m' -> 1_000_000, plain integers pass through."""
+    text = text.strip().lower().replace("_", "")
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
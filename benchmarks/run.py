@@ -0,0 +1,355 @@
+# benchmarks/run.py
+"""
+Reproducible benchmarks for the analysis pipeline and the API.
+
+    python -m benchmarks.run --sizes 10k,100k --shapes narrow_numeric,mixed
+    python -m benchmarks.run --suites api --output benchmarks/results/branch.json \
+        --baseline benchmarks/results/main.json
+
+Every run works in a fresh temporary directory (uploads, caches, vector
+store, dataset registry) and uses the fake LLM provider, so results do
+not depend on earlier runs or on network latency.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.compare import compare_results, print_comparison
+from benchmarks.datasets import SHAPES, make_dataset, parse_size, write_csv
+
+SUITES = ["startup", "micro", "pipeline", "api"]
+
+# run in a fresh interpreter per sample, so nothing is imported beforehand
+STARTUP_PROBE = """
+import sys, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    opened = time.perf_counter()
+    client.get("/health").raise_for_status()
+    health = time.perf_counter()
+    while client.get("/ready").status_code != 200:
+        if time.perf_counter() - health > 120:
+            sys.exit("components did not become ready: " + client.get("/ready").text)
+        time.sleep(0.01)
+    ready = time.perf_counter()
+# the TestClient import is not part of start-up, so it is left out of the totals
+print(json.dumps({
+    "import_main": imported - started,
+    "first_health": (imported - started) + (health - opened),
+    "ready": (imported - started) + (ready - opened),
+}))
+"""
+
+
+def _isolate(workdir: str, vector_backend: str):
+    """Points every on-disk store at `workdir`; must run before the app is imported."""
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["RESULT_CACHE_DIR"] = os.path.join(workdir, "cache", "results")
+    os.environ["ANSWER_CACHE_PATH"] = os.path.join(workdir, "cache", "answers.sqlite3")
+    os.environ["DATASET_DIR"] = os.path.join(workdir, "datasets")
+    os.environ["CHART_STORE_DIR"] = os.path.join(workdir, "cache", "charts")
+    os.environ["JOB_DB_PATH"] = os.path.join(workdir, "cache", "jobs.sqlite3")
+    os.environ["VECTOR_BACKEND"] = vector_backend
+    # every /ask question should reach the (fake) LLM unless it is asked twice
+    os.environ.setdefault("ANSWER_CACHE_SIMILARITY", "0")
+    os.chdir(workdir)
+
+
+def _measure(fn, repeat: int, setup=None):
+    samples = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _summary(group: str, name: str, shape: str, rows: int, samples, **extra):
+    ordered = sorted(samples)
+    result = {
+        "group": group,
+        "name": name,
+        "shape": shape,
+        "rows": rows,
+        "repeat": len(samples),
+        "seconds": {
+            "min": ordered[0],
+            "median": statistics.median(ordered),
+            "mean": statistics.fmean(ordered),
+            "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            "max": ordered[-1],
+        },
+    }
+    if rows:
+        result["rows_per_second"] = rows / result["seconds"]["median"] if result["seconds"]["median"] else None
+    result.update(extra)
+    print(f"  {group + '.' + name:<42} {shape:<18} {rows:>10}  median {result['seconds']['median']:.4f}s")
+    return result
+
+
+def startup_benchmarks(repeat: int, repo_root: str):
+    """Cold start of the API module: import, first /health answer, and /ready turning 200."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [repo_root, os.getenv("PYTHONPATH")]))}
+    samples = {}
+    for _ in range(repeat):
+        probe = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True, check=True, env=env,
+        )
+        for name, seconds in json.loads(probe.stdout.strip().splitlines()[-1]).items():
+            samples.setdefault(name, []).append(seconds)
+
+    return [_summary("startup", name, "-", 0, values) for name, values in samples.items()]
+
+
+def micro_benchmarks(df, shape: str, rows: int, repeat: int):
+    """One timing per agent method, each on the same in-memory frame."""
+    from app.agents.analysis_agent import AnalysisAgent
+    from app.agents.cleaning_agent import CleaningAgent
+    from app.agents.visualization_agent import VisualizationAgent
+    from app.database.vector_db import VectorStore
+    from app.utils.column_stats import DatasetProfile
+    from app.utils.context_chunks import build_context_chunks
+    from app.utils.serialization import dumps
+
+    cleaning = CleaningAgent()
+    analysis = AnalysisAgent()
+    visualization = VisualizationAgent()
+    results = []
+
+    def run(name, fn, setup=None, **extra):
+        results.append(_summary("micro", name, shape, rows, _measure(fn, repeat, setup), **extra))
+
+    run("cleaning.optimize_dtypes", lambda: cleaning.optimize_dtypes(df))
+    run("cleaning.remove_duplicates", lambda: cleaning.remove_duplicates(df))
+
+    clean, _ = cleaning.remove_duplicates(df)
+    run("profile.from_frame", lambda: DatasetProfile.from_frame(clean))
+    profile = DatasetProfile.from_frame(clean)
+
+    run("analysis.perform_eda", lambda: analysis.perform_eda(clean, profile))
+    run("analysis.detect_anomalies", lambda: analysis.detect_anomalies(clean, profile))
+
+    report = analysis.perform_eda(clean, profile)
+    run("visualization.recommend", lambda: visualization.recommend_visualizations(clean, report))
+    specs = visualization.recommend_visualizations(clean, report)
+    run("visualization.generate", lambda: visualization.generate_visualizations(clean, specs), charts=len(specs))
+    visualization.shutdown()
+
+    result = {
+        "dataset_name": f"bench-{shape}-{rows}",
+        "analysis_report": report,
+        "data_quality_report": cleaning.quality_report(profile, len(df) - len(clean)),
+        "anomaly_report": analysis.detect_anomalies(clean, profile),
+        "summary_report": "benchmark",
+    }
+    run("result.serialize", lambda: dumps(result), bytes=len(dumps(result)))
+    texts, metadatas = build_context_chunks(result, version="bench")
+    store = VectorStore(persist_directory=os.path.join(os.getcwd(), "vectors"))
+    run("vector_store.replace_contexts",
+        lambda: store.replace_contexts(result["dataset_name"], texts, metadatas), chunks=len(texts))
+    run("vector_store.search_records",
+        lambda: store.search_records("which column has the most missing values", dataset=result["dataset_name"]))
+
+    return results
+
+
+def pipeline_benchmarks(csv_path: str, shape: str, rows: int, repeat: int):
+    """The chunked file pipeline, with and without the columnar store."""
+    from app.agents.coordinator import DataAnalysisCoordinator
+    from app.database.dataset_registry import DatasetRegistry
+
+    coordinator = DataAnalysisCoordinator()
+    registry = DatasetRegistry()
+    results = []
+
+    samples = _measure(lambda: coordinator.orchestrate_file_analysis(csv_path, "bench"), repeat)
+    results.append(_summary("pipeline", "orchestrate_file_analysis", shape, rows, samples))
+
+    samples = _measure(
+        lambda: coordinator.orchestrate_file_analysis(csv_path, "bench", store=registry.writer("bench", "v")),
+        repeat,
+    )
+    results.append(_summary("pipeline", "orchestrate_file_analysis+store", shape, rows, samples))
+
+    coordinator.visualization_agent.shutdown()
+    return results
+
+
+def api_benchmarks(csv_path: str, shape: str, rows: int, repeat: int, ask_requests: int, concurrency: int):
+    """End-to-end latency and throughput through FastAPI's TestClient."""
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    name = f"{shape}-{rows}.csv"
+    results = []
+
+    def upload(content):
+        response = client.post("/analyze-csv", files={"file": (name, content, "text/csv")})
+        response.raise_for_status()
+        return response.json()
+
+    # a trailing blank line changes the content hash but not the data, so each upload misses the cache
+    counter = iter(range(1, 1_000_000))
+    samples = _measure(upload, repeat, setup=lambda: (data + b"\n" * next(counter),))
+    results.append(_summary("api", "analyze_csv.cold", shape, rows, samples, bytes=len(data)))
+
+    specs = upload(data)["visualization_specs"]
+    samples = _measure(upload, repeat, setup=lambda: (data,))
+    results.append(_summary("api", "analyze_csv.cached", shape, rows, samples, bytes=len(data)))
+
+    def chart(url):
+        client.get(url).raise_for_status()
+
+    # charts are drawn on first request, then served from the chart store
+    for group in ("render", "cached"):
+        samples = _measure(chart, len(specs), setup=lambda it=iter(specs): (next(it)["url"],))
+        results.append(_summary("api", f"chart.{group}", shape, rows, samples, charts=len(specs)))
+
+    def ask(question):
+        response = client.get("/ask", params={"query": question, "dataset": name})
+        response.raise_for_status()
+
+    questions = [f"What is the distribution of column number {i}?" for i in range(ask_requests)]
+    samples = _measure(ask, len(questions), setup=lambda it=iter(questions): (next(it),))
+    results.append(_summary("api", "ask.uncached", shape, rows, samples))
+
+    samples = _measure(ask, len(questions), setup=lambda it=iter(questions): (next(it),))
+    results.append(_summary("api", "ask.cached", shape, rows, samples))
+
+    def timed_ask(question):
+        started = time.perf_counter()
+        ask(question)
+        return time.perf_counter() - started
+
+    burst = [f"Concurrent question {i} about outliers" for i in range(ask_requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed_ask, burst))
+    elapsed = time.perf_counter() - started
+    results.append(_summary(
+        "api", "ask.concurrent", shape, rows, samples,
+        concurrency=concurrency, requests_per_second=len(burst) / elapsed,
+    ))
+
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", default="narrow_numeric,categorical_heavy",
+                        help=f"comma-separated, from: {', '.join(SHAPES)}")
+    parser.add_argument("--sizes", default="10k,100k", help="comma-separated row counts, e.g. 10k,1m,10m")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated, from: {', '.join(SUITES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ask-requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--vector-backend", default="numpy", choices=["auto", "chroma", "numpy"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative slowdown of the median that counts as a regression")
+    parser.add_argument("--import-budget", type=float, default=1.5,
+                        help="seconds the median `import main` may take in the startup suite before the run fails")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args(argv)
+
+    shapes = [shape for shape in args.shapes.split(",") if shape]
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size]
+    suites = [suite for suite in args.suites.split(",") if suite]
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo_root)
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    _isolate(workdir, args.vector_backend)
+
+    results = []
+    try:
+        if "startup" in suites:
+            print("startup")
+            results += startup_benchmarks(args.repeat, repo_root)
+        if set(suites) == {"startup"}:
+            # no dataset is needed
+            shapes = []
+        for shape in shapes:
+            for rows in sizes:
+                print(f"{shape} x {rows} rows")
+                df = make_dataset(shape, rows, seed=args.seed)
+                csv_path = write_csv(df, os.path.join(workdir, f"{shape}-{rows}.csv"))
+
+                if "micro" in suites:
+                    results += micro_benchmarks(df, shape, rows, args.repeat)
+                if "pipeline" in suites:
+                    results += pipeline_benchmarks(csv_path, shape, rows, args.repeat)
+                if "api" in suites:
+                    results += api_benchmarks(
+                        csv_path, shape, rows, args.repeat, args.ask_requests, args.concurrency
+                    )
+    finally:
+        os.chdir(repo_root)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    status = 0
+    for result in results:
+        if result["group"] == "startup" and result["name"] == "import_main" \
+                and result["seconds"]["median"] > args.import_budget:
+            print(f"import main took {result['seconds']['median']:.3f}s, over the {args.import_budget:g}s budget")
+            status = 1
+
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            rows = compare_results(json.load(f), report, args.threshold)
+        print_comparison(rows)
+        if any(row["status"] == "regression" for row in rows):
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,12 +2,13 @@
 import streamlit as st
 import requests
 import pandas as pd
-import base64
-from io import BytesIO
-from PIL import Image
+import time
 
 API_BASE_URL = "http://backend:8000"  
 
+# charts fetched up front; the rest are rendered only when picked
+CHARTS_SHOWN = 6
+
 st.set_page_config(
     page_title="Autonomous Data Analyst",
     layout="wide",
@@ -83,6 +84,21 @@ textarea, input, select {
 """, unsafe_allow_html=True)
 
 
+@st.cache_data(show_spinner=False)
+def fetch_chart(url):
+    response = requests.get(f"{API_BASE_URL}{url}", timeout=60)
+    response.raise_for_status()
+    return response.content
+
+
+def chart_label(spec):
+    if spec["type"] == "scatter":
+        return f"{spec['type']}: {spec['x']} vs {spec['y']}"
+    if "column" in spec:
+        return f"{spec['type']}: {spec['column']}"
+    return spec["type"]
+
+
 # ==========================================================
 # SIDEBAR NAVIGATION
 # ==========================================================
@@ -114,17 +130,34 @@ if mode == "Upload CSV & Analyze":
         st.write("### Preview of your data:")
         st.dataframe(df.head())
 
+        append = st.checkbox(
+            "Append rows to the dataset already analyzed under this name",
+            help="Upload only the new rows; they are merged into the earlier analysis.",
+        )
+
         if st.button("🚀 Run Analysis"):
             with st.spinner("Analyzing dataset using agents..."):
 
                 files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "text/csv")}
                 try:
+                    # submit as a background job, then poll until it finishes
                     response = requests.post(
-                        f"{API_BASE_URL}/analyze-csv",
+                        f"{API_BASE_URL}/jobs/analyze-csv",
                         files=files,
-                        timeout=180
+                        params={"append": append},
+                        timeout=60
                     )
                     response.raise_for_status()
+                    job = response.json()
+
+                    progress_bar = st.progress(0.0, text="Queued")
+                    while job["status"] in ("queued", "running"):
+                        time.sleep(1)
+                        job = requests.get(f"{API_BASE_URL}/jobs/{job['job_id']}", timeout=10).json()
+                        progress_bar.progress(job["progress"] or 0.0, text=job["stage"] or job["status"])
+
+                    response = requests.get(f"{API_BASE_URL}/jobs/{job['job_id']}/result", timeout=60)
+                    response.raise_for_status()
 
                     # Save the result permanently
                     st.session_state.analysis_result = response.json()
@@ -144,7 +177,13 @@ if mode == "Upload CSV & Analyze":
         st.write(result.get("summary_report", "No summary available"))
 
         st.subheader("📊 EDA / Analysis Report")
-        st.write(result.get("analysis_report", "No analysis available"))
+        report = result.get("analysis_report") or {}
+        statistics = report.get("summary_statistics") or {}
+        st.write({key: value for key, value in report.items() if key != "summary_statistics"} or "No analysis available")
+        for kind, table in statistics.items():
+            if table.get("column"):
+                st.caption(f"{kind.title()} columns")
+                st.dataframe(pd.DataFrame(table).set_index("column"))
 
         st.subheader("🧹 Data Quality Report")
         st.write(result.get("data_quality_report", "No quality report available"))
@@ -155,18 +194,23 @@ if mode == "Upload CSV & Analyze":
         # ============================
         # Visualizations
         # ============================
-        if "generated_visualizations" in result:
-            visualizations = result["generated_visualizations"]
-            if visualizations:
-                st.subheader("📊 Visualizations")
-
-                for viz_b64 in visualizations:
-                    try:
-                        img_bytes = base64.b64decode(viz_b64)
-                        img = Image.open(BytesIO(img_bytes))
-                        st.image(img, use_column_width=True)
-                    except Exception as e:
-                        st.error(f"Failed to load image: {e}")
+        specs = [spec for spec in result.get("visualization_specs", []) if spec.get("url")]
+        if specs:
+            st.subheader("📊 Visualizations")
+
+            labels = {spec["url"]: chart_label(spec) for spec in specs}
+            chosen = st.multiselect(
+                "Charts",
+                list(labels),
+                default=list(labels)[:CHARTS_SHOWN],
+                format_func=labels.get,
+            )
+
+            for url in chosen:
+                try:
+                    st.image(fetch_chart(url), caption=labels[url], use_column_width=True)
+                except Exception as e:
+                    st.error(f"Failed to load image: {e}")
 
         if result.get("dashboard_url"):
             st.subheader("📈 Dashboard")
@@ -189,6 +233,10 @@ if mode == "Ask a Question":
 
     dataset_name = st.text_input("Dataset Name (same filename used during upload)")
     question = st.text_area("Your Question")
+    exact = st.checkbox(
+        "Compute the answer from the data",
+        help="The question is turned into a query (filter, group, aggregate) that runs over every row.",
+    )
 
     if st.button("💬 Get Answer"):
         if not dataset_name or not question:
@@ -196,12 +244,13 @@ if mode == "Ask a Question":
         else:
             with st.spinner("Retrieving answer..."):
                 try:
-                    params = {"dataset": dataset_name, "query": question}
+                    params = {"dataset": dataset_name, "query": question, "mode": "query" if exact else "context"}
                     response = requests.get(f"{API_BASE_URL}/ask", params=params)
                     response.raise_for_status()
 
                     # Save answer permanently
                     st.session_state.ask_answer = response.json().get("answer", "No answer available")
+                    st.session_state.ask_result = response.json().get("result")
 
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -211,4 +260,6 @@ if mode == "Ask a Question":
     # -------------------------------------
     if st.session_state.ask_answer:
         st.subheader("🔍 Answer")
-        st.write(st.session_state.ask_answer)
\ No newline at end of file
+        st.write(st.session_state.ask_answer)
+        if st.session_state.get("ask_result"):
+            st.dataframe(pd.DataFrame(st.session_state.ask_result))
\ No newline at end of file
@@ -1,15 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import threading
+from functools import partial
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import numpy as np
 import os
+import json
+import shutil
+import hashlib
 from datetime import datetime
 
-from app.agents.coordinator import DataAnalysisCoordinator
+# pandas, pyarrow, matplotlib, chromadb and the LLM client library are only
+# imported by the code paths that use them, so the process answers /health
+# within a fraction of a second of starting (see /ready for the rest)
 from app.models.schemas import AnalysisResponse
-from app.database.vector_db import VectorStore
-from app.utils.gemini_client import GeminiClient
+from app.utils.answer_cache import AnswerCache, mode_namespace
+from app.utils.compression import CompressionMiddleware
+from app.utils.context_chunks import CONTEXT_CANDIDATES, build_context_chunks, select_within_budget
+from app.utils.job_queue import JobFailed, JobQueue, QueueFullError
+from app.utils.lazy import Lazy
+from app.utils.metrics import default_metrics, record_analysis, record_chart
+from app.utils.profiling import PipelineProfiler
+from app.utils.result_cache import ResultCache, cache_key
+from app.utils.serialization import CompactJSONResponse
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -17,7 +33,8 @@ load_dotenv()
 app = FastAPI(
     title="Autonomous Data Analyst",
     version="1.0.0",
-    description="Upload CSV → Auto Analysis → Chat with Data"
+    description="Upload CSV → Auto Analysis → Chat with Data",
+    default_response_class=CompactJSONResponse,
 )
 
 app.add_middleware(
@@ -26,31 +43,237 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
-coordinator = DataAnalysisCoordinator()
-vector_db = VectorStore()
-gemini = GeminiClient()
+result_cache = ResultCache()
+answer_cache = AnswerCache()
+job_queue = JobQueue()
+metrics = default_metrics()
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# "false" leaves components to be created by the first request (or readiness probe) that needs them
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+
+# -------------------------
+# Components, created on first use
+# -------------------------
+def _create_dataset_registry():
+    from app.database.dataset_registry import DatasetRegistry
+    return DatasetRegistry()
+
+
+def _create_chart_store():
+    from app.utils.chart_store import ChartStore
+    return ChartStore()
+
+
+def _create_coordinator():
+    from app.agents.coordinator import DataAnalysisCoordinator
+    return DataAnalysisCoordinator()
+
+
+def _create_vector_store():
+    from app.database.vector_db import VectorStore
+    store = VectorStore()
+    store.warm_up()
+    return store
+
+
+def _create_llm():
+    from app.utils.gemini_client import get_gemini_client
+    return get_gemini_client()
+
+
+def _create_chat_agent():
+    from app.agents.chat_agent import ChatAgent
+    return ChatAgent()
+
+
+dataset_registry = Lazy("dataset_registry", _create_dataset_registry)
+chart_store = Lazy("chart_store", _create_chart_store)
+coordinator = Lazy("coordinator", _create_coordinator)
+vector_db = Lazy("vector_store", _create_vector_store)
+gemini = Lazy("llm", _create_llm)
+chat_agent = Lazy("chat_agent", _create_chat_agent)
+
+COMPONENTS = (dataset_registry, chart_store, coordinator, vector_db, gemini, chat_agent)
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def warm_up():
+    """Creates every component in turn; failures are left for /ready to report."""
+    for component in COMPONENTS:
+        try:
+            component()
+        except Exception:
+            pass
+
+
+def start_warm_up():
+    """Warms up in a background thread, unless that is running or every component is ready."""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is not None and _warm_up_thread.is_alive():
+            return
+        if all(component.ready for component in COMPONENTS):
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        _warm_up_thread.start()
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def with_timings(result, include: bool):
+    """The per-stage `timings` block is only returned when asked for."""
+    return result if include else {**result, "timings": None}
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
 
 # -------------------------
-# Helper function to convert numpy types
+# Analysis pipeline (runs on the job queue)
 # -------------------------
-def convert_numpy(obj):
-    if isinstance(obj, dict):
-        return {k: convert_numpy(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy(i) for i in obj]
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
+def run_analysis(filepath: str, content_hash: str, dataset_name: str, append: bool = False, progress=None):
+    profiler = PipelineProfiler()
+    try:
+        # uploads of one dataset build on each other's state, so they run one at a time (in any worker)
+        with dataset_registry().lock(dataset_name):
+            result, cache_hit = _run_analysis(filepath, content_hash, dataset_name, append, progress, profiler)
+    except Exception:
+        metrics.inc("analysis_requests_total", {"outcome": "failed"})
+        raise
+    finally:
+        profiler.close()
+
+    timings = profiler.to_dict()
+    timings["cache_hit"] = cache_hit
+    record_analysis(metrics, timings)
+    metrics.inc("analysis_requests_total", {"outcome": "cache_hit" if cache_hit else "computed"})
+
+    # timings are per run, so they are attached after caching
+    return {**result, "timings": timings}
+
+
+def _run_analysis(filepath: str, content_hash: str, dataset_name: str, append: bool, progress, profiler):
+    import pandas as pd
+    from app.agents.coordinator import EmptyDatasetError
+    from app.utils.incremental import AnalysisState
+
+    registry, charts, analysis = dataset_registry(), chart_store(), coordinator()
+    fingerprint = analysis.config_fingerprint()
+    version = content_hash[:12]
+    base_version = None
+
+    if append:
+        # the upload holds only new rows; they are folded into the dataset's current state
+        entry = registry.get(dataset_name)
+        if entry is None or registry.state(dataset_name) is None:
+            raise JobFailed(409, "Nothing to append to: upload the full dataset first.")
+        base_version = entry["version"]
+        fingerprint += f":append={base_version}"
+        version = hashlib.sha256(f"{base_version}:{content_hash}".encode("utf-8")).hexdigest()[:12]
+
+    # identical bytes + pipeline config (+ base version) -> reuse the stored result
+    key = cache_key(content_hash, fingerprint)
+    with profiler.stage("cache_lookup"):
+        # a cached result is only usable while the data behind its charts is stored
+        result = result_cache.get(key) if charts.has(key) else None
+
+    if result is not None:
+        # keep the columnar copy and analysis state in step with the result, even on a cache hit
+        with profiler.stage("columnar_store"):
+            if not registry.has_version(dataset_name, version):
+                registry.link_version(dataset_name, version)
+        if not registry.has_state(dataset_name, version):
+            result = None
+
+    cache_hit = result is not None
+    if cache_hit:
+        result = analysis.rename_result(result, dataset_name)
     else:
-        return obj
+        # read CSV in chunks and perform analysis, storing a columnar copy and the state on the way
+        state_dir = registry.state_path(dataset_name, version)
+        shutil.rmtree(state_dir, ignore_errors=True)
+        try:
+            with profiler.stage("state_loading"):
+                previous = AnalysisState.load(registry.state(dataset_name)) if append else None
+            result = analysis.orchestrate_file_analysis(
+                filepath, dataset_name, progress=progress,
+                store=registry.writer(dataset_name, version, append=append),
+                profiler=profiler,
+                charts=partial(charts.save, key),
+                previous=previous,
+                state_dir=state_dir,
+            )
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError):
+            shutil.rmtree(state_dir, ignore_errors=True)
+            raise JobFailed(400, "Unable to parse CSV. Ensure it's valid.")
+        except EmptyDatasetError:
+            shutil.rmtree(state_dir, ignore_errors=True)
+            raise JobFailed(400, "CSV file contains no data.")
+        except Exception:
+            shutil.rmtree(state_dir, ignore_errors=True)
+            raise
+        registry.commit_state(dataset_name, version)
+
+        with profiler.stage("serialization"):
+            # NumPy values stay in the result: the cache and the response encode them natively
+            # charts are rendered on request from /charts/{analysis_id}/{chart_id}
+            result["analysis_id"] = key
+            for spec in result["visualization_specs"]:
+                spec["url"] = f"/charts/{key}/{spec['id']}"
+
+            if base_version is not None:
+                result["append_report"]["base_version"] = base_version
+
+            # dashboard placeholder
+            result["dashboard_url"] = None
+
+            result_cache.put(key, result)
+
+    # store memory as small typed chunks, replacing any earlier upload of this dataset
+    with profiler.stage("context_indexing"):
+        texts, metadatas = build_context_chunks(result, version=version)
+        vector_db().replace_contexts(dataset_name, texts, metadatas)
+        answer_cache.invalidate(dataset_name)
+
+    return result, cache_hit
+
+
+async def submit_analysis(file: UploadFile, append: bool = False):
+    # reject before spooling, so an overloaded server does not write and hash the whole upload first
+    try:
+        job_queue.check_capacity()
+    except QueueFullError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "5"})
+
+    # save file
+    filename = f"{datetime.now().timestamp()}_{file.filename}"
+    filepath = os.path.join(UPLOAD_DIR, filename)
+
+    from app.utils.ingestion import spool_upload
+    _, content_hash = await spool_upload(file, filepath)
+
+    try:
+        return job_queue.submit(
+            file.filename, run_analysis, filepath, content_hash, file.filename, append,
+            stages=(await coordinator.aget()).STAGES,
+        )
+    except QueueFullError as e:
+        # the queue filled up while the upload was spooled
+        os.remove(filepath)
+        raise HTTPException(503, str(e), headers={"Retry-After": "5"})
 
 
 # -------------------------
@@ -61,72 +284,291 @@ async def home():
     return {
         "message": "Autonomous Data Analyst API is running",
         "upload_csv": "/analyze-csv",
+        "submit_job": "/jobs/analyze-csv",
         "chat_with_data": "/ask",
+        "datasets": "/datasets",
+        "charts": "/charts/{analysis_id}/{chart_id}",
+        "metrics": "/metrics",
         "docs": "/docs"
     }
 
 
 @app.post("/analyze-csv", response_model=AnalysisResponse)
-async def analyze_csv(file: UploadFile = File(...)):
+async def analyze_csv(file: UploadFile = File(...), timings: bool = False, append: bool = False):
     try:
-        # save file
-        filename = f"{datetime.now().timestamp()}_{file.filename}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
+        job = await submit_analysis(file, append)
+        return CompactJSONResponse(with_timings(await asyncio.wrap_future(job.future), timings))
 
-        with open(filepath, "wb") as f:
-            f.write(await file.read())
+    except HTTPException:
+        raise
+    except JobFailed as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # read CSV
-        try:
-            df = pd.read_csv(filepath)
-        except Exception:
-            raise HTTPException(400, "Unable to parse CSV. Ensure it's valid.")
 
-        if df.empty:
-            raise HTTPException(400, "CSV file contains no data.")
+@app.post("/jobs/analyze-csv", status_code=202)
+async def submit_analysis_job(file: UploadFile = File(...), append: bool = False):
+    job = await submit_analysis(file, append)
+    return job.to_dict()
 
-        # perform analysis
-        result = coordinator.orchestrate_analysis(df, file.filename)
 
-        # convert any numpy types to native Python
-        result = convert_numpy(result)
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id.")
+    return job.to_dict()
 
-        # store memory
-        combined_context = (
-            f"SUMMARY: {result['summary_report']}\n\n"
-            f"EDA: {result['analysis_report']}\n\n"
-            f"QUALITY: {result['data_quality_report']}\n\n"
-            f"ANOMALIES: {result['anomaly_report']}"
-        )
-        vector_db.add_context(file.filename, combined_context)
 
-        # dashboard placeholder
-        result["dashboard_url"] = None
+@app.get("/jobs/{job_id}/result", response_model=AnalysisResponse)
+async def job_result(job_id: str, timings: bool = False):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id.")
+    if job.status == "failed":
+        raise HTTPException(job.status_code, job.error)
+    if job.status != "completed":
+        raise HTTPException(409, f"Job is {job.status}.")
+    return CompactJSONResponse(with_timings(job.result, timings))
 
-        return result
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def stream_answer(query: str, dataset: str, version: str, context: str, cached: str | None):
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    llm = await gemini.aget()
+    async for text in llm.astream(query, context):
+        parts.append(text)
+        yield text
+    await asyncio.to_thread(answer_cache.put, dataset, version, query, context, "".join(parts))
+
+
+async def query_answer(query: str, dataset: str):
+    """
+    Query mode of /ask: the LLM turns the question into a query plan,
+    the plan runs over the stored columnar dataset (only the columns it
+    names are mapped in), and the LLM narrates the small result table.
+    Group-level plans are answered from the dataset's aggregate cube
+    when it covers them. Raises QueryPlanError when the question doesn't
+    fit a plan.
+    """
+    from app.utils.aggregate_cube import load_cube
+    from app.utils.query_engine import execute_plan, plan_columns
+
+    registry = await dataset_registry.aget()
+    entry = registry.get(dataset)
+    if entry is None:
+        raise HTTPException(404, "Unknown dataset.")
+
+    # plans are only reused for the same wording; a similar question may need a different query
+    namespace = mode_namespace(dataset, "query")
+    cached = await asyncio.to_thread(answer_cache.get, namespace, entry["version"], query, "", exact=True)
+    if cached is not None:
+        return {**json.loads(cached), "cached": True}
+
+    schema = await asyncio.to_thread(registry.schema, dataset)
+    agent = await chat_agent.aget()
+    plan = await agent.aplan(query, schema)
+
+    def run():
+        cube = load_cube(registry.state(dataset))
+        answered = cube.answer(plan) if cube is not None else None
+        if answered is not None:
+            return (*answered, "cube")
+        return (*execute_plan(registry.open_table(dataset, plan_columns(plan)), plan), "rows")
+
+    result, matched, source = await asyncio.to_thread(run)
+    answer = await agent.anarrate(query, plan, result, matched)
+
+    response = {
+        "answer": answer,
+        "mode": "query",
+        "plan": plan,
+        "result": json.loads(result.to_json(orient="records", date_format="iso")),
+        "matched_rows": matched,
+        "source": source,
+    }
+    await asyncio.to_thread(answer_cache.put, namespace, entry["version"], query, "", json.dumps(response))
+    return {**response, "cached": False}
 
 
 @app.get("/ask")
-async def ask_question(query: str, dataset: str):
+async def ask_question(query: str, dataset: str, stream: bool = False, mode: str = "context"):
+    """
+    mode=context answers from the stored analysis summaries; mode=query
+    computes the answer from the rows (see query_answer) and falls back
+    to context mode when the question doesn't fit a query plan.
+    """
+    if mode not in ("context", "query"):
+        raise HTTPException(422, "mode must be 'context' or 'query'.")
+
+    query_error = None
+    if mode == "query":
+        from app.utils.query_engine import QueryPlanError
+        try:
+            return await query_answer(query, dataset)
+        except HTTPException:
+            raise
+        except QueryPlanError as e:
+            query_error = str(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
     try:
-        # fetch dataset-specific context
-        contexts = vector_db.search(dataset)
+        # fetch the dataset's stored chunks most similar to the question;
+        # embedding the question, the index scan and the answer cache all block, so they run off the event loop
+        store = await vector_db.aget()
+        records = await asyncio.to_thread(store.search_records, query, CONTEXT_CANDIDATES, dataset=dataset)
 
-        if not contexts:
+        if not records:
             return {"answer": "No relevant context found for this dataset."}
 
-        merged_context = "\n\n".join(contexts)
+        if not any(r["metadata"].get("section") == "overview" for r in records):
+            records += await asyncio.to_thread(
+                store.search_records, query, 1, dataset=dataset, where={"section": "overview"}
+            )
+
+        # keep only the most relevant slices that fit the prompt budget
+        merged_context = "\n\n".join(select_within_budget(records))
+
+        version = records[0]["metadata"].get("version", "")
+        answer = await asyncio.to_thread(answer_cache.get, dataset, version, query, merged_context)
+
+        if stream:
+            return StreamingResponse(
+                stream_answer(query, dataset, version, merged_context, answer),
+                media_type="text/plain; charset=utf-8",
+            )
 
-        answer = gemini.ask(query, merged_context)
-        return {"answer": answer}
+        if answer is not None:
+            return {"answer": answer, "cached": True, **({"query_error": query_error} if query_error else {})}
+
+        llm = await gemini.aget()
+        answer = await llm.aask(query, merged_context)
+        await asyncio.to_thread(answer_cache.put, dataset, version, query, merged_context, answer)
+        return {"answer": answer, "cached": False, **({"query_error": query_error} if query_error else {})}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/datasets")
+async def list_datasets():
+    return {
+        name: {key: value for key, value in entry.items() if key != "path"}
+        for name, entry in (await dataset_registry.aget()).list().items()
+    }
+
+
+@app.get("/datasets/{dataset_name}")
+async def dataset_info(dataset_name: str):
+    entry = (await dataset_registry.aget()).get(dataset_name)
+    if entry is None:
+        raise HTTPException(404, "Unknown dataset.")
+    return {key: value for key, value in entry.items() if key != "path"}
+
+
+# rendering blocks, so this runs in FastAPI's threadpool rather than on the event loop
+@app.get("/charts/{analysis_id}/{chart_id}", response_class=Response)
+def chart_image(analysis_id: str, chart_id: str, if_none_match: str | None = Header(None)):
+    from app.agents.visualization_agent import spec_columns
+    from app.utils.chart_store import CHART_CACHE_MAX_AGE
+
+    charts = chart_store()
+    spec = charts.spec(analysis_id, chart_id)
+    if spec is None:
+        raise HTTPException(404, "Unknown chart.")
+
+    # the analysis id covers the content and pipeline config, so a chart URL never changes its image
+    etag = f'"{analysis_id[:16]}-{chart_id}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CHART_CACHE_MAX_AGE}"}
+    if etag_matches(if_none_match, etag):
+        metrics.inc("chart_requests_total", {"outcome": "not_modified"})
+        return Response(status_code=304, headers=headers)
+
+    png = charts.get_png(analysis_id, chart_id)
+    if png is not None:
+        metrics.inc("chart_requests_total", {"outcome": "cached"})
+    else:
+        timings = []
+        try:
+            df = charts.load(analysis_id, spec_columns(spec))
+        except OSError:
+            # evicted since the spec was read
+            raise HTTPException(404, "Unknown chart.")
+        png = coordinator().visualization_agent.render_png(df, spec, timings)
+        charts.put_png(analysis_id, chart_id, png)
+        record_chart(metrics, timings[0])
+        metrics.inc("chart_requests_total", {"outcome": "rendered"})
+
+    return Response(png, media_type="image/png", headers=headers)
+
+
+@app.get("/jobs")
+async def jobs_stats():
+    return job_queue.stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"results": result_cache.stats(), "answers": answer_cache.stats()}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    queue = job_queue.stats()
+    metrics.set("job_queue_pending", queue["pending"])
+    metrics.set("job_queue_running", queue["running"])
+    for name, cache in (("results", result_cache), ("answers", answer_cache)):
+        stats = cache.stats()
+        metrics.set("cache_hits_total", stats["hits"], {"cache": name})
+        metrics.set("cache_misses_total", stats["misses"], {"cache": name})
+    metrics.set("startup_import_seconds", IMPORT_SECONDS)
+    for component in COMPONENTS:
+        if component.ready:
+            metrics.set("component_init_seconds", component.seconds, {"component": component.name})
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health():
+    """Liveness: answers as soon as the process is up, whatever is still loading."""
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once every component is created, 503 (with each
+    component's status) while any is still pending or has failed, e.g.
+    the LLM client without GOOGLE_API_KEY. Starts the warm-up if it
+    isn't running.
+    """
+    components = {component.name: component.status() for component in COMPONENTS}
+    body = {"import_seconds": IMPORT_SECONDS, "components": components}
+    if all(component.ready for component in COMPONENTS):
+        return {"status": "ready", **body}
+
+    start_warm_up()
+    failed = any(entry["status"] == "failed" for entry in components.values())
+    return JSONResponse({"status": "failed" if failed else "starting", **body}, status_code=503)
+
+
+@app.on_event("startup")
+def startup():
+    if WARMUP_ON_STARTUP:
+        start_warm_up()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    job_queue.shutdown()
+    if coordinator.ready:
+        coordinator().visualization_agent.shutdown()
+
+
+# seconds spent importing this module, not counting interpreter start-up
+IMPORT_SECONDS = time.perf_counter() - _import_started
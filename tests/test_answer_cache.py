@@ -0,0 +1,51 @@
+# tests/test_answer_cache.py
+import numpy as np
+import pytest
+
+from app.utils import answer_cache
+from app.utils.answer_cache import AnswerCache
+from app.utils.embeddings import Embedder
+
+
+class _SemanticEmbedder:
+    """Stands in for a loaded model; every question embeds to the same vector."""
+    semantic = True
+
+    def embed(self, texts):
+        return np.ones((len(texts), 4), dtype="float32") / 2
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(path=str(tmp_path / "answers.sqlite3"), similarity=0.97)
+
+
+def test_hashing_fallback_reuses_exact_matches_only(cache, monkeypatch):
+    monkeypatch.setattr(Embedder, "_load", lambda self: setattr(self, "_loaded", True))
+    monkeypatch.setattr(answer_cache, "get_embedder", lambda: Embedder())
+    cache.put("sales", "v1", "Is revenue in 2023 higher than in 2022?", "ctx", "yes")
+
+    assert cache.get("sales", "v1", "is revenue in 2023 higher than in 2022", "ctx") == "yes"
+    assert cache.get("sales", "v1", "Is revenue in 2022 higher than in 2023?", "ctx") is None
+    assert cache.get("sales", "v1", "Is revenue in 2023 not higher than in 2022?", "ctx") is None
+    assert cache.stats()["semantic_hits"] == 0
+
+
+def test_similar_questions_need_the_same_context(cache, monkeypatch):
+    monkeypatch.setattr(answer_cache, "get_embedder", lambda: _SemanticEmbedder())
+    cache.put("sales", "v1", "What is the average revenue?", "ctx", "42")
+
+    assert cache.get("sales", "v1", "Mean revenue?", "other ctx") is None
+    assert cache.get("sales", "v1", "Mean revenue?", "ctx") == "42"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_invalidate_drops_mode_namespaces(cache):
+    cache.put("sales", "v1", "q", "ctx", "a")
+    cache.put(answer_cache.mode_namespace("sales", "query"), "v1", "q", "", "plan")
+    cache.put("sales_2024", "v1", "q", "ctx", "kept")
+
+    cache.invalidate("sales")
+    assert cache.get("sales", "v1", "q", "ctx") is None
+    assert cache.get(answer_cache.mode_namespace("sales", "query"), "v1", "q", "", exact=True) is None
+    assert cache.get("sales_2024", "v1", "q", "ctx") == "kept"
@@ -0,0 +1,58 @@
+# tests/test_column_stats.py
+import numpy as np
+import pandas as pd
+
+from app.utils.column_stats import DatasetProfile, DistinctSketch, QuantileSketch
+
+
+def test_quantile_sketch_is_exact_below_k():
+    values = np.arange(1000, dtype="float64")
+    sketch = QuantileSketch(k=2048).update(values)
+    assert np.allclose(sketch.quantiles([0.25, 0.5, 0.75]), np.quantile(values, [0.25, 0.5, 0.75]))
+
+
+def test_quantile_sketch_merge_stays_close():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=200_000)
+    merged = QuantileSketch(k=256)
+    for part in np.array_split(values, 8):
+        merged.merge(QuantileSketch(k=256).update(part))
+    assert merged.count == len(values)
+    error = np.abs(merged.quantiles([0.1, 0.5, 0.9]) - np.quantile(values, [0.1, 0.5, 0.9]))
+    assert (error < 0.05).all()
+
+
+def test_distinct_sketch_is_exact_below_k_and_close_above():
+    assert DistinctSketch(k=1024).update(np.arange(500) % 100).estimate() == 100
+    left = DistinctSketch(k=1024).update(np.arange(0, 60_000))
+    right = DistinctSketch(k=1024).update(np.arange(40_000, 100_000))
+    assert abs(left.merge(right).estimate() - 100_000) < 10_000
+
+
+def test_profile_merge_matches_whole_frame():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({
+        "x": rng.normal(size=5000),
+        "y": rng.integers(0, 10, size=5000),
+        "cat": rng.choice(["a", "b", "c"], size=5000),
+    })
+    df.loc[::7, "x"] = np.nan
+
+    whole = DatasetProfile.from_frame(df)
+    merged = DatasetProfile.from_frame(df.iloc[:1234]).merge(DatasetProfile.from_frame(df.iloc[1234:]))
+
+    assert merged.rows == whole.rows == 5000
+    assert np.allclose(merged.mean[["x", "y"]], df[["x", "y"]].mean())
+    assert np.allclose(merged.std[["x", "y"]], df[["x", "y"]].std())
+    assert merged.null_counts["x"] == df["x"].isna().sum()
+    assert merged.distinct_count("cat") == 3
+    assert np.allclose(merged.correlation().to_numpy(), whole.correlation().to_numpy())
+
+
+def test_summary_statistics_tables():
+    df = pd.DataFrame({"x": [1.0, 2.0, np.nan], "cat": ["a", "a", None]})
+    stats = DatasetProfile.from_frame(df).summary_statistics()
+    assert stats["numeric"]["column"] == ["x"]
+    assert stats["numeric"]["count"] == [2.0]
+    assert stats["numeric"]["mean"] == [1.5]
+    assert stats["categorical"] == {"column": ["cat"], "count": [2], "unique": [1], "top": ["a"], "freq": [2]}
@@ -0,0 +1,38 @@
+# tests/test_coordinator.py
+import numpy as np
+import pandas as pd
+
+from app.agents.coordinator import DataAnalysisCoordinator
+
+
+def test_stored_specs_report_their_sampling():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "x": rng.normal(size=20_000),
+        "y": rng.normal(size=20_000),
+        "cat": rng.choice(list("abcdefghijklmnopqrstuvwxyz"), size=20_000),
+    })
+    stored = []
+    result = DataAnalysisCoordinator().orchestrate_analysis(df, "sampled", charts=lambda rows, specs: stored.extend(specs))
+
+    reduced = [spec for spec in result["visualization_specs"] if spec["type"] in ("histogram", "barchart", "scatter")]
+    assert reduced
+    for spec in reduced:
+        sampling = spec["sampling"]
+        assert sampling["total_rows"] > 0
+        assert sampling["ratio"] == sampling["points_drawn"] / sampling["total_rows"]
+    assert [spec.get("sampling") for spec in stored] == [spec.get("sampling") for spec in result["visualization_specs"]]
+
+
+def test_memory_report_names_the_rows_it_measured(tmp_path):
+    df = pd.DataFrame({"x": np.arange(3000), "cat": ["a", "b", "c"] * 1000})
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+    coordinator = DataAnalysisCoordinator()
+
+    in_memory = coordinator.orchestrate_analysis(df, "whole")["data_quality_report"]["memory_optimization"]
+    assert (in_memory["scope"], in_memory["rows"]) == ("dataset", 3000)
+
+    chunked = coordinator.orchestrate_file_analysis(str(path), "chunked")["data_quality_report"]["memory_optimization"]
+    assert chunked["scope"] == "sample"
+    assert chunked["rows"] == 3000
@@ -0,0 +1,60 @@
+# tests/test_dedup.py
+import numpy as np
+import pandas as pd
+
+from app.agents.cleaning_agent import CleaningAgent
+from app.utils.dedup import DuplicateDetector, near_row_hashes, row_hashes
+
+
+def test_large_int64_ids_are_not_duplicates():
+    df = pd.DataFrame({"id": [1234567890123456789, 1234567890123456790, 1234567890123456791], "v": [1, 1, 1]})
+    cleaned, removed = CleaningAgent().clean_chunk(df, DuplicateDetector(near=False))
+    assert removed == 0
+    assert len(cleaned) == 3
+    assert not df.duplicated().any()
+
+
+def test_int_and_integral_float_hash_alike():
+    ints = pd.DataFrame({"x": pd.array([1, 2, None], dtype="Int64")})
+    floats = pd.DataFrame({"x": [1.0, 2.0, np.nan]})
+    small = pd.DataFrame({"x": np.array([1, 2], dtype="int8")})
+    assert (row_hashes(ints) == row_hashes(floats)).all()
+    assert (row_hashes(small) == row_hashes(floats.iloc[:2])).all()
+    assert (near_row_hashes(ints) == near_row_hashes(floats)).all()
+
+
+def test_non_integral_and_out_of_range_values_stay_apart():
+    floats = row_hashes(pd.DataFrame({"x": [0.5, 1.5, 2.0 ** 64]}))
+    assert len(set(floats.tolist())) == 3
+    unsigned = row_hashes(pd.DataFrame({"x": np.array([2 ** 64 - 1], dtype="uint64")}))
+    signed = row_hashes(pd.DataFrame({"x": np.array([-1], dtype="int64")}))
+    assert unsigned[0] != signed[0]
+
+
+def test_duplicates_are_removed_across_chunks():
+    detector = DuplicateDetector(near=False)
+    first = pd.DataFrame({"a": [1, 2, 2], "b": ["x", "y", "y"]})
+    second = pd.DataFrame({"a": [2.0, 3.0], "b": ["y", "z"]}, index=[3, 4])
+    assert detector.update(first).tolist() == [False, False, True]
+    assert detector.update(second).tolist() == [True, False]
+    assert detector.removed == 2
+
+
+def test_near_duplicates_are_flagged_not_removed():
+    detector = DuplicateDetector(near=True)
+    df = pd.DataFrame({"name": ["Alice", " alice ", "Bob"], "score": [1.0, 1.0 + 1e-9, 2.0]})
+    assert not detector.update(df).any()
+    report = detector.near_duplicates()
+    assert report["candidate_rows"] == 1
+    assert report["row_indices"] == [1]
+
+
+def test_saved_detector_resumes(tmp_path):
+    detector = DuplicateDetector(near=False)
+    detector.update(pd.DataFrame({"a": [1, 2]}))
+    detector.save(str(tmp_path))
+    detector.close()
+
+    resumed = DuplicateDetector.load(str(tmp_path), near=False)
+    assert resumed.update(pd.DataFrame({"a": [2, 3]}, index=[2, 3])).tolist() == [True, False]
+    resumed.close()
@@ -0,0 +1,78 @@
+# tests/test_gemini_client.py
+import asyncio
+
+import pytest
+
+from app.utils import gemini_client
+from app.utils.gemini_client import GeminiClient, is_transient
+
+
+class _Reply:
+    content = "ok"
+
+
+class _FlakyModel:
+    """Raises each of `errors` in turn, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return _Reply()
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_client, "LLM_RETRY_BASE_DELAY", 0.0)
+
+
+def test_is_transient():
+    assert is_transient(TimeoutError())
+    assert is_transient(ConnectionResetError())
+    assert is_transient(_StatusError(429))
+    assert is_transient(_StatusError(503))
+    assert not is_transient(_StatusError(401))
+    assert not is_transient(_StatusError(400))
+    assert not is_transient(ValueError("invalid argument"))
+    try:
+        try:
+            raise _StatusError(500)
+        except _StatusError as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as wrapped:
+        assert is_transient(wrapped)
+
+
+def test_transient_errors_are_retried():
+    model = _FlakyModel(TimeoutError(), _StatusError(429))
+    assert GeminiClient(model).ask("q") == "ok"
+    assert model.calls == 3
+
+    model = _FlakyModel(_StatusError(503))
+    assert asyncio.run(GeminiClient(model).aask("q")) == "ok"
+    assert model.calls == 2
+
+
+def test_client_errors_are_raised_at_once():
+    model = _FlakyModel(_StatusError(401))
+    with pytest.raises(_StatusError):
+        GeminiClient(model).ask("q")
+    assert model.calls == 1
+
+    model = _FlakyModel(ValueError("invalid argument"))
+    with pytest.raises(ValueError):
+        asyncio.run(GeminiClient(model).aask("q"))
+    assert model.calls == 1
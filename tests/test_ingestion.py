@@ -0,0 +1,42 @@
+# tests/test_ingestion.py
+import pandas as pd
+import pytest
+
+from app.utils import ingestion
+from app.utils.csv_schema import infer_schema
+
+CSV = (
+    "us,eu,iso,v\n"
+    "01/02/2024,03/05/2024,2024-01-01,1\n"
+    "12/31/2024,25/12/2024,2024-02-03,2\n"
+    ",13/01/2024,,3\n"
+)
+
+
+@pytest.fixture
+def dates_csv(tmp_path):
+    path = tmp_path / "dates.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", ["pyarrow", "pandas"])
+def test_each_datetime_column_keeps_its_own_format(dates_csv, engine, monkeypatch):
+    monkeypatch.setattr(ingestion, "CSV_ENGINE", engine)
+    schema = infer_schema(dates_csv)
+    assert schema.formats["us"] == "%m/%d/%Y"
+    assert schema.formats["eu"] == "%d/%m/%Y"
+
+    chunk = next(ingestion.iter_csv_chunks(dates_csv, schema=schema))
+    assert chunk["us"].tolist()[:2] == [pd.Timestamp("2024-01-02"), pd.Timestamp("2024-12-31")]
+    assert chunk["eu"].tolist() == [pd.Timestamp("2024-05-03"), pd.Timestamp("2024-12-25"), pd.Timestamp("2024-01-13")]
+    assert chunk["iso"].isna().tolist() == [False, False, True]
+
+
+def test_readers_agree_across_chunks(dates_csv, monkeypatch):
+    schema = infer_schema(dates_csv)
+    monkeypatch.setattr(ingestion, "CSV_ENGINE", "pyarrow")
+    arrow = pd.concat(ingestion.iter_csv_chunks(dates_csv, chunksize=2, schema=schema))
+    monkeypatch.setattr(ingestion, "CSV_ENGINE", "pandas")
+    pandas = pd.concat(ingestion.iter_csv_chunks(dates_csv, chunksize=2, schema=schema))
+    pd.testing.assert_frame_equal(arrow, pandas)
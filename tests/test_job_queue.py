@@ -0,0 +1,21 @@
+# tests/test_job_queue.py
+import pytest
+
+from app.utils.job_queue import JobQueue, QueueFullError
+
+
+def test_check_capacity_matches_submit(tmp_path):
+    queue = JobQueue(max_workers=1, max_queued=0, path=str(tmp_path / "jobs.sqlite3"))
+    try:
+        with pytest.raises(QueueFullError):
+            queue.check_capacity()
+        with pytest.raises(QueueFullError):
+            queue.submit("job", lambda progress: None)
+
+        queue.max_queued = 1
+        queue.check_capacity()
+        job = queue.submit("job", lambda progress: "done")
+        job.future.result()
+        assert (job.status, job.result) == ("completed", "done")
+    finally:
+        queue.shutdown()
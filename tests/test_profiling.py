@@ -0,0 +1,27 @@
+# tests/test_profiling.py
+import tracemalloc
+
+from app.utils.profiling import PipelineProfiler
+
+
+def test_stages_accumulate():
+    profiler = PipelineProfiler(trace_memory=False)
+    for rows in (10, 20):
+        with profiler.stage("parse", rows, 3):
+            pass
+    stage = profiler.to_dict()["stages"]["parse"]
+    assert (stage["calls"], stage["rows"], stage["columns"]) == (2, 30, 3)
+    assert "rss_growth_bytes" in stage
+
+
+def test_tracemalloc_stops_when_the_last_profiler_closes():
+    assert not tracemalloc.is_tracing()
+    first, second = PipelineProfiler(trace_memory=True), PipelineProfiler(trace_memory=True)
+    with first.stage("alloc"):
+        block = bytearray(1_000_000)
+    first.close()
+    first.close()
+    assert tracemalloc.is_tracing()
+    second.close()
+    assert not tracemalloc.is_tracing()
+    assert first.to_dict()["stages"]["alloc"]["tracemalloc_peak_bytes"] >= len(block)
@@ -0,0 +1,45 @@
+# tests/test_query_engine.py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app.utils.query_engine import execute_plan, finish, validate_plan
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(0)
+    rows = 5000
+    x = rng.normal(size=rows).round(1)
+    x[::11] = np.nan
+    return pa.Table.from_pandas(pd.DataFrame({
+        "id": np.arange(rows),
+        "x": x,
+        "cat": pd.Series(rng.choice(["a", "b", None], size=rows), dtype="object"),
+        "day": pd.date_range("2024-01-01", periods=rows, freq="h"),
+    }), preserve_index=False)
+
+
+@pytest.mark.parametrize("plan", [
+    {"limit": 5},
+    {"select": ["id", "x"], "order_by": [{"column": "x", "descending": True}], "limit": 7},
+    {"select": ["cat", "x", "id"], "order_by": ["cat", {"column": "x", "descending": False}]},
+    {"filters": [{"column": "x", "op": ">", "value": 1}], "order_by": [{"column": "day", "descending": True}], "limit": 3},
+    {"filters": [{"column": "day:month", "op": "==", "value": "2024-02"}], "select": ["day", "x"], "limit": 4},
+])
+def test_row_plans_match_sorting_every_row_in_pandas(table, plan):
+    plan = validate_plan(plan, table.schema)
+    result, matched = execute_plan(table, plan)
+
+    filtered, _ = execute_plan(table, {**plan, "order_by": [], "limit": table.num_rows})
+    expected, expected_matched = finish(filtered, plan)
+    assert matched == expected_matched
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_row_plans_return_at_most_limit(table):
+    plan = validate_plan({"select": ["id"], "limit": 10}, table.schema)
+    result, matched = execute_plan(table, plan)
+    assert len(result) == 10
+    assert matched == table.num_rows
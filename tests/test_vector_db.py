@@ -0,0 +1,33 @@
+# tests/test_vector_db.py
+import pytest
+
+from app.database import vector_db
+from app.database.vector_db import VectorStore
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_search_reads_the_backend_contexts_were_added_to(tmp_path, monkeypatch, backend):
+    if backend == "chroma":
+        pytest.importorskip("chromadb")
+    monkeypatch.setattr(vector_db, "VECTOR_BACKEND", backend)
+    store = VectorStore(str(tmp_path))
+    store.add_contexts("sales", ["revenue by region", "customer churn rate"])
+
+    records = store.search_records("revenue region", limit=1, dataset="sales")
+    assert [record["text"] for record in records] == ["revenue by region"]
+    assert store.search_records("revenue region", dataset="other") == []
+
+
+def test_failed_chroma_write_is_raised(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    monkeypatch.setattr(vector_db, "VECTOR_BACKEND", "chroma")
+    store = VectorStore(str(tmp_path))
+    store.warm_up()
+
+    def fail(**kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store._collection, "add", fail)
+    with pytest.raises(RuntimeError):
+        store.add_contexts("sales", ["revenue by region"])
+    assert store._index is None